@@ -0,0 +1,134 @@
+# cookie_app/activity.py
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import ActivityLog
+
+
+class ActivityLogBuffer:
+    """Queues ActivityLog rows in memory and writes them with one bulk_create.
+
+    Rows are only queued once the transaction that logged them commits, so
+    work that rolls back never gets a log line. The queue is written when it
+    holds ACTIVITY_LOG_BATCH_SIZE rows, ACTIVITY_LOG_FLUSH_INTERVAL seconds
+    after its first row arrived and at exit, so one batch can collect rows
+    from many requests. Once the process starts shutting down rows are
+    written one by one as they come. Rows a failed write could not save are
+    retried on the next two flushes.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=2, max_pending=5000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        self._closed = False
+
+    def add(self, entry):
+        with self._lock:
+            if not self._closed:
+                self._pending.append(entry)
+                full = len(self._pending) >= self.batch_size
+                if not full and self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if self._closed:
+            self._write([entry])
+        elif full:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything queued so far"""
+        if not self._pending:
+            return
+        if connection.in_atomic_block:
+            # Never let buffered rows share a transaction that may still roll back.
+            # The deferred call must not defer again: callbacks run by
+            # captureOnCommitCallbacks are still inside the test's atomic block.
+            transaction.on_commit(self._flush_now)
+            return
+        self._flush_now()
+
+    def _flush_now(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if batch:
+            self._write(batch)
+
+    def discard(self):
+        """Drop everything queued without writing it; returns how many rows were dropped"""
+        with self._lock:
+            dropped, self._pending = len(self._pending), []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return dropped
+
+    def close(self):
+        """Flush and switch to synchronous writes (process exit)"""
+        with self._lock:
+            self._closed = True
+        self.flush()
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def _write(self, batch):
+        try:
+            ActivityLog.objects.bulk_create(batch)
+            return
+        except Exception as e:
+            print(f"Activity log error: {e}")
+        # Find the bad rows so one of them can't hold back the rest
+        failed = []
+        for entry in batch:
+            try:
+                entry.save()
+            except Exception as e:
+                entry._attempts = getattr(entry, '_attempts', 1) + 1
+                if entry._attempts <= 3 and not self._closed:
+                    failed.append(entry)
+                else:
+                    print(f"Activity log entry dropped ({entry.action}: {entry.description[:80]}): {e}")
+        if failed:
+            with self._lock:
+                room = max(0, self.max_pending - len(self._pending))
+                if room < len(failed):
+                    print(f"Activity log buffer full, dropped {len(failed) - room} entries")
+                self._pending[:0] = failed[:room]
+
+
+buffer = ActivityLogBuffer(
+    batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 50),
+    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2),
+)
+atexit.register(buffer.close)
+
+
+def record(entry):
+    """Queue an unsaved ActivityLog for writing once the current transaction commits.
+
+    With ACTIVITY_LOG_BUFFER = False the row is written straight after commit instead.
+    """
+    if getattr(settings, 'ACTIVITY_LOG_BUFFER', True):
+        transaction.on_commit(lambda: buffer.add(entry))
+    else:
+        transaction.on_commit(lambda: buffer._write([entry]))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
-from .models import Order, OrderItem, Cookie, Customer, Staff, Category, ActivityLog, VoidLog, UserProfile
+from .models import Order, OrderItem, Cookie, Customer, Staff, Category, ActivityLog, ActivityLogArchive, MediaImage, VoidLog, UserProfile
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -192,6 +192,30 @@ class ActivityLogAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'staff')
 
+@admin.register(ActivityLogArchive)
+class ActivityLogArchiveAdmin(ActivityLogAdmin):
+    """Read-only: rows get here through the archive_activity_logs command"""
+    list_display = ['user', 'action', 'description', 'timestamp', 'archived_at']
+    list_filter = ['action', 'timestamp']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(MediaImage)
+class MediaImageAdmin(admin.ModelAdmin):
+    """Entries come from uploads and the index_media command; only featured is edited here"""
+    list_display = ['name', 'width', 'height', 'cookie', 'featured', 'indexed_at']
+    list_editable = ['featured']
+    list_filter = ['featured']
+    search_fields = ['name']
+    readonly_fields = ['name', 'width', 'height', 'variants', 'cookie', 'indexed_at']
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(VoidLog)
 class VoidLogAdmin(admin.ModelAdmin):
     list_display = ['void_id', 'order', 'staff_member', 'void_date']
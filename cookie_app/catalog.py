@@ -0,0 +1,91 @@
+# cookie_app/catalog.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .journal import get_journal
+from .models import Cookie
+
+# Journal counter bumped whenever what the menus show may have changed
+CATALOG_VERSION = 'catalog_version'
+
+
+class CatalogSnapshot:
+    """The orderable menu: available, in-stock cookies grouped by category.
+
+    Built once per catalog version and shared by every menu page. Cookies
+    carry their category, so templates need no further queries. Stock counts
+    are as of the build; reserve_stock() still checks the live numbers.
+    ``key`` names this particular build: template fragments rendered from the
+    snapshot are cached under it, so they always match what it would render.
+    """
+
+    def __init__(self, version, cookies):
+        self.version = version
+        self.key = f'{version}.{time.time_ns()}'
+        self.cookies = cookies
+        self.by_name = sorted(cookies, key=lambda cookie: cookie.name)
+        self.by_category = {}
+        categories = {}
+        for cookie in cookies:
+            category_name = cookie.category.name if cookie.category else 'Other'
+            self.by_category.setdefault(category_name, []).append(cookie)
+            if cookie.category:
+                categories[cookie.category.pk] = cookie.category
+        self.categories = sorted(categories.values(), key=lambda category: category.name)
+
+    def search(self, q):
+        """Cookies (by name) whose name or category contains ``q``, ignoring case"""
+        q = q.casefold()
+        return [
+            cookie for cookie in self.by_name
+            if q in cookie.name.casefold() or (cookie.category and q in cookie.category.name.casefold())
+        ]
+
+
+def build_snapshot(version):
+    cookies = Cookie.objects.filter(stock_quantity__gt=0, is_available=True).select_related('category').order_by('id')
+    return CatalogSnapshot(version, list(cookies))
+
+
+def catalog_snapshot():
+    """The current CatalogSnapshot.
+
+    The version comes from the shared journal, so a change saved by any
+    worker is seen by all of them. Each version is built once and kept in
+    the cache for CATALOG_CACHE_TTL seconds (which also bounds how stale
+    the stock counts shown above the low-stock band can get).
+    """
+    version = get_journal().get(CATALOG_VERSION)
+    cache_key = f'catalog:{version}'
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = build_snapshot(version)
+        cache.set(cache_key, snapshot, getattr(settings, 'CATALOG_CACHE_TTL', 300))
+    return snapshot
+
+
+def stock_levels(cookies):
+    """Live {cookie id: stock} for the cookies on a menu page.
+
+    The snapshot's own counts may be stale, so pages that show stock render
+    it from this, outside their cached fragments.
+    """
+    return dict(Cookie.objects.filter(pk__in=[cookie.pk for cookie in cookies]).values_list('pk', 'stock_quantity'))
+
+
+def invalidate():
+    """Move every worker to a new catalog version once the current transaction commits"""
+    transaction.on_commit(lambda: get_journal().incr(CATALOG_VERSION))
+
+
+def crosses_stock_threshold(before, after):
+    """Whether a stock change from ``before`` to ``after`` should rebuild the menu.
+
+    That is any change inside the low-stock band (CATALOG_LOW_STOCK, default
+    10), which includes selling out and coming back into stock. Changes
+    above it are picked up when the snapshot expires.
+    """
+    return before != after and min(before, after) <= getattr(settings, 'CATALOG_LOW_STOCK', 10)
@@ -0,0 +1,57 @@
+# cookie_app/dates.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def _day_offset():
+    """How far past midnight the business day starts (BUSINESS_DAY_START_HOUR, default 0)"""
+    return timedelta(hours=getattr(settings, 'BUSINESS_DAY_START_HOUR', 0))
+
+
+def business_date(moment=None):
+    """Business date a timestamp falls on, in the current time zone (defaults to now)"""
+    moment = timezone.localtime(moment or timezone.now())
+    return (moment - _day_offset()).date()
+
+
+def day_start(day):
+    """Aware datetime at which the given business date begins"""
+    return timezone.make_aware(datetime.combine(day, time.min)) + _day_offset()
+
+
+def day_bounds(start_date, end_date=None):
+    """Half-open [start, end) datetimes covering start_date..end_date inclusive"""
+    return day_start(start_date), day_start((end_date or start_date) + timedelta(days=1))
+
+
+def date_window(field, start_date=None, end_date=None):
+    """Filter kwargs selecting rows whose ``field`` falls on start_date..end_date.
+
+    Either bound may be omitted. Unlike ``field__date`` lookups these compare
+    the raw column, so indexes on the timestamp can be used:
+
+        Order.objects.filter(status='completed', **date_window('created_at', start, end))
+    """
+    bounds = {}
+    if start_date is not None:
+        bounds[f'{field}__gte'] = day_start(start_date)
+    if end_date is not None:
+        bounds[f'{field}__lt'] = day_start(end_date + timedelta(days=1))
+    return bounds
+
+
+def day_window(field, day):
+    """Filter kwargs for a single business date"""
+    return date_window(field, day, day)
+
+
+def business_day(field):
+    """Expression giving the business date of a timestamp column, for GROUP BY"""
+    offset = _day_offset()
+    if not offset:
+        return TruncDate(field)
+    return TruncDate(ExpressionWrapper(F(field) - offset, output_field=DateTimeField()))
@@ -0,0 +1,200 @@
+# cookie_app/events.py
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .journal import get_journal
+
+ORDER_CREATED = 'order_created'
+ORDER_PAID = 'order_paid'
+ORDER_STATUS_CHANGED = 'order_status_changed'
+ORDER_VOIDED = 'order_voided'
+
+# Journal counter bumped for every committed order change, used as a cheap version stamp
+ORDERS_VERSION = 'orders_version'
+
+
+class _Subscriber:
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def offer(self, event):
+        # Runs on the subscriber's own event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: end its stream so it reconnects and replays from the journal
+            self.overflowed = True
+
+
+class OrderEventBroker:
+    """Fans journal events out to every open event stream in this process.
+
+    Order saves append to the shared journal (see journal.get_journal()).
+    While anyone is listening, a single follower task per process polls the
+    journal for entries after the last one it saw and hands each to every
+    subscriber's queue, so the journal sees one poll per worker process per
+    ORDER_EVENTS_POLL_INTERVAL however many tabs are open, and events saved
+    by any worker reach clients connected to any other.
+    """
+
+    def __init__(self, buffer=None, poll_interval=None):
+        self._lock = threading.Lock()
+        self._buffer = buffer or getattr(settings, 'ORDER_EVENTS_BUFFER', 100)
+        self._poll_interval = poll_interval or getattr(settings, 'ORDER_EVENTS_POLL_INTERVAL', 1)
+        self._subscribers = set()
+        self._follower = None
+
+    def publish(self, event):
+        """Hand a journal event to every local subscriber"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # Loop already closed; the stream's finally block never ran
+                self._discard(subscriber)
+
+    def _discard(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    async def _follow(self):
+        journal = get_journal()
+        last_seq = await _in_thread(journal.latest)()
+        while self._subscribers:
+            try:
+                events = await _in_thread(journal.since)(last_seq)
+            except Exception as e:
+                print(f"Order event journal poll failed: {e}")
+                events = []
+            for event in events:
+                last_seq = event['id']
+                self.publish(event)
+            if len(events) < 100:
+                await asyncio.sleep(self._poll_interval)
+
+    def _ensure_follower(self, loop):
+        if self._follower is None or self._follower.done() or self._follower.get_loop() is not loop:
+            self._follower = loop.create_task(self._follow())
+
+    async def stream(self, last_event_id=None, keepalive=None, max_age=None):
+        """Yield events (or None as a keep-alive tick) for up to ``max_age`` seconds.
+
+        Events after ``last_event_id`` are replayed from the journal first.
+        Django 4.2 does not notice a client disconnecting mid-stream, so every
+        stream ends on its own after ORDER_EVENTS_MAX_AGE; browsers reconnect
+        and replay anything they missed.
+        """
+        keepalive = keepalive or getattr(settings, 'ORDER_EVENTS_KEEPALIVE', 15)
+        max_age = max_age or getattr(settings, 'ORDER_EVENTS_MAX_AGE', 300)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_age
+        subscriber = _Subscriber(loop, self._buffer)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        self._ensure_follower(loop)
+        try:
+            seen = 0
+            if last_event_id is not None:
+                for event in await _in_thread(get_journal().since)(last_event_id, self._buffer):
+                    seen = event['id']
+                    yield event
+            while not subscriber.overflowed:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), min(keepalive, remaining))
+                except asyncio.TimeoutError:
+                    if remaining > keepalive:
+                        yield None
+                    continue
+                if event['id'] > seen:
+                    yield event
+        finally:
+            self._discard(subscriber)
+
+
+def _in_thread(func):
+    # Off the thread that runs sync views, so polling never queues behind requests
+    return sync_to_async(func, thread_sensitive=False)
+
+
+broker = OrderEventBroker()
+
+
+def order_payload(order):
+    """What clients get to know about an order in an event"""
+    return {
+        'id': order.id,
+        'order_id': order.order_id,
+        'hex_id': order.hex_id,
+        'customer_name': order.customer_name or 'Walk-in',
+        'order_type': order.order_type,
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'is_paid': order.is_paid,
+        'staff_id': order.staff_id,
+        'total_amount': str(order.total_amount),
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def remember(order):
+    """Note the status and paid flag an order was loaded with (post_init).
+
+    Reads the instance dict directly so deferred fields are not fetched.
+    """
+    order._event_state = (order.__dict__.get('status'), order.__dict__.get('is_paid'))
+
+
+def order_event_types(order, created):
+    """Event types a save of ``order`` should publish"""
+    if created:
+        return [ORDER_CREATED]
+    status, is_paid = getattr(order, '_event_state', (None, None))
+    types = []
+    if order.status != status:
+        types.append(ORDER_VOIDED if order.status == 'voided' else ORDER_STATUS_CHANGED)
+    if order.is_paid and is_paid is False:
+        types.append(ORDER_PAID)
+    return types
+
+
+def order_saved(order, created):
+    """Journal the events for a save once the surrounding transaction commits"""
+    event_types = order_event_types(order, created)
+    remember(order)
+    payload = order_payload(order) if event_types else None
+    transaction.on_commit(lambda: _journal_change(event_types, payload))
+
+
+def order_deleted(order):
+    transaction.on_commit(lambda: _journal_change([], None))
+
+
+def _journal_change(event_types, payload):
+    journal = get_journal()
+    journal.incr(ORDERS_VERSION)
+    for event_type in event_types:
+        journal.append(event_type, payload)
+
+
+def format_event(event):
+    """Server-Sent Events wire format for one event, or a keep-alive comment for None"""
+    if event is None:
+        return ': keep-alive\n\n'
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
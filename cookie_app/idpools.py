@@ -0,0 +1,160 @@
+# cookie_app/idpools.py
+import random
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import IdSequence, PooledId, Staff, UserProfile
+from .sequences import allocate
+
+
+class IdPoolExhausted(Exception):
+    """Raised when every ID in a pool's space has been handed out"""
+
+
+class IdPool:
+    """A space of ``size`` IDs starting at ``start``, formatted as prefix + zero-padded number.
+
+    The space is walked in a fixed scrambled order (i -> (i * step + offset) % size)
+    in batches; each batch is checked against IDs already in use, shuffled and
+    stored as PooledId rows waiting to be claimed.
+    """
+
+    def __init__(self, name, prefix, start, size, width, step, offset, batch_size, low_water, used_ids):
+        self.name = name
+        self.prefix = prefix
+        self.start = start
+        self.size = size
+        self.width = width
+        self.step = step        # must be coprime with size
+        self.offset = offset
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.used_ids = used_ids
+
+    @property
+    def cursor_name(self):
+        return f"idpool:{self.name}:cursor"
+
+    @property
+    def empty_hits_name(self):
+        return f"idpool:{self.name}:empty"
+
+    def format(self, position):
+        number = self.start + (position * self.step + self.offset) % self.size
+        return f"{self.prefix}{number:0{self.width}d}"
+
+
+POOLS = {
+    'customer': IdPool(
+        'customer', 'CUST', 100000, 900000, 6, step=7919, offset=123457,
+        batch_size=200, low_water=50,
+        used_ids=lambda values: UserProfile.objects.filter(customer_id__in=values).values_list('customer_id', flat=True),
+    ),
+    'staff': IdPool(
+        'staff', 'STAFF', 1000, 9000, 4, step=7919, offset=4127,
+        batch_size=50, low_water=10,
+        used_ids=lambda values: Staff.objects.filter(staff_id__in=values).values_list('staff_id', flat=True),
+    ),
+}
+
+_refilling = {name: threading.Lock() for name in POOLS}
+
+
+def refill(name):
+    """Generate the next batch of unused IDs for a pool and return how many were added"""
+    pool = POOLS[name]
+    end = allocate([pool.cursor_name], step=pool.batch_size)[pool.cursor_name]
+    first = end - pool.batch_size
+    if first >= pool.size:
+        return 0
+
+    candidates = [pool.format(position) for position in range(first, min(end, pool.size))]
+    used = set(pool.used_ids(candidates))
+    fresh = [value for value in candidates if value not in used]
+    random.shuffle(fresh)
+    PooledId.objects.bulk_create([PooledId(pool=name, value=value) for value in fresh], ignore_conflicts=True)
+    return len(fresh)
+
+
+def _claim(name):
+    """Remove and return one pooled ID with a single statement, or None if the pool is empty"""
+    table = connection.ops.quote_name(PooledId._meta.db_table)
+    if connection.vendor == 'postgresql':
+        sql = (f"DELETE FROM {table} WHERE id = (SELECT id FROM {table} WHERE pool = %s "
+               f"ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED) RETURNING value")
+    elif connection.vendor == 'sqlite':
+        sql = f"DELETE FROM {table} WHERE id = (SELECT id FROM {table} WHERE pool = %s ORDER BY id LIMIT 1) RETURNING value"
+    else:
+        row = PooledId.objects.filter(pool=name).order_by('id').first()
+        if row is None or not PooledId.objects.filter(id=row.id).delete()[0]:
+            return None
+        return row.value
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [name])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def take_id(name):
+    """Hand out an unused ID from the named pool.
+
+    Normally costs one DELETE ... RETURNING. If the pool has run dry the
+    caller refills it inline (and the miss is counted in the pool metrics);
+    otherwise a background refill tops it up once the transaction commits.
+    """
+    value = _claim(name)
+    if value is None:
+        allocate([POOLS[name].empty_hits_name])
+        while value is None:
+            if not refill(name) and POOLS[name].size <= _cursor(name):
+                raise IdPoolExhausted(f"The {name} ID pool has no IDs left")
+            value = _claim(name)
+
+    if getattr(settings, 'ID_POOL_BACKGROUND_REFILL', True):
+        transaction.on_commit(lambda: _start_background_refill(name))
+    return value
+
+
+def _cursor(name):
+    return IdSequence.objects.filter(name=POOLS[name].cursor_name).values_list('value', flat=True).first() or 0
+
+
+def _start_background_refill(name):
+    lock = _refilling[name]
+    if not lock.acquire(blocking=False):
+        return
+    threading.Thread(target=_background_refill, args=(name, lock), daemon=True).start()
+
+
+def _background_refill(name, lock):
+    try:
+        pool = POOLS[name]
+        while PooledId.objects.filter(pool=name).count() < pool.low_water:
+            if not refill(name) and pool.size <= _cursor(name):
+                break
+    except Exception as e:
+        print(f"ID pool refill failed for {name}: {e}")
+    finally:
+        connection.close()
+        lock.release()
+
+
+def pool_stats():
+    """Fill and exhaustion metrics for every pool"""
+    stats = {}
+    for name, pool in POOLS.items():
+        generated = min(_cursor(name), pool.size)
+        available = PooledId.objects.filter(pool=name).count()
+        empty_hits = IdSequence.objects.filter(name=pool.empty_hits_name).values_list('value', flat=True).first() or 0
+        stats[name] = {
+            'capacity': pool.size,
+            'available': available,
+            'unscanned': pool.size - generated,
+            'scanned_percent': round(100 * generated / pool.size, 2),
+            'empty_pool_hits': empty_hits,
+            'exhausted': available == 0 and generated >= pool.size,
+        }
+    return stats
@@ -0,0 +1,140 @@
+# cookie_app/images.py
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from . import catalog, media_index
+from .models import Cookie
+
+# Pillow save options per derivative format
+ENCODERS = {
+    'avif': ('AVIF', {'quality': 60, 'speed': 6}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def image_widths():
+    return sorted(getattr(settings, 'COOKIE_IMAGE_WIDTHS', [160, 320, 640]))
+
+
+def image_formats():
+    """Configured derivative formats (best first) that this Pillow build can write"""
+    formats = getattr(settings, 'COOKIE_IMAGE_FORMATS', ['avif', 'webp'])
+    return [fmt for fmt in formats if fmt in ENCODERS and features.check(fmt)]
+
+
+def derivative_name(source, width, fmt):
+    """cookies/x.png -> cookies/derived/x.png-320w.webp
+
+    The source's extension is kept so x.png and x.jpg get separate copies.
+    """
+    directory, filename = posixpath.split(source)
+    return posixpath.join(directory, 'derived', f'{filename}-{width}w.{fmt}')
+
+
+def derivative_names(variants):
+    return [
+        derivative_name(variants['source'], width, fmt)
+        for fmt in variants.get('formats', [])
+        for width in variants.get('widths', [])
+    ]
+
+
+def write_derivatives(storage, name, force=False):
+    """Write resized WebP/AVIF copies of the image ``name`` in ``storage``.
+
+    Widths never exceed the original; existing copies are kept unless
+    ``force``. Returns (variants, (width, height)) where variants is the
+    {'source', 'widths', 'formats'} dict the srcset helpers read.
+    """
+    with storage.open(name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+    widths = sorted({min(width, original.width) for width in image_widths()})
+    formats = image_formats()
+    for width in widths:
+        resized = original.copy()
+        resized.thumbnail((width, original.height), Image.LANCZOS)
+        for fmt in formats:
+            derived = derivative_name(name, width, fmt)
+            if storage.exists(derived):
+                if not force:
+                    continue
+                storage.delete(derived)
+            pillow_format, options = ENCODERS[fmt]
+            out = io.BytesIO()
+            resized.save(out, pillow_format, **options)
+            storage.save(derived, ContentFile(out.getvalue()))
+    return {'source': name, 'widths': widths, 'formats': formats}, original.size
+
+
+def generate_derivatives(cookie, force=False):
+    """Write the derivatives of ``cookie.image`` and record them.
+
+    Derivatives of a previous image are deleted, and the photo is listed in
+    the media index. Returns the new ``image_variants`` dict ({} when the
+    cookie has no image).
+    """
+    field = cookie.image
+    storage = field.storage
+    old = cookie.image_variants or {}
+    if old.get('source') and old.get('source') != field.name:
+        for name in derivative_names(old):
+            storage.delete(name)
+        media_index.forget(old['source'])
+    if not field:
+        variants = {}
+    else:
+        variants, size = write_derivatives(storage, field.name, force)
+        media_index.record(field.name, size, variants, cookie=cookie)
+    if variants != old:
+        Cookie.objects.filter(pk=cookie.pk).update(image_variants=variants)
+        cookie.image_variants = variants
+        catalog.invalidate()
+    return variants
+
+
+def needs_derivatives(cookie):
+    return (cookie.image_variants or {}).get('source', '') != (cookie.image.name or '')
+
+
+def derivatives_on_commit(cookie):
+    """Generate derivatives once the save that changed ``cookie.image`` commits"""
+    def generate():
+        try:
+            generate_derivatives(cookie)
+        except Exception as e:
+            print(f"Image derivative error for cookie {cookie.pk}: {e}")
+    transaction.on_commit(generate)
+
+
+def variant_srcsets(storage, variants):
+    """{format: srcset} for a variants dict, best format first"""
+    return {
+        fmt: ', '.join(
+            f"{storage.url(derivative_name(variants['source'], width, fmt))} {width}w"
+            for width in variants['widths']
+        )
+        for fmt in variants.get('formats', [])
+    }
+
+
+def srcsets(cookie):
+    """{format: srcset} for the cookie's recorded derivatives, best format first"""
+    variants = cookie.image_variants or {}
+    if not cookie.image or variants.get('source') != cookie.image.name:
+        return {}
+    return variant_srcsets(cookie.image.storage, variants)
+
+
+def image_json(cookie):
+    """The image fields menu and cart JSON send for a cookie"""
+    if not cookie.image:
+        return {'image': None, 'image_srcset': {}}
+    return {'image': cookie.image.url, 'image_srcset': srcsets(cookie)}
@@ -0,0 +1,153 @@
+# cookie_app/inventory.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+
+from . import catalog
+from .models import Cookie
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more cart lines cannot be covered by current stock"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(self.message)
+
+    @property
+    def message(self):
+        parts = []
+        for shortage in self.shortages:
+            if shortage['name'] is None:
+                parts.append(f"Cookie with ID {shortage['cookie_id']} not found.")
+            else:
+                parts.append(f"Not enough stock for {shortage['name']}. Only {shortage['available']} available.")
+        return ' '.join(parts)
+
+
+class _StockRace(Exception):
+    """Internal signal: a guarded UPDATE touched fewer rows than expected"""
+
+
+class StockReservation:
+    """Result of a reservation: the locked cookies and the quantities taken from each"""
+
+    def __init__(self, cookies, lines, shortages):
+        self.cookies = cookies      # {cookie_id: Cookie} as read under the lock
+        self.lines = lines          # {cookie_id: quantity} actually deducted
+        self.shortages = shortages  # lines skipped when allow_partial=True
+
+    @property
+    def total_amount(self):
+        total = Decimal('0.00')
+        for cookie_id, quantity in self.lines.items():
+            total += self.cookies[cookie_id].price * quantity
+        return total
+
+    def items(self):
+        """Yield (cookie, quantity, unit_price) for every reserved line"""
+        for cookie_id, quantity in self.lines.items():
+            cookie = self.cookies[cookie_id]
+            yield cookie, quantity, cookie.price
+
+
+def normalize_lines(lines):
+    """Merge cart lines into an ordered {cookie_id: quantity} map, dropping empty lines.
+
+    Accepts either a mapping of cookie_id -> quantity (the session cart) or an
+    iterable of (cookie_id, quantity) pairs.
+    """
+    pairs = lines.items() if hasattr(lines, 'items') else lines
+    merged = {}
+    for cookie_id, quantity in pairs:
+        cookie_id = int(cookie_id)
+        quantity = int(quantity)
+        if quantity > 0:
+            merged[cookie_id] = merged.get(cookie_id, 0) + quantity
+    return merged
+
+
+def _collect_shortages(requested, cookies):
+    shortages = []
+    for cookie_id, quantity in requested.items():
+        cookie = cookies.get(cookie_id)
+        if cookie is None:
+            shortages.append({'cookie_id': cookie_id, 'name': None, 'requested': quantity, 'available': 0})
+        elif cookie.stock_quantity < quantity:
+            shortages.append({
+                'cookie_id': cookie_id,
+                'name': cookie.name,
+                'requested': quantity,
+                'available': cookie.stock_quantity,
+            })
+    return shortages
+
+
+def _stock_delta(deltas):
+    """CASE expression that shifts stock_quantity by a per-row delta in one UPDATE"""
+    return Case(
+        *[When(id=cookie_id, then=F('stock_quantity') + delta) for cookie_id, delta in deltas.items()],
+        default=F('stock_quantity'),
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(lines, allow_partial=False):
+    """Deduct stock for every cart line in a single transaction.
+
+    Costs one locking SELECT and one guarded UPDATE regardless of the number of
+    lines. Raises InsufficientStock listing every short line, unless
+    allow_partial is set, in which case short lines are skipped and returned
+    on the reservation instead.
+    """
+    requested = normalize_lines(lines)
+    if not requested:
+        return StockReservation({}, {}, [])
+
+    try:
+        with transaction.atomic():
+            cookies = {c.id: c for c in Cookie.objects.select_for_update().filter(id__in=requested.keys())}
+
+            shortages = _collect_shortages(requested, cookies)
+            if shortages and not allow_partial:
+                raise InsufficientStock(shortages)
+
+            short_ids = {s['cookie_id'] for s in shortages}
+            reserved = {cid: qty for cid, qty in requested.items() if cid not in short_ids}
+
+            if reserved:
+                # The stock guard in the WHERE clause keeps this correct on
+                # backends where select_for_update() is a no-op (SQLite).
+                guard = Q()
+                for cookie_id, quantity in reserved.items():
+                    guard |= Q(id=cookie_id, stock_quantity__gte=quantity)
+                updated = Cookie.objects.filter(guard).update(
+                    stock_quantity=_stock_delta({cid: -qty for cid, qty in reserved.items()})
+                )
+                if updated != len(reserved):
+                    raise _StockRace()
+
+                crossed = False
+                for cookie_id, quantity in reserved.items():
+                    before = cookies[cookie_id].stock_quantity
+                    cookies[cookie_id].stock_quantity -= quantity
+                    crossed |= catalog.crosses_stock_threshold(before, before - quantity)
+                if crossed:
+                    # Sold out or low: the menus must show it
+                    catalog.invalidate()
+    except _StockRace:
+        fresh = {c.id: c for c in Cookie.objects.filter(id__in=requested.keys())}
+        raise InsufficientStock(_collect_shortages(requested, fresh))
+
+    return StockReservation(cookies, reserved, shortages)
+
+
+def release_stock(lines):
+    """Return quantities to stock (voids, cancellations) with a single UPDATE"""
+    returned = normalize_lines(lines)
+    if not returned:
+        return 0
+    # Rare enough not to bother checking which cookies come back into stock
+    catalog.invalidate()
+    return Cookie.objects.filter(id__in=returned.keys()).update(stock_quantity=_stock_delta(returned))
@@ -0,0 +1,180 @@
+# cookie_app/journal.py
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .models import IdSequence, JournalEvent
+from .sequences import allocate
+
+DEFAULT_BACKEND = 'cookie_app.journal.DatabaseJournal'
+
+
+class BaseJournal:
+    """Shared counters plus an append-only event journal.
+
+    Every worker process must see the same counters and the same event
+    sequence, so ``since(seq)`` answers "what changed after seq" the same way
+    wherever a client's request lands. Events are dicts with ``id`` (the
+    monotonic sequence), ``type`` and ``data``.
+    """
+
+    def __init__(self, max_events=1000):
+        self.max_events = max_events
+
+    def incr(self, name, amount=1):
+        """Atomically add ``amount`` to a counter and return the new value"""
+        raise NotImplementedError
+
+    def get(self, name):
+        raise NotImplementedError
+
+    def append(self, event_type, data):
+        """Add an event and return it with its sequence number"""
+        raise NotImplementedError
+
+    def since(self, seq, limit=100):
+        """Events after ``seq``, oldest first"""
+        raise NotImplementedError
+
+    def latest(self):
+        """Sequence number of the newest event (0 when empty)"""
+        raise NotImplementedError
+
+
+class DatabaseJournal(BaseJournal):
+    """Default backend: counters live in IdSequence, events in JournalEvent.
+
+    Works with SQLite out of the box and with PostgreSQL when DATABASE_URL
+    points there; every worker using the same database shares the journal.
+    """
+
+    def incr(self, name, amount=1):
+        counter = f"counter:{name}"
+        return allocate([counter], step=amount)[counter]
+
+    def get(self, name):
+        return IdSequence.objects.filter(name=f"counter:{name}").values_list('value', flat=True).first() or 0
+
+    def append(self, event_type, data):
+        event = JournalEvent.objects.create(kind=event_type, data=data)
+        if event.id % 100 == 0:
+            JournalEvent.objects.filter(id__lte=event.id - self.max_events).delete()
+        return {'id': event.id, 'type': event_type, 'data': data}
+
+    def since(self, seq, limit=100):
+        return [
+            {'id': event_id, 'type': kind, 'data': data}
+            for event_id, kind, data in JournalEvent.objects.filter(id__gt=seq).order_by('id').values_list(
+                'id', 'kind', 'data'
+            )[:limit]
+        ]
+
+    def latest(self):
+        return JournalEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+class LocalJournal(BaseJournal):
+    """In-process journal for tests and single-process development.
+
+    Also the local stand-in for RedisJournal: nothing is shared between
+    worker processes.
+    """
+
+    def __init__(self, max_events=1000):
+        super().__init__(max_events)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            return self._counters[name]
+
+    def get(self, name):
+        return self._counters.get(name, 0)
+
+    def append(self, event_type, data):
+        with self._lock:
+            self._seq += 1
+            event = {'id': self._seq, 'type': event_type, 'data': data}
+            self._events.append(event)
+        return event
+
+    def since(self, seq, limit=100):
+        with self._lock:
+            return [event for event in self._events if event['id'] > seq][:limit]
+
+    def latest(self):
+        return self._seq
+
+
+class RedisJournal(BaseJournal):
+    """Counters and journal in Redis (or anything speaking its protocol).
+
+    Needs the optional ``redis`` package unless a ready-made ``client`` with
+    the redis-py API is passed in. Counters use INCRBY; events sit in a sorted
+    set scored by a sequence from INCR, trimmed to ``max_events``.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='cookie', client=None, max_events=1000):
+        super().__init__(max_events)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured('RedisJournal requires the redis package (pip install redis)')
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def incr(self, name, amount=1):
+        return int(self.client.incrby(self._key('counter', name), amount))
+
+    def get(self, name):
+        return int(self.client.get(self._key('counter', name)) or 0)
+
+    def append(self, event_type, data):
+        seq = int(self.client.incr(self._key('journal', 'seq')))
+        event = {'id': seq, 'type': event_type, 'data': data}
+        events_key = self._key('journal', 'events')
+        pipe = self.client.pipeline()
+        pipe.zadd(events_key, {json.dumps(event): seq})
+        pipe.zremrangebyrank(events_key, 0, -self.max_events - 1)
+        pipe.execute()
+        return event
+
+    def since(self, seq, limit=100):
+        raw = self.client.zrangebyscore(self._key('journal', 'events'), f'({seq}', '+inf', start=0, num=limit)
+        return [json.loads(item) for item in raw]
+
+    def latest(self):
+        return int(self.client.get(self._key('journal', 'seq')) or 0)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """The configured journal backend.
+
+    Set ORDER_JOURNAL = {'BACKEND': 'cookie_app.journal.RedisJournal', 'OPTIONS': {'url': ...}}
+    to change it; the default is DatabaseJournal.
+    """
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                config = getattr(settings, 'ORDER_JOURNAL', {})
+                backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+                _journal = backend(**config.get('OPTIONS', {}))
+    return _journal
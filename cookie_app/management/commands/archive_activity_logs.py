@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cookie_app.models import ActivityLog
+from cookie_app.retention import archive_activity_logs, archived_months, export_archived_month, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Move activity logs older than the retention window into the archive table, '
+        'and optionally export whole archived months to gzipped JSONL files. Safe to run on a schedule.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep this many days in the live table (default ACTIVITY_LOG_RETENTION_DAYS, 90)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows moved per transaction')
+        parser.add_argument('--export-dir', help='Write each archived month before the cutoff to DIR/activity-YYYY-MM.jsonl.gz')
+        parser.add_argument('--purge', action='store_true', help='With --export-dir, delete exported months from the archive table')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['purge'] and not options['export_dir']:
+            raise CommandError('--purge only applies together with --export-dir')
+
+        cutoff = retention_cutoff(options['days'])
+        if options['dry_run']:
+            count = ActivityLog.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f"{count} activity logs older than {cutoff:%Y-%m-%d %H:%M} would be archived")
+            return
+
+        moved = archive_activity_logs(cutoff, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} activity logs older than {cutoff:%Y-%m-%d %H:%M}"
+        ))
+
+        if options['export_dir']:
+            for year, month in archived_months(cutoff):
+                path, rows = export_archived_month(year, month, options['export_dir'], purge=options['purge'])
+                if rows is None:
+                    self.stdout.write(f"{path} already exists, skipped")
+                else:
+                    purged = ' and purged it from the archive table' if options['purge'] else ''
+                    self.stdout.write(self.style.SUCCESS(f"Exported {rows} rows to {path}{purged}"))
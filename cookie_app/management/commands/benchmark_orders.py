@@ -0,0 +1,381 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+from django.contrib.messages import get_messages
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from cookie_app import activity
+from cookie_app.models import Category, Cookie, Customer, Order, OrderItem, Staff, UserProfile
+
+SCENARIOS = ('kiosk', 'customer', 'staff')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean': round(sum(samples) / len(samples), 2),
+        'p50': round(percentile(samples, 50), 2),
+        'p95': round(percentile(samples, 95), 2),
+        'p99': round(percentile(samples, 99), 2),
+        'max': round(samples[-1], 2),
+    }
+
+
+class _LockTimer:
+    """Times the statements that take the stock locks in reserve_stock().
+
+    That is the SELECT ... FOR UPDATE on the cookie rows and the guarded stock
+    UPDATE. On PostgreSQL their duration is dominated by row-lock waits under
+    contention; on SQLite (which ignores FOR UPDATE) the UPDATE is where a
+    writer waits for the database write lock.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        locking = 'FOR UPDATE' in sql or sql.startswith('UPDATE "cookie_app_cookie"')
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if locking:
+                self.total += time.perf_counter() - start
+
+
+class Worker(threading.Thread):
+    """One simulated kiosk, customer or staff member placing orders back to back"""
+
+    def __init__(self, scenario, user, cookie_ids, orders, seed, barrier):
+        super().__init__(name=f'{scenario}-{seed}')
+        self.scenario = scenario
+        self.user = user
+        self.cookie_ids = cookie_ids
+        self.orders = orders
+        self.rng = random.Random(seed)
+        self.barrier = barrier
+        self.latencies = []
+        self.lock_waits = []
+        self.outcomes = Counter()
+
+    def cart(self):
+        cookie_ids = self.rng.sample(self.cookie_ids, self.rng.randint(1, min(3, len(self.cookie_ids))))
+        return {cookie_id: self.rng.randint(1, 3) for cookie_id in cookie_ids}
+
+    def run(self):
+        client = Client(raise_request_exception=False)
+        if self.user is not None:
+            client.force_login(self.user)
+        timer = _LockTimer()
+        try:
+            with connection.execute_wrapper(timer):
+                self.barrier.wait()
+                for _ in range(self.orders):
+                    cart = self.cart()
+                    if self.scenario == 'customer':
+                        # Filling the session cart is browsing, not checkout; it isn't timed
+                        for cookie_id, quantity in cart.items():
+                            client.post(
+                                reverse('update_cart_item'),
+                                json.dumps({'cookie_id': cookie_id, 'quantity': quantity}),
+                                content_type='application/json', secure=True, HTTP_HOST='localhost',
+                            )
+                    waited = timer.total
+                    start = time.perf_counter()
+                    try:
+                        outcome = getattr(self, f'place_{self.scenario}_order')(client, cart)
+                    except Exception as e:
+                        outcome = f'error:{type(e).__name__}'
+                    # Only completed orders are timed; failures are counted in the outcomes
+                    if outcome == 'ok':
+                        self.latencies.append((time.perf_counter() - start) * 1000)
+                    self.lock_waits.append((timer.total - waited) * 1000)
+                    self.outcomes[outcome] += 1
+        finally:
+            connection.close()
+
+    def place_kiosk_order(self, client, cart):
+        response = client.post(
+            reverse('kiosk_order'),
+            json.dumps({
+                'items': [{'cookie_id': cookie_id, 'quantity': quantity} for cookie_id, quantity in cart.items()],
+                'customer_name': 'Benchmark Kiosk',
+                'payment_method': 'cash',
+            }),
+            content_type='application/json', secure=True, HTTP_HOST='localhost',
+        )
+        return self._json_outcome(response)
+
+    def place_customer_order(self, client, cart):
+        response = client.post(
+            reverse('place_order'), {'payment_method': 'cash'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', secure=True, HTTP_HOST='localhost',
+        )
+        return self._json_outcome(response)
+
+    def place_staff_order(self, client, cart):
+        data = {'order_type': 'walkin', 'payment_method': 'cash', 'amount_paid': '100000'}
+        data.update({f'cookie_{cookie_id}': quantity for cookie_id, quantity in cart.items()})
+        response = client.post(reverse('staff_record_sale'), data, secure=True, HTTP_HOST='localhost')
+        if response.status_code == 302 and '/order-receipt/' in response['Location']:
+            return 'ok'
+        # Any other outcome redirects back to the form with a message saying why
+        errors = [str(message) for message in get_messages(response.wsgi_request)]
+        if any(message.startswith('Not enough stock') for message in errors):
+            return 'out_of_stock'
+        return f"error:{(errors[0] if errors else response.status_code)}"[:66]
+
+    @staticmethod
+    def _json_outcome(response):
+        if response.status_code != 200:
+            return f'error:{response.status_code}'
+        payload = response.json()
+        if payload.get('success'):
+            return 'ok'
+        if payload.get('shortages'):
+            return 'out_of_stock'
+        # The carts are always valid, so anything else is a failure (e.g. a lock error)
+        return f"error:{str(payload.get('error'))[:60]}"
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent kiosk, customer and staff order placement against a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kiosks', type=int, default=4, help='Concurrent kiosks posting to kiosk_order')
+        parser.add_argument('--customers', type=int, default=4, help='Concurrent customers calling place_order')
+        parser.add_argument('--staff', type=int, default=2, help='Concurrent staff using staff_record_sale')
+        parser.add_argument('--orders', type=int, default=50, help='Orders each simulated client places')
+        parser.add_argument('--cookies', type=int, default=12, help='Number of cookies on the menu')
+        parser.add_argument('--stock', type=int, default=1000,
+                            help='Starting stock per cookie; set it low to benchmark contention for the last units')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the carts')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Earlier --output file to print the change against')
+
+    def handle(self, *args, **options):
+        if options['cookies'] < 1 or options['orders'] < 1:
+            raise CommandError('--cookies and --orders must be at least 1')
+        clients = options['kiosks'] + options['customers'] + options['staff']
+        if not clients:
+            raise CommandError('Nothing to run: --kiosks, --customers and --staff are all 0')
+        if connection.vendor == 'sqlite' and clients > 1:
+            raise CommandError(
+                'SQLite fails concurrent writers with "database is locked" instead of queueing them, so the '
+                'figures would not mean anything. Point DATABASE_URL at PostgreSQL, or run a single client '
+                '(e.g. --kiosks 1 --customers 0 --staff 0).'
+            )
+
+        setup_test_environment()
+        old_name, sqlite_file = self._create_database()
+        try:
+            # Refill threads could outlive the run and write to the real database
+            with override_settings(ID_POOL_BACKGROUND_REFILL=False):
+                results = self._run(options)
+        finally:
+            # Buffered activity logs must not be flushed after the connection
+            # points back at the real database
+            activity.buffer.discard()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if sqlite_file:
+                with contextlib.suppress(OSError):
+                    os.remove(sqlite_file)
+            teardown_test_environment()
+
+        self._report(results, options.get('compare'))
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _create_database(self):
+        """Create and migrate a test database next to the configured one"""
+        sqlite_file = None
+        if connection.vendor == 'sqlite':
+            # A file, not the usual in-memory test database, so every client thread shares it
+            handle, sqlite_file = tempfile.mkstemp(prefix='cookie-benchmark-', suffix='.sqlite3')
+            os.close(handle)
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = sqlite_file
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return old_name, sqlite_file
+
+    def _seed(self, options):
+        category = Category.objects.create(name='Benchmark')
+        flavors = [flavor for flavor, _ in Cookie.FLAVOR_CHOICES]
+        cookies = [
+            Cookie.objects.create(
+                category=category, name=f'Benchmark Cookie {n + 1}', flavor=flavors[n % len(flavors)],
+                price=Decimal(40 + n % 8 * 5), stock_quantity=options['stock'],
+            )
+            for n in range(options['cookies'])
+        ]
+        staff_users = []
+        for n in range(options['staff']):
+            user = User.objects.create_user(f'bench-staff{n}', f'bench-staff{n}@example.com', 'benchmark')
+            Staff.objects.create(user=user, role='staff', is_active=True)
+            staff_users.append(user)
+        customer_users = []
+        for n in range(options['customers']):
+            user = User.objects.create_user(f'bench-customer{n}', f'bench-customer{n}@example.com', 'benchmark')
+            profile = UserProfile.objects.create(user=user, user_type='customer')
+            Customer.objects.create(user_profile=profile, name=f'Benchmark Customer {n}', email=user.email)
+            customer_users.append(user)
+        return [cookie.id for cookie in cookies], {'kiosk': [None] * options['kiosks'], 'customer': customer_users, 'staff': staff_users}
+
+    def _run(self, options):
+        cookie_ids, users = self._seed(options)
+        starting_stock = dict(Cookie.objects.values_list('id', 'stock_quantity'))
+        connection.close()
+
+        clients = [(scenario, user) for scenario in SCENARIOS for user in users[scenario]]
+        barrier = threading.Barrier(len(clients) + 1)
+        workers = [
+            Worker(scenario, user, cookie_ids, options['orders'], options['seed'] * 1000 + n, barrier)
+            for n, (scenario, user) in enumerate(clients)
+        ]
+        # The views print debugging output and tracebacks on every order; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            # Into the benchmark database, outside the timed part
+            activity.buffer.flush()
+
+        scenarios = {}
+        for scenario in SCENARIOS:
+            group = [worker for worker in workers if worker.scenario == scenario]
+            if not group:
+                continue
+            outcomes = sum((worker.outcomes for worker in group), Counter())
+            scenarios[scenario] = {
+                'clients': len(group),
+                'attempts': sum(outcomes.values()),
+                'orders': outcomes['ok'],
+                'errors': sum(count for outcome, count in outcomes.items() if outcome.startswith('error:')),
+                'orders_per_second': round(outcomes['ok'] / elapsed, 2),
+                'outcomes': dict(outcomes),
+                'latency_ms': latency_summary([ms for worker in group for ms in worker.latencies]),
+                'lock_wait_ms': latency_summary([ms for worker in group for ms in worker.lock_waits]),
+            }
+        total_orders = sum(entry['orders'] for entry in scenarios.values())
+        lock_waits = [ms for worker in workers for ms in worker.lock_waits]
+
+        return {
+            'commit': self._commit(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('kiosks', 'customers', 'staff', 'orders', 'cookies', 'stock', 'seed')},
+            'elapsed_seconds': round(elapsed, 3),
+            'orders': total_orders,
+            'errors': sum(entry['errors'] for entry in scenarios.values()),
+            'orders_per_second': round(total_orders / elapsed, 2),
+            'latency_ms': latency_summary([ms for worker in workers for ms in worker.latencies]),
+            'lock_wait_ms': dict(latency_summary(lock_waits), total=round(sum(lock_waits), 2)),
+            'scenarios': scenarios,
+            'stock': self._check_stock(starting_stock, total_orders),
+        }
+
+    def _check_stock(self, starting_stock, reported_orders):
+        """Stock left must equal starting stock minus every unit sold, and never go negative"""
+        sold = dict(
+            OrderItem.objects.exclude(order__status__in=['voided', 'cancelled'])
+            .values_list('cookie_id').annotate(units=Sum('quantity'))
+        )
+        violations = []
+        for cookie_id, stock in Cookie.objects.values_list('id', 'stock_quantity'):
+            expected = starting_stock[cookie_id] - sold.get(cookie_id, 0)
+            if stock != expected or stock < 0:
+                violations.append({'cookie_id': cookie_id, 'stock': stock, 'expected': expected})
+        recorded_orders = Order.objects.count()
+        return {
+            'violations': violations,
+            'orders_recorded': recorded_orders,
+            'orders_reported': reported_orders,
+            'consistent': not violations and recorded_orders == reported_orders,
+        }
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _report(self, results, compare_path):
+        latency = results['latency_ms']
+        self.stdout.write(
+            f"{results['orders']} orders in {results['elapsed_seconds']}s on {results['database']} "
+            f"({results['orders_per_second']} orders/s)"
+        )
+        self.stdout.write(
+            f"latency ms: p50 {latency.get('p50')}  p95 {latency.get('p95')}  p99 {latency.get('p99')}  "
+            f"lock wait total {results['lock_wait_ms']['total']}ms"
+        )
+        for scenario, entry in results['scenarios'].items():
+            self.stdout.write(
+                f"  {scenario:<9} {entry['clients']} clients  {entry['orders']}/{entry['attempts']} ok  "
+                f"{entry['orders_per_second']} orders/s  p95 {entry['latency_ms'].get('p95')}ms  "
+                f"outcomes {entry['outcomes']}"
+            )
+        if results['errors']:
+            self.stdout.write(self.style.ERROR(
+                f"{results['errors']} attempts failed with errors (see outcomes); "
+                f"latency covers completed orders only, so treat these figures with care"
+            ))
+
+        if compare_path:
+            with open(compare_path) as handle:
+                previous = json.load(handle)
+            for label, key in (('orders/s', 'orders_per_second'), ('p95 ms', 'p95'), ('p99 ms', 'p99')):
+                now = results[key] if key == 'orders_per_second' else latency.get(key)
+                before = previous[key] if key == 'orders_per_second' else previous['latency_ms'].get(key)
+                if now is not None and before:
+                    self.stdout.write(f"  {label}: {before} -> {now} ({(now - before) / before * 100:+.1f}%)")
+
+        stock = results['stock']
+        if stock['consistent']:
+            self.stdout.write(self.style.SUCCESS('Stock consistent: no oversells or lost updates'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"Stock inconsistent: {len(stock['violations'])} cookie(s) off, "
+                f"{stock['orders_recorded']} orders recorded vs {stock['orders_reported']} reported"
+            ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from cookie_app.images import generate_derivatives, needs_derivatives
+from cookie_app.models import Cookie
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized WebP/AVIF copies of cookie photos used in menu srcsets (backfill).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-encode every photo, replacing existing derivatives')
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for cookie in Cookie.objects.exclude(image='').exclude(image__isnull=True).order_by('id'):
+            if not options['force'] and not needs_derivatives(cookie):
+                continue
+            try:
+                variants = generate_derivatives(cookie, force=options['force'])
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{cookie.name}: {e}"))
+                continue
+            done += 1
+            self.stdout.write(f"{cookie.name}: {len(variants['widths'])} widths x {', '.join(variants['formats'])}")
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} cookies ({failed} failed)"))
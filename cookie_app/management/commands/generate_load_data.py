@@ -0,0 +1,395 @@
+import contextlib
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from cookie_app import rollups
+from cookie_app.dates import business_date, day_start
+from cookie_app.events import ORDERS_VERSION
+from cookie_app.journal import get_journal
+from cookie_app.models import (
+    ActivityLog, CashFloat, Category, Cookie, Customer, Order, OrderItem, Staff, UserProfile, VoidLog,
+)
+from cookie_app.sequences import allocate, next_hex_ids, order_sequence_name
+
+FIRST_NAMES = [
+    'Maria', 'Jose', 'Ana', 'Juan', 'Carmen', 'Mark', 'Angel', 'John', 'Grace', 'Paolo',
+    'Bea', 'Miguel', 'Kristine', 'Rafael', 'Joy', 'Carlo', 'Nicole', 'Enrico', 'Patricia', 'Luis',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas', 'Andrada',
+    'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino', 'Navarro', 'Salazar', 'Mercado',
+]
+CATEGORIES = ['Classic', 'Premium', 'Seasonal', 'Specialty']
+VOID_REASONS = ['Customer changed mind', 'Wrong item entered', 'Duplicate order', 'Payment failed']
+# Share of the day's orders placed in each opening hour (9:00-21:00): lunch and after-school peaks
+HOUR_WEIGHTS = {9: 3, 10: 5, 11: 8, 12: 12, 13: 11, 14: 7, 15: 8, 16: 11, 17: 12, 18: 10, 19: 7, 20: 4, 21: 2}
+# Busier towards the weekend (Monday first)
+WEEKDAY_WEIGHTS = [0.85, 0.85, 0.9, 0.95, 1.15, 1.35, 1.3]
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created/updated times we set instead of stamping now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def spread(total, weights):
+    """Split ``total`` into integers proportional to ``weights`` (largest remainder)"""
+    scale = total / sum(weights)
+    shares = [weight * scale for weight in weights]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert a large, realistic and reproducible data set for scale and performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000, help='Registered customers to create')
+        parser.add_argument('--staff', type=int, default=10, help='Staff members to create')
+        parser.add_argument('--orders', type=int, default=100000, help='Orders to create')
+        parser.add_argument('--days', type=int, default=180, help='Spread orders over this many days up to --end')
+        parser.add_argument('--end', help='Last business date with orders (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--cookies', type=int, default=0,
+                            help='Cookies to add to the menu; by default existing cookies are used, '
+                                 'or one per flavor when there are none')
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Random seed; on an empty database the same seed and --end give the same data (order numbers '
+                 'and hex ids come from the shared counters, so they follow on from any existing orders)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Orders inserted per transaction')
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help='Do not rebuild the daily rollups for the generated dates')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['seed'] <= 99999:
+            raise CommandError('--seed must be between 0 and 99999')
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days and --chunk-size must be at least 1')
+        if options['orders'] and not options['staff']:
+            raise CommandError('Orders need at least one staff member (--staff)')
+        try:
+            self.end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else business_date()
+        except ValueError:
+            raise CommandError('--end must be in YYYY-MM-DD format')
+
+        self.seed = options['seed']
+        self.prefix = f'load{self.seed}-'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Data for seed {self.seed} already exists (users named {self.prefix}*); pick another --seed'
+            )
+        self.rng = random.Random(self.seed)
+        self.start = self.end - timedelta(days=options['days'] - 1)
+        self.now = timezone.now()
+        self.counts = {}
+        started = time.perf_counter()
+
+        with explicit_timestamps(User, UserProfile, Customer, Staff, Cookie, Order, VoidLog, ActivityLog, CashFloat):
+            with transaction.atomic():
+                self.cookies = self._cookies(options['cookies'])
+                self.staff_members = self._staff(options['staff'])
+                self.customers = self._customers(options['customers'])
+                self._cash_floats()
+            if options['orders']:
+                self._orders(options['orders'], options['chunk_size'])
+
+        if options['orders'] and not options['skip_rollups']:
+            self.stdout.write('Rebuilding daily rollups...')
+            rollups.rebuild(self.start, self.end)
+        get_journal().incr(ORDERS_VERSION)
+
+        elapsed = time.perf_counter() - started
+        rows = sum(self.counts.values())
+        summary = ', '.join(f'{count} {name}' for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s): {summary}'
+        ))
+
+    def _count(self, name, amount):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def _moment(self, day, hour=None):
+        hour = hour if hour is not None else self.rng.choices(list(HOUR_WEIGHTS), list(HOUR_WEIGHTS.values()))[0]
+        moment = day_start(day) + timedelta(hours=hour, seconds=self.rng.randrange(3600))
+        if moment > self.now:
+            # Today's trading isn't over yet: squeeze the order into the hours so far
+            moment = day_start(day) + (self.now - day_start(day)) * self.rng.random()
+        return moment
+
+    def _cookies(self, count):
+        existing = list(Cookie.objects.all())
+        if existing and not count:
+            cookies = existing
+        else:
+            count = count or len(Cookie.FLAVOR_CHOICES)
+            categories = []
+            for name in CATEGORIES:
+                category, _ = Category.objects.get_or_create(name=name)
+                categories.append(category)
+            now = day_start(self.start)
+            new = Cookie.objects.bulk_create(
+                Cookie(
+                    category=categories[n % len(categories)],
+                    name=f'{Cookie.FLAVOR_CHOICES[n % len(Cookie.FLAVOR_CHOICES)][1]} Cookie'
+                         + (f' #{n // len(Cookie.FLAVOR_CHOICES) + 1}' if n >= len(Cookie.FLAVOR_CHOICES) else ''),
+                    flavor=Cookie.FLAVOR_CHOICES[n % len(Cookie.FLAVOR_CHOICES)][0],
+                    price=Decimal(self.rng.randrange(35, 125)),
+                    stock_quantity=self.rng.randrange(200, 1000),
+                    created_at=now,
+                    updated_at=now,
+                )
+                for n in range(count)
+            )
+            self._count('cookies', len(new))
+            cookies = existing + new
+        # A few best sellers and a long tail
+        self.rng.shuffle(cookies)
+        self.cookie_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(cookies))]
+        return cookies
+
+    def _users(self, kind, count, joined):
+        password = make_password(f'{self.prefix}password')
+        users = User.objects.bulk_create(
+            User(
+                username=f'{self.prefix}{kind}{n}',
+                email=f'{self.prefix}{kind}{n}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+                date_joined=joined(),
+            )
+            for n in range(count)
+        )
+        self._count('users', len(users))
+        return users
+
+    def _staff(self, count):
+        joined = day_start(self.start) - timedelta(days=30)
+        users = self._users('staff', count, lambda: joined)
+        roles = ['admin' if n == 0 else 'manager' if n % 5 == 0 else 'staff' for n in range(count)]
+        UserProfile.objects.bulk_create(
+            UserProfile(user=user, user_type='staff' if role == 'staff' else 'admin', date_joined=joined)
+            for user, role in zip(users, roles)
+        )
+        staff = Staff.objects.bulk_create(
+            Staff(user=user, staff_id=f'LG{self.seed}-S{n:04d}', role=role, is_active=True, date_joined=joined)
+            for n, (user, role) in enumerate(zip(users, roles))
+        )
+        self._count('profiles', len(users))
+        self._count('staff', len(staff))
+        return staff
+
+    def _customers(self, count):
+        def joined():
+            return self._moment(self.start + timedelta(days=self.rng.randrange((self.end - self.start).days + 1)))
+
+        users = self._users('customer', count, joined)
+        profiles = UserProfile.objects.bulk_create(
+            (
+                UserProfile(
+                    user=user, user_type='customer', customer_id=f'LG{self.seed}-{n:08d}',
+                    phone_number=f'09{self.rng.randrange(10 ** 9):09d}', date_joined=user.date_joined,
+                )
+                for n, user in enumerate(users)
+            ),
+            batch_size=5000,
+        )
+        customers = Customer.objects.bulk_create(
+            (
+                Customer(
+                    user_profile=profile, name=f'{profile.user.first_name} {profile.user.last_name}',
+                    phone=profile.phone_number, email=profile.user.email, is_email_verified=True,
+                    ftue_completed=True, date_joined=profile.date_joined,
+                )
+                for profile in profiles
+            ),
+            batch_size=5000,
+        )
+        self._count('profiles', len(profiles))
+        self._count('customers', len(customers))
+        return customers
+
+    def _cash_floats(self):
+        floats = []
+        day = self.start
+        while day <= self.end:
+            opener = self.rng.choice(self.staff_members).user
+            opened = self._moment(day, hour=8)
+            floats.append(CashFloat(
+                date=day, float_type='opening', amount=Decimal(self.rng.choice([1500, 2000, 2500])),
+                staff=opener, created_at=opened, updated_at=opened,
+            ))
+            if self.rng.random() < 0.15:
+                adjustment = self.rng.choice(['shortage', 'excess', 'change_add', 'change_remove'])
+                moment = self._moment(day)
+                floats.append(CashFloat(
+                    date=day, float_type='adjustment', adjustment_type=adjustment,
+                    amount=Decimal(self.rng.randrange(20, 500)), staff=opener,
+                    notes='Generated adjustment', created_at=moment, updated_at=moment,
+                ))
+            if day < self.end:
+                closed = self._moment(day, hour=21)
+                floats.append(CashFloat(
+                    date=day, float_type='closing', amount=Decimal(self.rng.randrange(5000, 30000)),
+                    staff=opener, created_at=closed, updated_at=closed,
+                ))
+            day += timedelta(days=1)
+        CashFloat.objects.bulk_create(floats, batch_size=5000)
+        self._count('cash floats', len(floats))
+
+    def _day_counts(self, total):
+        days = [self.start + timedelta(days=n) for n in range((self.end - self.start).days + 1)]
+        weights = [
+            # Gentle growth over the period, weekly rhythm and day-to-day noise
+            (0.7 + 0.3 * n / max(1, len(days) - 1)) * WEEKDAY_WEIGHTS[day.weekday()] * self.rng.uniform(0.85, 1.15)
+            for n, day in enumerate(days)
+        ]
+        return zip(days, spread(total, weights))
+
+    def _status(self, today):
+        if today:
+            choices = {'completed': 60, 'pending': 20, 'preparing': 8, 'ready': 7, 'voided': 3, 'cancelled': 2}
+        else:
+            choices = {'completed': 90, 'voided': 4, 'cancelled': 3, 'pending': 2, 'preparing': 0.5, 'ready': 0.5}
+        return self.rng.choices(list(choices), list(choices.values()))[0]
+
+    def _orders(self, total, chunk_size):
+        self.hex_ids = iter(next_hex_ids(total))
+        batch = []
+        for day, count in self._day_counts(total):
+            types = ['kiosk' if self.rng.random() < 0.55 else 'staff' for _ in range(count)]
+            numbers = {}
+            for prefix, order_type in (('KIO', 'kiosk'), ('STA', 'staff')):
+                needed = types.count(order_type)
+                if needed:
+                    name = order_sequence_name(prefix, day)
+                    numbers[order_type] = itertools.count(allocate([name], step=needed)[name] - needed + 1)
+            for order_type in types:
+                batch.append(self._order(day, order_type, next(numbers[order_type])))
+                if len(batch) >= chunk_size:
+                    self._flush(batch)
+                    batch = []
+            if batch and day == self.end:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _order(self, day, order_type, number):
+        rng = self.rng
+        created = self._moment(day)
+        status = self._status(day == self.end)
+        payment_method = 'cash' if rng.random() < 0.6 else 'gcash'
+        customer = rng.choice(self.customers) if self.customers and order_type == 'kiosk' and rng.random() < 0.4 else None
+        staff = rng.choice(self.staff_members)
+        paid = status in ('completed', 'voided') or (status in ('preparing', 'ready') and rng.random() < 0.7)
+        finished = min(created + timedelta(minutes=rng.randint(2, 25)), self.now)
+
+        items = []
+        total = Decimal('0.00')
+        for cookie in set(rng.choices(self.cookies, self.cookie_weights, k=rng.randint(1, 4))):
+            quantity = rng.choices([1, 2, 3, 4, 6, 12], [30, 25, 15, 10, 12, 8])[0]
+            items.append(OrderItem(cookie=cookie, quantity=quantity, price=cookie.price))
+            total += cookie.price * quantity
+
+        prefix = 'KIO' if order_type == 'kiosk' else 'STA'
+        order = Order(
+            order_id=f"{prefix}-{day.strftime('%Y%m%d')}-{number:03d}",
+            hex_id=next(self.hex_ids),
+            customer=customer,
+            customer_name=customer.name if customer else ('Walk-in Customer' if order_type == 'staff' else 'Kiosk Customer'),
+            customer_phone=customer.phone if customer else '',
+            staff=staff.user if order_type == 'staff' or paid else None,
+            order_type=order_type,
+            total_amount=total,
+            payment_method=payment_method,
+            status=status,
+            is_paid=paid,
+            created_at=created,
+            updated_at=finished if status != 'pending' else created,
+            paid_at=finished if paid else None,
+            completed_at=finished if status == 'completed' else None,
+        )
+        if payment_method == 'cash' and paid:
+            order.cash_received = total if rng.random() < 0.3 else (total / 100).quantize(Decimal('1')) * 100 + 100
+            order.change = order.cash_received - total
+        elif payment_method == 'gcash':
+            order.gcash_reference = f'{rng.randrange(10 ** 13):013d}'
+            if paid:
+                order.gcash_amount = total
+                order.gcash_verified_by = staff.user
+                order.gcash_verified_at = finished
+        return order, items, staff
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            orders = Order.objects.bulk_create([order for order, _, _ in batch])
+            items = []
+            for order, lines, _ in batch:
+                for item in lines:
+                    item.order = order
+                    items.append(item)
+            OrderItem.objects.bulk_create(items)
+
+            voids = []
+            logs = []
+            for order, _, staff in batch:
+                user = order.staff if order.order_type == 'staff' else None
+                logs.append(ActivityLog(
+                    user=user, staff=staff if user else None, action='order_created',
+                    description=f'Order created: {order.order_id} - ₱{order.total_amount:.2f}',
+                    timestamp=order.created_at, ip_address=f'192.168.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}',
+                    affected_model='Order', affected_id=order.pk,
+                ))
+                if order.status == 'completed':
+                    logs.append(ActivityLog(
+                        user=staff.user, staff=staff, action='order_completed',
+                        description=f'Order completed: {order.order_id}', timestamp=order.completed_at,
+                        affected_model='Order', affected_id=order.pk,
+                    ))
+                elif order.status == 'voided':
+                    voided = min(order.updated_at + timedelta(minutes=self.rng.randint(1, 90)), self.now)
+                    voids.append(VoidLog(
+                        order=order, staff_member=staff, admin_user=self.staff_members[0].user,
+                        void_date=voided, reason=self.rng.choice(VOID_REASONS),
+                        original_total=order.total_amount, original_payment_method=order.payment_method,
+                        void_id=f'VOIDG{order.pk}',
+                    ))
+                    logs.append(ActivityLog(
+                        user=staff.user, staff=staff, action='order_voided',
+                        description=f'Order voided: {order.order_id}', timestamp=voided,
+                        affected_model='Order', affected_id=order.pk,
+                    ))
+            VoidLog.objects.bulk_create(voids)
+            ActivityLog.objects.bulk_create(logs)
+
+        self._count('orders', len(orders))
+        self._count('order items', len(items))
+        self._count('void logs', len(voids))
+        self._count('activity logs', len(logs))
+        self.stdout.write(f"  {self.counts['orders']} orders up to {batch[-1][0].created_at.date()}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from cookie_app.media_index import indexed_directories, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Index the photos in MEDIA_INDEX_DIRS (default media/cookies and media/) with their sizes and '
+        'srcset derivatives, for the landing page. Run after copying images in outside the app.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-read and re-encode images that are already indexed')
+
+    def handle(self, *args, **options):
+        indexed, removed, failures = rebuild(force=options['force'])
+        for name, error in failures:
+            self.stdout.write(self.style.ERROR(f"{name}: {error}"))
+        directories = ', '.join(directory or '.' for directory in indexed_directories())
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} images and removed {removed} missing ones ({directories})"
+        ))
@@ -0,0 +1,53 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cookie_app.receipts import discard, fail_abandoned, process_receipt, staged_receipts, staging_dir
+
+
+class Command(BaseCommand):
+    help = (
+        'Process GCash receipts left in the staging directory by a worker that stopped '
+        '(e.g. a restart), mark receipts that were never handed off as failed, and clear '
+        'out uploads whose order never committed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=int, default=24, help='Delete unclaimed uploads older than this')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=10,
+            help='Leave receipts staged more recently than this to the running worker',
+        )
+
+    def handle(self, *args, **options):
+        grace = options['grace_minutes'] * 60
+        done = failed = 0
+        for order_id, path in staged_receipts():
+            try:
+                if os.path.getmtime(path) > time.time() - grace:
+                    continue
+            except FileNotFoundError:
+                continue
+            stored = process_receipt(order_id, path)
+            if stored:
+                done += 1
+            elif stored is False:
+                failed += 1
+        abandoned = fail_abandoned(timezone.now() - timedelta(seconds=grace))
+
+        cutoff = time.time() - options['max_age_hours'] * 3600
+        directory = staging_dir()
+        cleared = 0
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if filename.startswith('incoming-') and os.path.getmtime(path) < cutoff:
+                discard(path)
+                cleared += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {done} staged receipts ({failed} unreadable), marked {abandoned} never handed off as failed, "
+            f"cleared {cleared} unclaimed uploads"
+        ))
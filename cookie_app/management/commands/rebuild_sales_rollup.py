@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from cookie_app.rollups import rebuild
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily sales and cookie rollups from raw orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First business date to rebuild (YYYY-MM-DD); defaults to the beginning')
+        parser.add_argument('--end', help='Last business date to rebuild (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        sales_rows, cookie_rows = rebuild(start, end)
+        span = f"{start or 'the beginning'} to {end or 'today'}"
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {sales_rows} sales and {cookie_rows} cookie rollup rows for {span}"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from cookie_app.idpools import POOLS, pool_stats, refill
+
+class Command(BaseCommand):
+    help = 'Top up the customer/staff ID pools and report how full each ID space is'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batches', type=int, default=1, help='Batches to generate per pool')
+        parser.add_argument('--status', action='store_true', help='Only report pool metrics')
+
+    def handle(self, *args, **options):
+        if not options['status']:
+            for name in POOLS:
+                added = sum(refill(name) for _ in range(options['batches']))
+                self.stdout.write(self.style.SUCCESS(f"Added {added} IDs to the {name} pool"))
+
+        for name, stats in pool_stats().items():
+            line = (
+                f"{name}: {stats['available']} ready, {stats['unscanned']}/{stats['capacity']} unscanned "
+                f"({stats['scanned_percent']}% scanned), {stats['empty_pool_hits']} empty-pool hits"
+            )
+            if stats['exhausted']:
+                self.stdout.write(self.style.ERROR(line + ' - EXHAUSTED'))
+            else:
+                self.stdout.write(line)
@@ -0,0 +1,96 @@
+# cookie_app/media_index.py
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import images
+from .journal import get_journal
+from .models import Cookie, MediaImage
+
+# Journal counter bumped whenever the index changes
+MEDIA_INDEX_VERSION = 'media_index_version'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+def invalidate():
+    """Drop the cached featured list once the current transaction commits"""
+    transaction.on_commit(lambda: get_journal().incr(MEDIA_INDEX_VERSION))
+
+
+def record(name, size, variants, cookie=None):
+    """Add or refresh the index entry for the image ``name``"""
+    MediaImage.objects.update_or_create(name=name, defaults={
+        'width': size[0], 'height': size[1], 'variants': variants, 'cookie': cookie,
+    })
+
+
+def forget(name):
+    MediaImage.objects.filter(name=name).delete()
+
+
+def indexed_directories():
+    """Directories under MEDIA_ROOT whose images are indexed ('' is MEDIA_ROOT itself)"""
+    return getattr(settings, 'MEDIA_INDEX_DIRS', ['cookies', ''])
+
+
+def rebuild(force=False, storage=default_storage):
+    """Bring the index in line with the indexed directories.
+
+    New images get derivatives and an entry (every image with ``force``);
+    entries whose file is gone are dropped. Returns (indexed, removed,
+    failures) where failures is a list of (name, error).
+    """
+    found = []
+    for directory in indexed_directories():
+        try:
+            files = storage.listdir(directory)[1]
+        except FileNotFoundError:
+            continue
+        found.extend(
+            posixpath.join(directory, filename) for filename in sorted(files)
+            if posixpath.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    known = set(MediaImage.objects.values_list('name', flat=True))
+    cookies = {cookie.image.name: cookie for cookie in Cookie.objects.filter(image__in=found)}
+    indexed, failures = 0, []
+    for name in found:
+        if name in known and not force:
+            continue
+        try:
+            variants, size = images.write_derivatives(storage, name, force)
+        except Exception as e:
+            failures.append((name, e))
+            continue
+        record(name, size, variants, cookie=cookies.get(name))
+        indexed += 1
+
+    removed, _ = MediaImage.objects.exclude(name__in=found).delete()
+    return indexed, removed, failures
+
+
+def featured_images(limit=12):
+    """Featured images as dicts (url, width, height, srcsets, name) for templates.
+
+    Read from the index and cached per index version; nothing here touches
+    the filesystem.
+    """
+    cache_key = f'media_index:{get_journal().get(MEDIA_INDEX_VERSION)}:{limit}'
+    featured = cache.get(cache_key)
+    if featured is None:
+        featured = [
+            {
+                'name': image.name,
+                'url': default_storage.url(image.name),
+                'width': image.width,
+                'height': image.height,
+                'srcsets': images.variant_srcsets(default_storage, image.variants) if image.variants else {},
+            }
+            for image in MediaImage.objects.filter(featured=True)[:limit]
+        ]
+        cache.set(cache_key, featured, getattr(settings, 'MEDIA_INDEX_CACHE_TTL', 3600))
+    return featured
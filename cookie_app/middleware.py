@@ -1,7 +1,170 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
 class SessionCleanupMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+
+# Collapses literals and IN-lists so the same query with different values
+# gets one fingerprint
+_IN_LIST = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def fingerprint(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql.replace('%s', '?'))
+
+
+class RequestProfiles:
+    """Ring buffer of the most recent request profiles"""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=size)
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """Per-view totals over the buffer, slowest average first"""
+        views = {}
+        for record in self.records():
+            views.setdefault(record['view'], []).append(record)
+        summary = []
+        for view, records in views.items():
+            totals = sorted(record['total_ms'] for record in records)
+            summary.append({
+                'view': view,
+                'requests': len(records),
+                'avg_ms': round(sum(totals) / len(totals), 2),
+                'p95_ms': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+                'avg_queries': round(sum(record['queries'] for record in records) / len(records), 1),
+                'max_queries': max(record['queries'] for record in records),
+                'avg_sql_ms': round(sum(record['sql_ms'] for record in records) / len(records), 2),
+                'max_duplicate_queries': max(record['duplicate_queries'] for record in records),
+            })
+        summary.sort(key=lambda entry: entry['avg_ms'], reverse=True)
+        return summary
+
+
+profiles = RequestProfiles(getattr(settings, 'QUERY_PROFILING_BUFFER', 500))
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+class QueryProfilingMiddleware:
+    """Records query count, SQL time, repeated queries, Python time and response
+    size per request into ``profiles`` (see admin_request_profiles).
+
+    Off unless QUERY_PROFILING is set, in which case it runs in sync and async
+    stacks alike. Set QUERY_PROFILING_SERVER_TIMING to also send a
+    Server-Timing header the browser dev tools can show.
+    A query shape run QUERY_PROFILING_DUPLICATE_THRESHOLD (default 3) or more
+    times in one request is reported as a likely N+1.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'QUERY_PROFILING_SERVER_TIMING', False)
+        self.duplicate_threshold = getattr(settings, 'QUERY_PROFILING_DUPLICATE_THRESHOLD', 3)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = _QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.watch(stack, recorder)
+            response = self.get_response(request)
+        return self.record(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = _QueryRecorder()
+        start = time.perf_counter()
+        stack = ExitStack()
+        # Connections are per thread: wrap the ones the request's sync code will use
+        await sync_to_async(self.watch)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, recorder, time.perf_counter() - start)
+
+    def watch(self, stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def record(self, request, response, recorder, total):
+        duplicates = {sql: count for sql, count in recorder.fingerprints.items() if count >= self.duplicate_threshold}
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'view': (match.view_name or match._func_path) if match else request.path,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'timestamp': time.time(),
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'python_ms': round((total - recorder.duration) * 1000, 2),
+            'queries': recorder.count,
+            'duplicate_queries': sum(duplicates.values()) - len(duplicates),
+            'duplicates': [
+                {'sql': sql[:300], 'count': count}
+                for sql, count in sorted(duplicates.items(), key=lambda item: item[1], reverse=True)[:5]
+            ],
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+        profiles.add(record)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'sql;dur={record["sql_ms"]};desc="{recorder.count} queries", '
+                f'app;dur={record["python_ms"]}, total;dur={record["total_ms"]}'
+            )
+        return response
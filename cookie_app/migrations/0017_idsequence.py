@@ -0,0 +1,47 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start each order_id counter after the highest existing sequence.
+
+    Existing hex_ids are random and are kept as they are; the highest order
+    they belong to is recorded so the hex counter can step over them.
+    """
+    Order = apps.get_model('cookie_app', 'Order')
+    IdSequence = apps.get_model('cookie_app', 'IdSequence')
+
+    highest = {}
+    for order_id in Order.objects.values_list('order_id', flat=True):
+        try:
+            prefix, day, sequence = order_id.split('-')
+            sequence = int(sequence)
+        except (AttributeError, ValueError):
+            continue
+        name = f"order:{prefix}-{day}"
+        highest[name] = max(highest.get(name, 0), sequence)
+    IdSequence.objects.bulk_create([IdSequence(name=name, value=value) for name, value in highest.items()])
+
+    last_legacy = Order.objects.order_by('-id').values_list('id', flat=True).first()
+    if last_legacy:
+        IdSequence.objects.create(name='order-hex-legacy', value=last_legacy)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0016_customer_ftue_completed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0017_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pool', models.CharField(db_index=True, max_length=20)),
+                ('value', models.CharField(max_length=20, unique=True)),
+            ],
+        ),
+    ]
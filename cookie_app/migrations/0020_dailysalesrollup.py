@@ -0,0 +1,75 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:33
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from cookie_app.dates import business_day
+
+
+def backfill_rollup(apps, schema_editor):
+    """Seed the rollup from every completed order already in the table"""
+    Order = apps.get_model('cookie_app', 'Order')
+    DailySalesRollup = apps.get_model('cookie_app', 'DailySalesRollup')
+    grouped = Order.objects.filter(status='completed', completed_at__isnull=False).annotate(
+        date=business_day('completed_at')
+    ).values('date', 'staff_id', 'order_type', 'payment_method').annotate(
+        rollup_order_count=models.Count('id'),
+        rollup_total_amount=models.Sum('total_amount'),
+        rollup_cash_received=models.Sum('cash_received'),
+        rollup_cash_received_count=models.Count('cash_received'),
+        rollup_change_given=models.Sum('change'),
+        rollup_change_count=models.Count('change'),
+    ).order_by()
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(
+            date=row['date'],
+            staff_id=row['staff_id'],
+            order_type=row['order_type'],
+            payment_method=row['payment_method'],
+            order_count=row['rollup_order_count'],
+            total_amount=row['rollup_total_amount'] or 0,
+            cash_received=row['rollup_cash_received'] or 0,
+            cash_received_count=row['rollup_cash_received_count'],
+            change_given=row['rollup_change_given'] or 0,
+            change_count=row['rollup_change_count'],
+        )
+        for row in grouped
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cookie_app', '0019_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_type', models.CharField(choices=[('kiosk', 'Kiosk Order'), ('staff', 'Staff Recorded')], max_length=10)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('gcash', 'GCash')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cash_received', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cash_received_count', models.IntegerField(default=0)),
+                ('change_given', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('change_count', models.IntegerField(default=0)),
+                ('staff', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('staff__isnull', False)), fields=('date', 'staff', 'order_type', 'payment_method'), name='unique_staff_sales_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('staff__isnull', True)), fields=('date', 'order_type', 'payment_method'), name='unique_unassigned_sales_rollup'),
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
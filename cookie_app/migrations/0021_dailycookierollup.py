@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:38
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from cookie_app.dates import business_day
+
+
+def backfill_rollup(apps, schema_editor):
+    """Seed the rollup from the lines of every completed order already in the table"""
+    OrderItem = apps.get_model('cookie_app', 'OrderItem')
+    DailyCookieRollup = apps.get_model('cookie_app', 'DailyCookieRollup')
+    grouped = OrderItem.objects.filter(order__status='completed', order__completed_at__isnull=False).annotate(
+        date=business_day('order__completed_at'), staff_id=models.F('order__staff_id')
+    ).values('date', 'cookie_id', 'staff_id').annotate(
+        rollup_quantity=models.Sum('quantity'),
+        rollup_revenue=models.Sum(models.F('quantity') * models.F('price')),
+    ).order_by()
+    DailyCookieRollup.objects.bulk_create([
+        DailyCookieRollup(
+            date=row['date'],
+            cookie_id=row['cookie_id'],
+            staff_id=row['staff_id'],
+            quantity=row['rollup_quantity'] or 0,
+            revenue=row['rollup_revenue'] or 0,
+        )
+        for row in grouped
+    ], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cookie_app', '0020_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCookieRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cookie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='cookie_app.cookie')),
+                ('staff', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='cookie_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailycookierollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('staff__isnull', False)), fields=('date', 'cookie', 'staff'), name='unique_staff_cookie_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycookierollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('staff__isnull', True)), fields=('date', 'cookie'), name='unique_unassigned_cookie_rollup'),
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cookie_app', '0024_activitylog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogArchive',
+            fields=[
+                ('action', models.CharField(choices=[('login', 'User Login'), ('logout', 'User Logout'), ('user_registered', 'User Registered'), ('order_created', 'Order Created'), ('order_updated', 'Order Updated'), ('order_completed', 'Order Completed'), ('order_voided', 'Order Voided'), ('cookie_added', 'Cookie Added'), ('cookie_updated', 'Cookie Updated'), ('cookie_deleted', 'Cookie Deleted'), ('inventory_updated', 'Inventory Updated'), ('staff_approved', 'Staff Approved'), ('staff_rejected', 'Staff Rejected'), ('staff_updated', 'Staff Updated'), ('staff_deactivated', 'Staff Deactivated'), ('staff_activated', 'Staff Activated'), ('staff_deleted', 'Staff Deleted'), ('daily_report_submitted', 'Daily Report Submitted')], max_length=50)),
+                ('description', models.TextField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('affected_model', models.CharField(blank=True, max_length=50, null=True)),
+                ('affected_id', models.IntegerField(blank=True, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activitylog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['action', 'timestamp'], name='activitylog_action_ts_idx'),
+        ),
+        migrations.AddField(
+            model_name='activitylogarchive',
+            name='staff',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cookie_app.staff'),
+        ),
+        migrations.AddField(
+            model_name='activitylogarchive',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='activitylogarchive',
+            index=models.Index(fields=['timestamp'], name='activityarchive_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylogarchive',
+            index=models.Index(fields=['action', 'timestamp'], name='activityarchive_action_ts_idx'),
+        ),
+    ]
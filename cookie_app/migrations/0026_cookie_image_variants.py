@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0025_activitylogarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cookie',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0026_cookie_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('featured', models.BooleanField(default=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('cookie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media_images', to='cookie_app.cookie')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
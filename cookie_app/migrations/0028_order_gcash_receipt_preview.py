@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0027_mediaimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='gcash_receipt_preview',
+            field=models.ImageField(blank=True, null=True, upload_to='gcash_receipts/previews/'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='gcash_receipt_status',
+            field=models.CharField(blank=True, choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='', max_length=12),
+        ),
+    ]
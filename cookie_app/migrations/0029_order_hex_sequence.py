@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_hex_sequence(apps, schema_editor):
+    """On PostgreSQL, continue the order-hex counter as a real sequence"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    IdSequence = apps.get_model('cookie_app', 'IdSequence')
+    last = IdSequence.objects.filter(name='order-hex').values_list('value', flat=True).first() or 0
+    schema_editor.execute("CREATE SEQUENCE IF NOT EXISTS cookie_app_order_hex_seq AS bigint MINVALUE 1")
+    if last:
+        schema_editor.execute("SELECT setval('cookie_app_order_hex_seq', %s)", [last])
+
+
+def drop_hex_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP SEQUENCE IF EXISTS cookie_app_order_hex_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cookie_app', '0028_order_gcash_receipt_preview'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_hex_sequence, drop_hex_sequence),
+    ]
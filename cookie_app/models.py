@@ -6,7 +6,6 @@ from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import uuid
-import secrets
 
 class Category(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -41,6 +40,8 @@ class Cookie(models.Model):
     
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='cookies')
     image = models.ImageField(upload_to='cookies/', null=True, blank=True)
+    # Resized WebP/AVIF copies of image: {'source', 'widths', 'formats'} (see images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     name = models.CharField(max_length=100)
     flavor = models.CharField(max_length=30, choices=FLAVOR_CHOICES)
     price = models.DecimalField(max_digits=6, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -54,6 +55,22 @@ class Cookie(models.Model):
     def __str__(self):
         return f"{self.name} - ₱{self.price}"
 
+class MediaImage(models.Model):
+    """A photo the landing page can feature, indexed from MEDIA_ROOT (see media_index.py)"""
+    name = models.CharField(max_length=255, unique=True)  # storage name, e.g. cookies/x.png
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    variants = models.JSONField(default=dict, blank=True)  # as Cookie.image_variants
+    cookie = models.ForeignKey(Cookie, on_delete=models.SET_NULL, null=True, blank=True, related_name='media_images')
+    featured = models.BooleanField(default=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 class UserProfile(models.Model):
     USER_TYPES = [('customer', 'Customer'), ('staff', 'Staff'), ('admin', 'Administrator')]
     
@@ -66,11 +83,8 @@ class UserProfile(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.customer_id and self.user_type == 'customer':
-            while True:
-                cust_id = f"CUST{secrets.randbelow(900000) + 100000:06d}"
-                if not UserProfile.objects.filter(customer_id=cust_id).exists():
-                    self.customer_id = cust_id
-                    break
+            from .idpools import take_id
+            self.customer_id = take_id('customer')
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -111,11 +125,8 @@ class Staff(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.staff_id:
-            while True:
-                staff_id = f"STAFF{secrets.randbelow(9000) + 1000:04d}"
-                if not Staff.objects.filter(staff_id=staff_id).exists():
-                    self.staff_id = staff_id
-                    break
+            from .idpools import take_id
+            self.staff_id = take_id('staff')
         
         # Update UserProfile when staff is created/updated
         profile, created = UserProfile.objects.get_or_create(user=self.user)
@@ -189,6 +200,11 @@ class Order(models.Model):
     gcash_verified_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='gcash_verified_orders')
     gcash_verified_at = models.DateTimeField(null=True, blank=True)
     gcash_screenshot = models.ImageField(upload_to='gcash_receipts/', null=True, blank=True)
+    # Uploaded receipts are downsized in the background (see receipts.py)
+    gcash_receipt_preview = models.ImageField(upload_to='gcash_receipts/previews/', null=True, blank=True)
+    gcash_receipt_status = models.CharField(max_length=12, blank=True, default='', choices=[
+        ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed'),
+    ])
     # CASH PAYMENT TRACKING - NEW FIELDS
     cash_received = models.DecimalField(
         max_digits=10, 
@@ -207,38 +223,23 @@ class Order(models.Model):
         help_text="Change returned to customer"
     )
 
-    def generate_order_id(self):
-        today = timezone.now().strftime('%Y%m%d')
+    def assign_ids(self):
+        """Fill order_id from the day's counter and hex_id from the hex sequence"""
+        from .sequences import allocate, next_hex_ids, order_sequence_name
+        today = timezone.now()
         prefix = 'KIO' if self.order_type == 'kiosk' else 'STA'
         
-        last_order = Order.objects.filter(order_id__startswith=f"{prefix}-{today}-").order_by('-order_id').first()
-        
-        if last_order:
-            try:
-                last_sequence = int(last_order.order_id.split('-')[-1])
-                new_sequence = last_sequence + 1
-            except (ValueError, IndexError):
-                new_sequence = 1
-        else:
-            new_sequence = 1
-        
-        return f"{prefix}-{today}-{new_sequence:03d}"
-
-    def generate_hex_id(self):
-        """Generate a unique 8-character hexadecimal ID"""
-        while True:
-            hex_id = uuid.uuid4().hex[:8].upper()
-            if not Order.objects.filter(hex_id=hex_id).exists():
-                return hex_id
-
-    def save(self, *args, **kwargs):
-        # Generate order_id if not set
         if not self.order_id:
-            self.order_id = self.generate_order_id()
-        
-        # Generate hex_id if not set
+            sequence_name = order_sequence_name(prefix, today)
+            value = allocate([sequence_name])[sequence_name]
+            self.order_id = f"{prefix}-{today.strftime('%Y%m%d')}-{value:03d}"
         if not self.hex_id:
-            self.hex_id = self.generate_hex_id()
+            self.hex_id = next_hex_ids()[0]
+
+    def save(self, *args, **kwargs):
+        # Generate order_id and hex_id if not set
+        if not self.order_id or not self.hex_id:
+            self.assign_ids()
         
         # Auto-calculate change if cash_received is provided
         if self.cash_received is not None and self.total_amount is not None:
@@ -327,16 +328,34 @@ class Order(models.Model):
     
     def restore_inventory(self):
         """Restore inventory when order is voided"""
-        for item in self.items.all():
-            cookie = item.cookie
-            cookie.stock_quantity += item.quantity
-            cookie.save()
+        from .inventory import release_stock
+        release_stock(self.items.values_list('cookie_id', 'quantity'))
     
     class Meta:
         permissions = [
             ("void_any_order", "Can void any order"),
             ("view_all_orders", "Can view all orders"),
         ]
+        indexes = [
+            # Order lists and "today" windows
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Completed sales over a date window (reports, dashboard charts)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Recently completed orders / staff history
+            models.Index(fields=['status', 'completed_at'], name='order_status_completed_idx'),
+            # Per-staff order lists
+            models.Index(fields=['staff', 'created_at'], name='order_staff_created_idx'),
+            # Customer order history pages (keyset on created_at, id)
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+            # Cash reconciliation: completed cash orders for a day
+            models.Index(fields=['payment_method', 'status', 'created_at'], name='order_pay_status_created_idx'),
+            # GCash verification queue
+            models.Index(
+                fields=['created_at'],
+                name='order_gcash_unpaid_idx',
+                condition=models.Q(payment_method='gcash', is_paid=False),
+            ),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -352,7 +371,9 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity}x {self.cookie.name} - ₱{self.price}"
 
-class ActivityLog(models.Model):
+class ActivityLogBase(models.Model):
+    """Fields shared by the live activity log and its archive"""
+
     ACTION_CHOICES = [
         ('login', 'User Login'), ('logout', 'User Logout'), ('user_registered', 'User Registered'),
         ('order_created', 'Order Created'), ('order_updated', 'Order Updated'), ('order_completed', 'Order Completed'),
@@ -366,7 +387,8 @@ class ActivityLog(models.Model):
     staff = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     description = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the activity is logged, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     affected_model = models.CharField(max_length=50, blank=True, null=True)
     affected_id = models.IntegerField(null=True, blank=True)
@@ -375,8 +397,31 @@ class ActivityLog(models.Model):
         return f"{self.get_action_display()} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
     class Meta:
+        abstract = True
         ordering = ['-timestamp']
 
+class ActivityLog(ActivityLogBase):
+    class Meta(ActivityLogBase.Meta):
+        indexes = [
+            # activity_logs list and date filter, archival cutoff
+            models.Index(fields=['timestamp'], name='activitylog_timestamp_idx'),
+            models.Index(fields=['action', 'timestamp'], name='activitylog_action_ts_idx'),
+        ]
+
+class ActivityLogArchive(ActivityLogBase):
+    """Activity log rows past ACTIVITY_LOG_RETENTION_DAYS (see retention.py).
+
+    Keeps the original row id so archiving is idempotent.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    archived_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta(ActivityLogBase.Meta):
+        indexes = [
+            models.Index(fields=['timestamp'], name='activityarchive_ts_idx'),
+            models.Index(fields=['action', 'timestamp'], name='activityarchive_action_ts_idx'),
+        ]
+
 class VoidLog(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='void_logs')
     staff_member = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, related_name='voided_orders')
@@ -398,6 +443,89 @@ class VoidLog(models.Model):
     class Meta:
         ordering = ['-void_date']
 
+class DailySalesRollup(models.Model):
+    """Completed-sales totals per business day, staff member, order type and payment method"""
+    date = models.DateField()
+    # Left untouched when the user is deleted so totals survive and the unique keys never collide;
+    # rebuild_sales_rollup re-attributes those rows to the now unassigned orders
+    staff = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='sales_rollups')
+    order_type = models.CharField(max_length=10, choices=Order.ORDER_TYPES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHODS)
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    cash_received = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    cash_received_count = models.IntegerField(default=0)
+    change_given = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    change_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'staff', 'order_type', 'payment_method'],
+                condition=models.Q(staff__isnull=False),
+                name='unique_staff_sales_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'order_type', 'payment_method'],
+                condition=models.Q(staff__isnull=True),
+                name='unique_unassigned_sales_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.order_type}/{self.payment_method}: {self.order_count} orders"
+
+class DailyCookieRollup(models.Model):
+    """Units and revenue of each cookie sold in completed orders, per business day and staff member"""
+    date = models.DateField()
+    cookie = models.ForeignKey(Cookie, on_delete=models.CASCADE, related_name='daily_sales')
+    # Same reasoning as DailySalesRollup.staff
+    staff = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='cookie_rollups')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'cookie', 'staff'],
+                condition=models.Q(staff__isnull=False),
+                name='unique_staff_cookie_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'cookie'],
+                condition=models.Q(staff__isnull=True),
+                name='unique_unassigned_cookie_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.cookie_id}: {self.quantity} sold"
+
+class IdSequence(models.Model):
+    """Named counter used to hand out order_id and hex_id values"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+class PooledId(models.Model):
+    """Pre-generated, unused customer/staff ID waiting to be handed out"""
+    pool = models.CharField(max_length=20, db_index=True)
+    value = models.CharField(max_length=20, unique=True)
+
+    def __str__(self):
+        return f"{self.pool}: {self.value}"
+
+class JournalEvent(models.Model):
+    """Entry in the shared event journal; the auto-increment id is the event sequence"""
+    kind = models.CharField(max_length=40)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.kind}"
+
 class StoreSettings(models.Model):
     """Singleton-style model for store configuration"""
     store_name = models.CharField(max_length=150, default="Cookie Craze")
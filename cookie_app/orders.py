@@ -0,0 +1,80 @@
+# cookie_app/orders.py
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from . import rollups
+from .journal import get_journal
+from .models import Customer, Order, OrderItem
+from .utils import log_activity
+
+logger = logging.getLogger(__name__)
+
+
+def create_order(items, user=None, ip_address=None, describe=None, award_loyalty=False, **fields):
+    """Insert an order and all of its lines with a fixed number of queries.
+
+    ``items`` is an iterable of (cookie, quantity, unit_price) tuples, such as
+    StockReservation.items(). The total is computed here, the lines go in with
+    a single bulk_create, and the activity log, new-order counter and loyalty
+    points are applied together once the surrounding transaction commits.
+    ``describe`` receives the saved order and returns the activity log text.
+    """
+    items = list(items)
+    total_amount = Decimal('0.00')
+    for cookie, quantity, price in items:
+        total_amount += price * quantity
+
+    with transaction.atomic():
+        order = Order(total_amount=total_amount, **fields)
+        # Tells notify_new_order that the side effects below replace its own
+        order._side_effects_queued = True
+        order.save()
+
+        lines = OrderItem.objects.bulk_create([
+            OrderItem(order=order, cookie=cookie, quantity=quantity, price=price)
+            for cookie, quantity, price in items
+        ])
+        # bulk_create sends no signals; walk-in orders can already be completed here
+        rollups.items_created(order, lines)
+
+        description = describe(order) if describe else f'New order received: {order.hex_id} - {order.customer_name}'
+        transaction.on_commit(
+            lambda: _run_side_effects(order, user, ip_address, description, award_loyalty)
+        )
+
+    return order
+
+
+def add_loyalty_points(order):
+    """Credit the order's customer with one point per peso; returns the points.
+
+    A single F() update, so concurrent orders for one customer can't lose points.
+    """
+    if not order.customer_id:
+        return 0
+    points = int(order.total_amount)
+    Customer.objects.filter(id=order.customer_id).update(loyalty_points=F('loyalty_points') + points)
+    return points
+
+
+def _run_side_effects(order, user, ip_address, description, award_loyalty):
+    """Post-commit batch for a newly written order"""
+    try:
+        get_journal().incr('new_orders')
+
+        log_activity(
+            user=user,
+            action='order_created',
+            description=description,
+            ip_address=ip_address,
+            affected_model='Order',
+            affected_id=order.id
+        )
+
+        if award_loyalty:
+            add_loyalty_points(order)
+    except Exception as e:
+        logger.error(f"Order side effects failed for {order.order_id}: {e}")
@@ -0,0 +1,74 @@
+# cookie_app/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order):
+    """Opaque cursor pointing just past ``order`` in newest-first order"""
+    raw = json.dumps([order.created_at.isoformat(), order.pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from e
+
+
+def page_size(request):
+    """?page_size= clamped to 1..ORDER_PAGE_SIZE_MAX, ORDER_PAGE_SIZE by default"""
+    default = getattr(settings, 'ORDER_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'ORDER_PAGE_SIZE_MAX', 200)
+    try:
+        size = int(request.GET.get('page_size') or default)
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def keyset_page(queryset, cursor=None, size=50):
+    """One page of ``queryset`` newest first, keyed on (created_at, id).
+
+    Unlike OFFSET, the cursor stays put when new orders arrive while someone
+    scrolls, and each page costs the same however deep it is: the database
+    seeks straight to the cursor position through the created_at indexes.
+    Fetches one extra row to know whether there is a next page.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    items = list(queryset[:size + 1])
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return KeysetPage(items[:size], next_cursor)
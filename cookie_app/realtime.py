@@ -0,0 +1,44 @@
+# cookie_app/realtime.py
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .dates import business_date
+from .events import ORDERS_VERSION
+from .journal import get_journal
+
+
+def orders_version():
+    """Shared counter bumped after every committed Order save or delete"""
+    return get_journal().get(ORDERS_VERSION)
+
+
+def version_stamp(request, *scope):
+    """Cheap version of an order-derived payload for this user and query scope.
+
+    Changes whenever an order changes or the business day rolls over. Computed
+    once per request, so the ETag header and the payload's version agree.
+    """
+    stamps = request.__dict__.setdefault('_realtime_versions', {})
+    if scope not in stamps:
+        parts = [orders_version(), business_date().isoformat(), request.user.pk, *scope]
+        stamps[scope] = '-'.join(str(part) for part in parts)
+    return stamps[scope]
+
+
+def delta_response(request, name, version, payload):
+    """JsonResponse for a realtime payload of the form {'success': ..., 'data': {...}}.
+
+    The data is kept for REALTIME_DELTA_TTL seconds under its version. When the
+    client passes ?since=<the version it last saw> and that snapshot is still
+    around, only the keys of ``data`` that changed are sent (``delta`` true);
+    otherwise the full data goes out.
+    """
+    data = payload['data']
+    cache.set(f'realtime:{name}:{version}', data, getattr(settings, 'REALTIME_DELTA_TTL', 600))
+
+    since = request.GET.get('since')
+    previous = cache.get(f'realtime:{name}:{since}') if since and since != version else None
+    if previous is not None:
+        data = {key: value for key, value in data.items() if previous.get(key) != value}
+    return JsonResponse(dict(payload, data=data, version=version, delta=previous is not None))
@@ -0,0 +1,191 @@
+# cookie_app/receipts.py
+import io
+import os
+import queue
+import re
+import tempfile
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .events import ORDERS_VERSION
+from .journal import get_journal
+from .models import Order
+
+STAGED_NAME = re.compile(r'^order-(\d+)\.upload$')
+
+
+class ReceiptRejected(ValueError):
+    """An upload that is not a usable receipt image"""
+
+
+def staging_dir():
+    path = getattr(settings, 'GCASH_RECEIPT_STAGING_DIR', None) or os.path.join(tempfile.gettempdir(), 'gcash_receipts')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_upload(upload):
+    """Stream an uploaded receipt to a private temp file and return its path.
+
+    Only the cheap checks happen here (size, declared type); decoding is
+    left to the worker. Raises ReceiptRejected.
+    """
+    max_bytes = getattr(settings, 'GCASH_RECEIPT_MAX_BYTES', 10 * 1024 * 1024)
+    if upload.size > max_bytes:
+        raise ReceiptRejected(f'Receipt images must be under {max_bytes // (1024 * 1024)} MB.')
+    if not (upload.content_type or '').startswith('image/'):
+        raise ReceiptRejected('The GCash receipt must be an image.')
+    path = os.path.join(staging_dir(), f'incoming-{uuid.uuid4().hex}.upload')
+    with open(path, 'wb') as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return path
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _jpeg(image, max_side, quality):
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def process_receipt(order_id, path):
+    """Validate a staged receipt and store a downsized copy and a preview on the order.
+
+    The staged file is removed either way; an unreadable upload marks the
+    order's receipt as failed so staff know to ask for it again. Returns
+    whether the receipt was stored, or None if the staged file is already
+    gone (another run handled it).
+    """
+    try:
+        with open(path, 'rb') as source:
+            image = Image.open(source)
+            if image.width * image.height > getattr(settings, 'GCASH_RECEIPT_MAX_PIXELS', 40_000_000):
+                raise ReceiptRejected('image too large')
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        if image.mode != 'RGB':
+            # Flatten transparency onto white: receipts are read, not composited
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        full = _jpeg(image, getattr(settings, 'GCASH_RECEIPT_MAX_SIDE', 1600), 85)
+        preview = _jpeg(image, getattr(settings, 'GCASH_RECEIPT_PREVIEW_SIDE', 320), 70)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"GCash receipt for order {order_id} rejected: {e}")
+        # Never overwrite a receipt another run has already stored
+        Order.objects.filter(pk=order_id, gcash_receipt_status='processing').update(gcash_receipt_status='failed')
+        get_journal().incr(ORDERS_VERSION)
+        discard(path)
+        return False
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        stem = f'{order.hex_id or order.pk}-{uuid.uuid4().hex[:8]}'
+        order.gcash_screenshot.save(f'{stem}.jpg', ContentFile(full), save=False)
+        order.gcash_receipt_preview.save(f'{stem}.jpg', ContentFile(preview), save=False)
+        Order.objects.filter(pk=order_id).update(
+            gcash_screenshot=order.gcash_screenshot.name,
+            gcash_receipt_preview=order.gcash_receipt_preview.name,
+            gcash_receipt_status='ready',
+        )
+        get_journal().incr(ORDERS_VERSION)
+    discard(path)
+    return True
+
+
+class ReceiptWorker:
+    """One background thread that processes staged receipts in order.
+
+    Anything still queued when the process exits stays in the staging
+    directory under the order's id; process_gcash_receipts picks it up.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, order_id, path):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gcash-receipts', daemon=True)
+                self._thread.start()
+        self._queue.put((order_id, path))
+
+    def join(self):
+        """Wait until everything submitted so far is processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            order_id, path = self._queue.get()
+            try:
+                process_receipt(order_id, path)
+            except Exception as e:
+                print(f"GCash receipt worker error for order {order_id}: {e}")
+            finally:
+                connection.close()
+                self._queue.task_done()
+
+
+worker = ReceiptWorker()
+
+
+def ingest_on_commit(order, path):
+    """Hand a staged receipt to the worker once the order's transaction commits.
+
+    The file is first renamed after the order so an interrupted run can be
+    resumed. With GCASH_RECEIPT_BACKGROUND = False it is processed inline
+    (still after commit) instead.
+    """
+    def hand_off():
+        staged = os.path.join(os.path.dirname(path), f'order-{order.pk}.upload')
+        os.replace(path, staged)
+        if getattr(settings, 'GCASH_RECEIPT_BACKGROUND', True):
+            worker.submit(order.pk, staged)
+        else:
+            process_receipt(order.pk, staged)
+    transaction.on_commit(hand_off)
+
+
+def staged_receipts():
+    """(order id, path) of receipts staged for orders but not processed yet"""
+    directory = staging_dir()
+    found = []
+    for filename in sorted(os.listdir(directory)):
+        match = STAGED_NAME.match(filename)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, filename)))
+    return found
+
+
+def fail_abandoned(before):
+    """Mark receipts still processing for orders placed before ``before`` as failed.
+
+    Only orders with nothing staged are touched: their upload was never handed
+    off (the process stopped between the commit and the rename), so staff need
+    to ask for it again. Returns how many orders were marked.
+    """
+    staged = [order_id for order_id, _ in staged_receipts()]
+    marked = Order.objects.filter(gcash_receipt_status='processing', created_at__lt=before).exclude(
+        pk__in=staged,
+    ).update(gcash_receipt_status='failed')
+    if marked:
+        get_journal().incr(ORDERS_VERSION)
+    return marked
@@ -0,0 +1,325 @@
+# cookie_app/reports.py
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from . import rollups
+from .dates import date_window, day_window
+from .models import Cookie, Order, Staff
+
+COMPLETED = Q(status='completed')
+
+
+def _percent(part, whole):
+    return (part / whole * 100) if whole > 0 else 0
+
+
+@dataclass
+class SalesReport:
+    """Every sales_report metric for a date range, computed from one conditional aggregate"""
+    start_date: date
+    end_date: date
+    total_orders: int = 0
+    placed_completed_count: int = 0
+    completed_count: int = 0
+    completed_amount: Decimal = 0
+    walkin_count: int = 0
+    walkin_amount: Decimal = 0
+    walkin_avg: Decimal = 0
+    kiosk_count: int = 0
+    kiosk_amount: Decimal = 0
+    kiosk_avg: Decimal = 0
+    total_cash_received: Decimal = 0
+    change_given: Decimal = 0
+    avg_cash_received: Decimal = 0
+    avg_change: Decimal = 0
+    digital_count: int = 0
+    digital_amount: Decimal = 0
+    method_counts: dict = field(default_factory=dict)
+    method_amounts: dict = field(default_factory=dict)
+    daily_sales: list = field(default_factory=list)
+    top_cookies: list = field(default_factory=list)
+
+    @property
+    def total_sales(self):
+        return {'total_amount': self.completed_amount, 'total_orders': self.completed_count}
+
+    @property
+    def order_type_stats(self):
+        return {
+            'walkin': {'count': self.walkin_count, 'revenue': self.walkin_amount, 'avg_order': self.walkin_avg},
+            'kiosk': {'count': self.kiosk_count, 'revenue': self.kiosk_amount, 'avg_order': self.kiosk_avg},
+        }
+
+    @property
+    def completion_stats(self):
+        # Both counts are over the orders placed in the range, so the rate stays within 100%
+        return {
+            'total_orders': self.total_orders,
+            'completed_orders': self.placed_completed_count,
+            'completion_rate': _percent(self.placed_completed_count, self.total_orders),
+        }
+
+    @property
+    def cash_stats(self):
+        return {
+            'count': self.method_counts.get('cash', 0),
+            'amount': self.method_amounts.get('cash', 0),
+            'cash_received': self.total_cash_received,
+            'change_given': self.change_given,
+            'percentage': _percent(self.method_counts.get('cash', 0), self.completed_count),
+            'avg_cash_received': self.avg_cash_received,
+            'avg_change': self.avg_change,
+        }
+
+    @property
+    def digital_stats(self):
+        return {
+            'count': self.digital_count,
+            'amount': self.digital_amount,
+            'percentage': _percent(self.digital_count, self.completed_count),
+        }
+
+    @property
+    def payment_breakdown(self):
+        breakdown = []
+        for code, label in Order.PAYMENT_METHODS:
+            entry = {
+                'payment_method': label,
+                'method_code': code,
+                'count': self.method_counts.get(code, 0),
+                'amount': self.method_amounts.get(code, 0),
+                'percentage': _percent(self.method_counts.get(code, 0), self.completed_count),
+            }
+            if code == 'cash':
+                entry.update({
+                    'total_cash_received': self.total_cash_received,
+                    'total_change_given': self.change_given,
+                    'avg_cash_received': self.avg_cash_received,
+                    'avg_change': self.avg_change,
+                })
+            breakdown.append(entry)
+        return breakdown
+
+    @property
+    def cash_reconciliation(self):
+        cash_amount = self.method_amounts.get('cash', 0)
+        return {
+            'total_cash_sales': cash_amount,
+            'total_cash_received': self.total_cash_received,
+            'total_change_given': self.change_given,
+            'net_cash_should_be': cash_amount,  # Should equal total sales amount
+            'cash_handling_fee': self.change_given,  # Change given represents cash out
+            'expected_cash_drawer': self.total_cash_received - self.change_given,
+        }
+
+    def context(self):
+        """Template context for sales_report.html"""
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'total_sales': self.total_sales,
+            'order_type_stats': self.order_type_stats,
+            'completion_stats': self.completion_stats,
+            'cash_stats': self.cash_stats,
+            'digital_stats': self.digital_stats,
+            'payment_breakdown': self.payment_breakdown,
+            'daily_sales': self.daily_sales,
+            'top_cookies': self.top_cookies,
+            'cash_reconciliation': self.cash_reconciliation,
+        }
+
+
+def _daily_sales(rows):
+    """Per-day totals from rollup rows, newest day first"""
+    days = {}
+    for row in rows:
+        days.setdefault(row['date'], []).append(row)
+    daily_sales = []
+    for day in sorted(days, reverse=True):
+        day_totals = rollups.totals(days[day])
+        daily_sales.append({
+            'completed_at__date': day,
+            'daily_total': day_totals.total_amount,
+            'order_count': day_totals.order_count,
+            'walkin_count': rollups.totals(days[day], order_type='staff').order_count,
+            'kiosk_count': rollups.totals(days[day], order_type='kiosk').order_count,
+            'average_sale': day_totals.average_sale,
+        })
+    return daily_sales
+
+
+def build_sales_report(start_date, end_date):
+    """Compute a SalesReport from the daily rollup plus the order count and top-cookie queries.
+
+    Completed sales are counted on the business day they were completed; the
+    completion rate is over the orders placed in the range.
+    """
+    placed = Order.objects.filter(**date_window('created_at', start_date, end_date)).aggregate(
+        total_orders=Count('id'), completed=Count('id', filter=COMPLETED),
+    )
+    rows = rollups.sales_rows(start_date, end_date)
+    completed = rollups.totals(rows)
+    walkin = rollups.totals(rows, order_type='staff')
+    kiosk = rollups.totals(rows, order_type='kiosk')
+    cash = rollups.totals(rows, payment_method='cash')
+    method_totals = {code: rollups.totals(rows, payment_method=code) for code, _ in Order.PAYMENT_METHODS}
+
+    top_cookies = [
+        {'cookie__name': entry['cookie__name'], 'total_sold': entry['quantity_sold'], 'total_revenue': entry['revenue']}
+        for entry in rollups.top_cookies(start_date, end_date)
+    ]
+
+    return SalesReport(
+        start_date=start_date,
+        end_date=end_date,
+        total_orders=placed['total_orders'],
+        placed_completed_count=placed['completed'],
+        completed_count=completed.order_count,
+        completed_amount=completed.total_amount,
+        walkin_count=walkin.order_count,
+        walkin_amount=walkin.total_amount,
+        walkin_avg=walkin.average_sale,
+        kiosk_count=kiosk.order_count,
+        kiosk_amount=kiosk.total_amount,
+        kiosk_avg=kiosk.average_sale,
+        total_cash_received=cash.cash_received,
+        change_given=cash.change_given,
+        avg_cash_received=cash.avg_cash_received,
+        avg_change=cash.avg_change,
+        digital_count=completed.order_count - cash.order_count,
+        digital_amount=completed.total_amount - cash.total_amount,
+        method_counts={code: method.order_count for code, method in method_totals.items()},
+        method_amounts={code: method.total_amount for code, method in method_totals.items()},
+        daily_sales=_daily_sales(rows),
+        top_cookies=top_cookies,
+    )
+
+
+@dataclass
+class DashboardMetrics:
+    """Headline numbers and chart series for admin_dashboard, cached as one unit"""
+    today: date
+    total_orders_today: int = 0
+    completed_orders_count: int = 0
+    kiosk_orders_today: int = 0
+    staff_orders_today: int = 0
+    pending_orders_today: int = 0
+    total_revenue_today: Decimal = Decimal('0.00')
+    kiosk_revenue_today: Decimal = Decimal('0.00')
+    staff_revenue_today: Decimal = Decimal('0.00')
+    cash_transactions_today: int = 0
+    gcash_transactions_today: int = 0
+    pending_gcash_count: int = 0
+    daily_sales_labels: list = field(default_factory=list)
+    daily_sales_values: list = field(default_factory=list)
+    payment_labels: list = field(default_factory=list)
+    payment_values: list = field(default_factory=list)
+    total_cookies: int = 0
+    total_cookie_types: int = 0
+    active_cookies: int = 0
+    low_stock_count: int = 0
+    out_of_stock_count: int = 0
+    pending_staff_count: int = 0
+    total_staff: int = 0
+    best_selling_cookie: str = 'N/A'
+    best_selling_count: int = 0
+
+    @property
+    def completion_rate_today(self):
+        return round(_percent(self.completed_orders_count, self.total_orders_today), 1)
+
+    @property
+    def active_items_percentage(self):
+        return round(_percent(self.active_cookies, self.total_cookies), 1)
+
+    def context(self):
+        """Template context entries for admin_dashboard.html"""
+        values = dict(self.__dict__)
+        values['completion_rate_today'] = self.completion_rate_today
+        values['active_items_percentage'] = self.active_items_percentage
+        return values
+
+
+def _todays_orders(today):
+    """Today's counts, revenue and payment split plus the open GCash queue, in one query"""
+    today_q = Q(**day_window('created_at', today))
+    completed = today_q & COMPLETED
+    metrics = {
+        'total_orders_today': Count('id', filter=today_q),
+        'completed_orders_count': Count('id', filter=completed),
+        'kiosk_orders_today': Count('id', filter=today_q & Q(order_type='kiosk')),
+        'staff_orders_today': Count('id', filter=today_q & Q(order_type='staff')),
+        'pending_orders_today': Count('id', filter=today_q & Q(status='pending')),
+        'total_revenue_today': Sum('total_amount', filter=completed),
+        'kiosk_revenue_today': Sum('total_amount', filter=completed & Q(order_type='kiosk')),
+        'staff_revenue_today': Sum('total_amount', filter=completed & Q(order_type='staff')),
+        'pending_gcash_count': Count('id', filter=Q(payment_method='gcash', is_paid=False)),
+    }
+    for code, _ in Order.PAYMENT_METHODS:
+        metrics[f'{code}_count'] = Count('id', filter=completed & Q(payment_method=code))
+        metrics[f'{code}_amount'] = Sum('total_amount', filter=completed & Q(payment_method=code))
+    return Order.objects.filter(today_q | Q(payment_method='gcash', is_paid=False)).aggregate(**metrics)
+
+
+def build_dashboard_metrics(today):
+    """Compute DashboardMetrics: one query each for the 7-day series (rollup plus today's
+    live rows), today's orders, stock, staff and the best seller"""
+    row = _todays_orders(today)
+    metrics = DashboardMetrics(today=today)
+    for name in ('total_orders_today', 'completed_orders_count', 'kiosk_orders_today', 'staff_orders_today',
+                 'pending_orders_today', 'pending_gcash_count'):
+        setattr(metrics, name, row[name])
+    for name in ('total_revenue_today', 'kiosk_revenue_today', 'staff_revenue_today'):
+        setattr(metrics, name, row[name] or Decimal('0.00'))
+    metrics.cash_transactions_today = row['cash_count']
+    metrics.gcash_transactions_today = row['gcash_count']
+    for code, label in Order.PAYMENT_METHODS:
+        if row[f'{code}_count']:
+            metrics.payment_labels.append(label)
+            metrics.payment_values.append(float(row[f'{code}_amount'] or 0))
+
+    # Daily sales for the last 7 days (for chart), oldest to newest
+    first_day = today - timedelta(days=6)
+    totals = {}
+    for row in rollups.sales_rows(first_day, today):
+        totals[row['date']] = totals.get(row['date'], 0) + row['total_amount']
+    for offset in range(7):
+        day = first_day + timedelta(days=offset)
+        metrics.daily_sales_labels.append(day.strftime('%b %d'))
+        metrics.daily_sales_values.append(float(totals.get(day) or 0))
+
+    stock = Cookie.objects.aggregate(
+        total_cookies=Count('id'),
+        total_cookie_types=Count('name', distinct=True),
+        active_cookies=Count('id', filter=Q(is_available=True)),
+        low_stock_count=Count('id', filter=Q(stock_quantity__lt=10, stock_quantity__gt=0)),
+        out_of_stock_count=Count('id', filter=Q(stock_quantity=0)),
+    )
+    staff = Staff.objects.aggregate(
+        pending_staff_count=Count('id', filter=Q(role='pending', is_active=False)),
+        total_staff=Count('id', filter=Q(is_active=True)),
+    )
+    for name, value in {**stock, **staff}.items():
+        setattr(metrics, name, value)
+
+    best_selling = rollups.top_cookies(today - timedelta(days=30), today, limit=1)
+    if best_selling:
+        metrics.best_selling_cookie = best_selling[0]['cookie__name']
+        metrics.best_selling_count = best_selling[0]['quantity_sold']
+
+    return metrics
+
+
+def dashboard_metrics(today):
+    """DashboardMetrics for ``today``, served from cache for ADMIN_DASHBOARD_CACHE_TTL seconds"""
+    cache_key = f'admin_dashboard_metrics:{today.isoformat()}'
+    metrics = cache.get(cache_key)
+    if metrics is None:
+        metrics = build_dashboard_metrics(today)
+        cache.set(cache_key, metrics, getattr(settings, 'ADMIN_DASHBOARD_CACHE_TTL', 30))
+    return metrics
@@ -0,0 +1,167 @@
+# cookie_app/retention.py
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .dates import day_window
+from .models import ActivityLog, ActivityLogArchive
+
+ARCHIVED_FIELDS = [
+    'id', 'user_id', 'staff_id', 'action', 'description', 'timestamp',
+    'ip_address', 'affected_model', 'affected_id',
+]
+
+
+def retention_cutoff(days=None):
+    """Activity older than this moves out of the live table"""
+    if days is None:
+        days = getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_activity_logs(before, batch_size=5000):
+    """Move ActivityLog rows older than ``before`` into ActivityLogArchive, oldest first.
+
+    Each batch is copied and deleted in one transaction, so an interrupted run
+    loses nothing and the next run carries on where it stopped. Returns the
+    number of rows moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                ActivityLog.objects.filter(timestamp__lt=before)
+                .order_by('timestamp', 'id')
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return moved
+            ActivityLogArchive.objects.bulk_create(
+                [ActivityLogArchive(**row) for row in rows], ignore_conflicts=True,
+            )
+            ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+
+
+def _month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def archived_months(before):
+    """(year, month) of every archived month that ends before ``before``"""
+    local = timezone.localtime(before)
+    limit = _month_start(local.year, local.month)
+    return [
+        (day.year, day.month)
+        for day in ActivityLogArchive.objects.filter(timestamp__lt=limit).dates('timestamp', 'month')
+    ]
+
+
+def export_archived_month(year, month, directory, purge=False):
+    """Write a month of archived activity to ``directory``/activity-YYYY-MM.jsonl.gz.
+
+    One JSON object per line, oldest first. With ``purge`` the exported rows
+    are then deleted from the archive table. An existing file is never
+    overwritten. Returns (path, rows written), with None rows when the file
+    was already there.
+    """
+    path = Path(directory) / f'activity-{year:04d}-{month:02d}.jsonl.gz'
+    if path.exists():
+        return path, None
+    window = Q(timestamp__gte=_month_start(year, month), timestamp__lt=_month_start(*_next_month(year, month)))
+    rows = ActivityLogArchive.objects.filter(window).order_by('timestamp', 'id').values(*ARCHIVED_FIELDS)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    written = 0
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        for row in rows.iterator(chunk_size=2000):
+            out.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            written += 1
+    os.replace(partial, path)
+
+    if purge:
+        ActivityLogArchive.objects.filter(window).delete()
+    return path, written
+
+
+def approximate_count(queryset, limit):
+    """(count, exact) for ``queryset`` without scanning more than ``limit`` rows.
+
+    Counts exactly up to ``limit``. Past that PostgreSQL's planner estimate
+    is used; other databases just report ``limit``.
+    """
+    count = queryset.order_by()[:limit + 1].count()
+    if count <= limit:
+        return count, True
+    if connection.vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return max(int(plan[0]['Plan']['Plan Rows']), limit), False
+    return limit, False
+
+
+class ActivityLogSearch:
+    """Newest-first activity across the live table and the archive.
+
+    Slices and counts like a queryset, so it can go straight into a
+    Paginator. Archival always moves the oldest rows, so a slice reads the
+    live table first and carries on into the archive. count() is
+    approximate past ACTIVITY_LOG_COUNT_LIMIT (see approximate_count).
+    """
+
+    def __init__(self, date=None, action=None, user=None, include_archive=True, count_limit=None):
+        self.count_limit = count_limit or getattr(settings, 'ACTIVITY_LOG_COUNT_LIMIT', 10000)
+        models = [ActivityLog, ActivityLogArchive] if include_archive else [ActivityLog]
+        self.querysets = [self._filtered(model, date, action, user) for model in models]
+        self._count = None
+
+    @staticmethod
+    def _filtered(model, date, action, user):
+        queryset = model.objects.select_related('user', 'staff').order_by('-timestamp', '-id')
+        if date:
+            queryset = queryset.filter(**day_window('timestamp', date))
+        if action:
+            queryset = queryset.filter(action=action)
+        if user:
+            queryset = queryset.filter(
+                Q(user__username__icontains=user) | Q(staff__user__username__icontains=user)
+            )
+        return queryset
+
+    def count(self):
+        if self._count is None:
+            counts = [approximate_count(queryset, self.count_limit) for queryset in self.querysets]
+            self._count = (sum(count for count, _ in counts), all(exact for _, exact in counts))
+        return self._count[0]
+
+    @property
+    def exact(self):
+        self.count()
+        return self._count[1]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset, stop = key.start or 0, key.stop
+        rows = []
+        for queryset in self.querysets:
+            wanted = None if stop is None else stop - (key.start or 0) - len(rows)
+            if wanted is not None and wanted <= 0:
+                break
+            chunk = list(queryset[offset:] if wanted is None else queryset[offset:offset + wanted])
+            rows.extend(chunk)
+            # The next table starts at its top, unless this one ended before the offset
+            offset = 0 if chunk else offset - queryset.count()
+        return rows
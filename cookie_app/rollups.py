@@ -0,0 +1,366 @@
+# cookie_app/rollups.py
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .dates import business_date, business_day, date_window
+from .models import DailyCookieRollup, DailySalesRollup, Order, OrderItem
+
+KEY_FIELDS = ('date', 'staff_id', 'order_type', 'payment_method')
+MEASURES = ('order_count', 'total_amount', 'cash_received', 'cash_received_count', 'change_given', 'change_count')
+
+# Order fields that decide what an order contributes to the rollup
+SOURCE_FIELDS = ('status', 'completed_at', 'staff_id', 'order_type', 'payment_method',
+                 'total_amount', 'cash_received', 'change')
+
+_UNKNOWN = object()
+
+# Orders whose deletion is in progress; their items are taken out of the
+# cookie rollup by the order, not one by one
+_deleting = threading.local()
+
+
+def contribution(order):
+    """(key, measures) a completed order adds to the rollup, or None for any other status.
+
+    Sales are attributed to the business day the order was completed on.
+    """
+    if order.status != 'completed' or order.completed_at is None:
+        return None
+    key = (business_date(order.completed_at), order.staff_id, order.order_type, order.payment_method)
+    measures = (
+        1,
+        order.total_amount or Decimal('0.00'),
+        order.cash_received or Decimal('0.00'),
+        int(order.cash_received is not None),
+        order.change or Decimal('0.00'),
+        int(order.change is not None),
+    )
+    return key, measures
+
+
+def remember(order):
+    """Record what a freshly loaded order currently contributes (post_init)"""
+    if order.pk is None:
+        order._rollup_contribution = None
+    elif set(SOURCE_FIELDS) & order.get_deferred_fields():
+        # Reading deferred fields here would cost a query per instance
+        order._rollup_contribution = _UNKNOWN
+    else:
+        order._rollup_contribution = contribution(order)
+
+
+def _previous(order):
+    previous = getattr(order, '_rollup_contribution', _UNKNOWN)
+    if previous is _UNKNOWN:
+        values = Order.objects.filter(pk=order.pk).values(*SOURCE_FIELDS).first()
+        previous = contribution(Order(**values)) if values else None
+    return previous
+
+
+def _bump(model, lookup, values):
+    """Add ``values`` to the rollup row matching ``lookup``, creating it if needed"""
+    deltas = {name: F(name) + value for name, value in values.items()}
+    if model.objects.filter(**lookup).update(**deltas):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **values)
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**lookup).update(**deltas)
+
+
+def _apply(key, measures, sign):
+    _bump(DailySalesRollup, dict(zip(KEY_FIELDS, key)), {name: sign * value for name, value in zip(MEASURES, measures)})
+
+
+def _cookie_key(sales):
+    """(date, staff_id) an order's items are filed under, from its sales contribution"""
+    return sales[0][:2] if sales else None
+
+
+def _order_items(order_id):
+    """{cookie_id: (quantity, revenue)} for an order's lines"""
+    lines = OrderItem.objects.filter(order_id=order_id).values('cookie_id').annotate(
+        line_quantity=Sum('quantity'), line_revenue=Sum(F('quantity') * F('price'))
+    ).order_by()
+    return {line['cookie_id']: (line['line_quantity'], line['line_revenue']) for line in lines}
+
+
+def _apply_items(cookie_key, items, sign):
+    day, staff_id = cookie_key
+    for cookie_id, (quantity, revenue) in items.items():
+        _bump(DailyCookieRollup, {'date': day, 'cookie_id': cookie_id, 'staff_id': staff_id},
+              {'quantity': sign * quantity, 'revenue': sign * revenue})
+
+
+def order_saving(order):
+    """Pin down a deferred order's contribution before its row is overwritten (pre_save)"""
+    if order.pk is not None and getattr(order, '_rollup_contribution', _UNKNOWN) is _UNKNOWN:
+        order._rollup_contribution = _previous(order)
+
+
+def order_saved(order, created=False):
+    """Move an order's contribution when it completes, is voided/cancelled or is edited"""
+    previous, current = _previous(order), contribution(order)
+    if previous != current:
+        if previous:
+            _apply(*previous, -1)
+        if current:
+            _apply(*current, 1)
+        # A new order has no lines yet; create_order files them via items_created
+        if not created and _cookie_key(previous) != _cookie_key(current):
+            items = _order_items(order.pk)
+            if previous:
+                _apply_items(_cookie_key(previous), items, -1)
+            if current:
+                _apply_items(_cookie_key(current), items, 1)
+    order._rollup_contribution = current
+
+
+def order_deleting(order):
+    """Pin down the order's contribution and lines while its rows still exist (pre_delete)"""
+    order._rollup_contribution = _previous(order)
+    order._rollup_items = _order_items(order.pk) if order._rollup_contribution else {}
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    _deleting.ids.add(order.pk)
+
+
+def order_deleted(order):
+    previous = _previous(order)
+    if previous:
+        _apply(*previous, -1)
+        _apply_items(_cookie_key(previous), getattr(order, '_rollup_items', {}), -1)
+    getattr(_deleting, 'ids', set()).discard(order.pk)
+
+
+def items_created(order, items):
+    """File lines inserted with bulk_create (which sends no signals) under their order"""
+    key = _cookie_key(contribution(order))
+    if key:
+        lines = {}
+        for item in items:
+            quantity, revenue = lines.get(item.cookie_id, (0, 0))
+            lines[item.cookie_id] = (quantity + item.quantity, revenue + item.quantity * item.price)
+        _apply_items(key, lines, 1)
+
+
+def _item_line(item):
+    return item.order_id, item.cookie_id, item.quantity, item.quantity * item.price
+
+
+def remember_item(item):
+    """Record a loaded order line (post_init)"""
+    if item.pk is None or {'order_id', 'cookie_id', 'quantity', 'price'} & item.get_deferred_fields():
+        item._rollup_line = _UNKNOWN if item.pk else None
+    else:
+        item._rollup_line = _item_line(item)
+
+
+def _order_cookie_key(order_id):
+    values = Order.objects.filter(pk=order_id).values(*SOURCE_FIELDS).first()
+    return _cookie_key(contribution(Order(**values))) if values else None
+
+
+def _move_line(line, sign):
+    order_id, cookie_id, quantity, revenue = line
+    key = _order_cookie_key(order_id)
+    if key:
+        _apply_items(key, {cookie_id: (quantity, revenue)}, sign)
+
+
+def _previous_line(item):
+    previous = getattr(item, '_rollup_line', _UNKNOWN)
+    if previous is _UNKNOWN:
+        values = OrderItem.objects.filter(pk=item.pk).values('order_id', 'cookie_id', 'quantity', 'price').first()
+        previous = _item_line(OrderItem(**values)) if values else None
+    return previous
+
+
+def item_saving(item):
+    """Pin down a deferred line before its row is overwritten (pre_save)"""
+    if item.pk is not None and getattr(item, '_rollup_line', _UNKNOWN) is _UNKNOWN:
+        item._rollup_line = _previous_line(item)
+
+
+def item_saved(item):
+    """Keep the cookie rollup right when a completed order's line is added or edited"""
+    previous, current = _previous_line(item), _item_line(item)
+    if previous != current:
+        if previous:
+            _move_line(previous, -1)
+        _move_line(current, 1)
+    item._rollup_line = current
+
+
+def item_deleting(item):
+    """Pin down a deferred line while its row still exists (pre_delete)"""
+    item._rollup_line = _previous_line(item)
+
+
+def item_deleted(item):
+    line = item._rollup_line
+    if line and line[0] not in getattr(_deleting, 'ids', ()):
+        _move_line(line, -1)
+
+
+def _live_rows(start_date, end_date, staff_id=None):
+    """Rollup-shaped rows aggregated straight from completed orders"""
+    orders = Order.objects.filter(status='completed', **date_window('completed_at', start_date, end_date))
+    if staff_id is not None:
+        orders = orders.filter(staff_id=staff_id)
+    # Aliases avoid clashing with the Order fields of the same name
+    grouped = orders.annotate(date=business_day('completed_at')).values(*KEY_FIELDS).annotate(
+        rollup_order_count=Count('id'),
+        rollup_total_amount=Sum('total_amount'),
+        rollup_cash_received=Sum('cash_received'),
+        rollup_cash_received_count=Count('cash_received'),
+        rollup_change_given=Sum('change'),
+        rollup_change_count=Count('change'),
+    ).order_by()
+    rows = []
+    for row in grouped:
+        entry = {name: row[name] for name in KEY_FIELDS}
+        entry.update({name: row[f'rollup_{name}'] or 0 for name in MEASURES})
+        rows.append(entry)
+    return rows
+
+
+def _live_cookie_rows(start_date, end_date, staff_id=None):
+    """DailyCookieRollup-shaped rows aggregated straight from completed orders' lines"""
+    lines = OrderItem.objects.filter(order__status='completed', **date_window('order__completed_at', start_date, end_date))
+    if staff_id is not None:
+        lines = lines.filter(order__staff_id=staff_id)
+    grouped = lines.annotate(
+        date=business_day('order__completed_at'), staff_id=F('order__staff_id')
+    ).values('date', 'cookie_id', 'staff_id').annotate(
+        rollup_quantity=Sum('quantity'),
+        rollup_revenue=Sum(F('quantity') * F('price')),
+    ).order_by()
+    return [
+        {'date': row['date'], 'cookie_id': row['cookie_id'], 'staff_id': row['staff_id'],
+         'quantity': row['rollup_quantity'] or 0, 'revenue': row['rollup_revenue'] or 0}
+        for row in grouped
+    ]
+
+
+def _replace(model, rows, start_date, end_date):
+    stored = model.objects.all()
+    if start_date is not None:
+        stored = stored.filter(date__gte=start_date)
+    if end_date is not None:
+        stored = stored.filter(date__lte=end_date)
+    stored.delete()
+    model.objects.bulk_create([model(**row) for row in rows], batch_size=500)
+    return len(rows)
+
+
+def rebuild(start_date=None, end_date=None):
+    """Recompute both rollups for a date range (all history when no bounds are given).
+
+    Returns the number of (sales, cookie) rows written.
+    """
+    with transaction.atomic():
+        return (
+            _replace(DailySalesRollup, _live_rows(start_date, end_date), start_date, end_date),
+            _replace(DailyCookieRollup, _live_cookie_rows(start_date, end_date), start_date, end_date),
+        )
+
+
+def sales_rows(start_date, end_date, staff_id=None):
+    """Rollup rows (dicts of KEY_FIELDS + MEASURES) for start_date..end_date.
+
+    Closed days come from DailySalesRollup; today (and anything later) is
+    aggregated from raw orders, since its numbers are still moving.
+    """
+    today = business_date()
+    rows = []
+    closed_end = min(end_date, today - timedelta(days=1))
+    if start_date <= closed_end:
+        stored = DailySalesRollup.objects.filter(date__range=[start_date, closed_end])
+        if staff_id is not None:
+            stored = stored.filter(staff_id=staff_id)
+        rows.extend(stored.values(*KEY_FIELDS, *MEASURES))
+    if end_date >= today:
+        rows.extend(_live_rows(max(start_date, today), end_date, staff_id))
+    return rows
+
+
+def top_cookies(start_date, end_date, staff_id=None, limit=10):
+    """Best sellers by units sold over start_date..end_date, most sold first.
+
+    Each entry has cookie_id, cookie__name, cookie__price, quantity_sold and
+    revenue (units x price paid). Closed days are summed from
+    DailyCookieRollup, today from raw order lines.
+    """
+    today = business_date()
+    sold = {}
+    parts = []
+    closed_end = min(end_date, today - timedelta(days=1))
+    if start_date <= closed_end:
+        stored = DailyCookieRollup.objects.filter(date__range=[start_date, closed_end])
+        if staff_id is not None:
+            stored = stored.filter(staff_id=staff_id)
+        parts.append(stored.values('cookie_id', 'cookie__name', 'cookie__price').annotate(
+            quantity_sold=Sum('quantity'), line_revenue=Sum('revenue')
+        ))
+    if end_date >= today:
+        lines = OrderItem.objects.filter(
+            order__status='completed', **date_window('order__completed_at', max(start_date, today), end_date)
+        )
+        if staff_id is not None:
+            lines = lines.filter(order__staff_id=staff_id)
+        parts.append(lines.values('cookie_id', 'cookie__name', 'cookie__price').annotate(
+            quantity_sold=Sum('quantity'), line_revenue=Sum(F('quantity') * F('price'))
+        ))
+
+    for part in parts:
+        for row in part.order_by():
+            entry = sold.setdefault(row['cookie_id'], {
+                'cookie_id': row['cookie_id'],
+                'cookie__name': row['cookie__name'],
+                'cookie__price': row['cookie__price'],
+                'quantity_sold': 0,
+                'revenue': Decimal('0.00'),
+            })
+            entry['quantity_sold'] += row['quantity_sold'] or 0
+            entry['revenue'] += row['line_revenue'] or 0
+    ranked = sorted((entry for entry in sold.values() if entry['quantity_sold'] > 0),
+                    key=lambda entry: -entry['quantity_sold'])
+    return ranked[:limit]
+
+
+class SalesTotals:
+    """Running totals over rollup rows"""
+
+    def __init__(self, rows=()):
+        for name in MEASURES:
+            setattr(self, name, 0)
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        for name in MEASURES:
+            setattr(self, name, getattr(self, name) + row[name])
+
+    @property
+    def average_sale(self):
+        return self.total_amount / self.order_count if self.order_count else 0
+
+    @property
+    def avg_cash_received(self):
+        return self.cash_received / self.cash_received_count if self.cash_received_count else 0
+
+    @property
+    def avg_change(self):
+        return self.change_given / self.change_count if self.change_count else 0
+
+
+def totals(rows, **match):
+    """SalesTotals over the rows whose key fields equal ``match``"""
+    return SalesTotals(row for row in rows if all(row[name] == value for name, value in match.items()))
@@ -0,0 +1,114 @@
+# cookie_app/sequences.py
+import functools
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import IdSequence, Order
+
+HEX_SEQUENCE = 'order-hex'
+# Highest order whose random hex_id predates the counter (set by migration 0017)
+LEGACY_HEX_CUTOFF = 'order-hex-legacy'
+# Real sequence used for hex numbers on PostgreSQL (created by migration 0029)
+HEX_DB_SEQUENCE = 'cookie_app_order_hex_seq'
+
+_MASK32 = 0xFFFFFFFF
+
+
+def order_sequence_name(prefix, day):
+    """Counter name for the per-day, per-prefix order_id sequence"""
+    return f"order:{prefix}-{day.strftime('%Y%m%d')}"
+
+
+def allocate(names, step=1):
+    """Atomically advance each named counter by ``step`` and return {name: new_value}.
+
+    On PostgreSQL and SQLite this is a single INSERT ... ON CONFLICT DO UPDATE
+    ... RETURNING statement covering every name, so callers never SELECT the
+    counter or retry on a unique-constraint failure. The counter rows stay
+    locked until the surrounding transaction ends, which is what serialises
+    concurrent kiosks onto distinct sequence numbers (and keeps the daily
+    order numbers gapless); hex ids come from next_hex_ids() instead.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        table = connection.ops.quote_name(IdSequence._meta.db_table)
+        rows = ', '.join(['(%s, %s)'] * len(names))
+        params = []
+        for name in names:
+            params.extend([name, step])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, value) VALUES {rows} "
+                f"ON CONFLICT (name) DO UPDATE SET value = {table}.value + %s "
+                f"RETURNING name, value",
+                params + [step],
+            )
+            return dict(cursor.fetchall())
+
+    # Generic fallback: UPDATE first, create the row on first use
+    values = {}
+    with transaction.atomic():
+        for name in names:
+            if not IdSequence.objects.filter(name=name).update(value=F('value') + step):
+                try:
+                    with transaction.atomic():
+                        IdSequence.objects.create(name=name, value=step)
+                except IntegrityError:
+                    IdSequence.objects.filter(name=name).update(value=F('value') + step)
+            values[name] = IdSequence.objects.get(name=name).value
+    return values
+
+
+def hex_from_sequence(value):
+    """Map a sequence number onto an 8-character hex id.
+
+    Uses the MurmurHash3 finaliser, which is a bijection on 32-bit integers:
+    distinct sequence numbers always give distinct ids, so no existence check
+    is needed, while consecutive orders still get unrelated-looking ids.
+    """
+    h = value & _MASK32
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & _MASK32
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & _MASK32
+    h ^= h >> 16
+    return f"{h:08X}"
+
+
+@functools.lru_cache(maxsize=1)
+def legacy_hex_cutoff():
+    """pk of the last order whose hex_id predates the counter (0 if none)"""
+    return IdSequence.objects.filter(name=LEGACY_HEX_CUTOFF).values_list('value', flat=True).first() or 0
+
+
+def _legacy_collisions(hex_ids):
+    """Which of ``hex_ids`` a legacy order already holds (one lookup on the unique hex_id index)"""
+    last = legacy_hex_cutoff()
+    if not last:
+        return set()
+    return set(Order.objects.filter(hex_id__in=hex_ids, pk__lte=last).values_list('hex_id', flat=True))
+
+
+def _hex_numbers(count):
+    if connection.vendor == 'postgresql':
+        # nextval() never waits on, or rolls back with, the order's transaction
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [HEX_DB_SEQUENCE, count])
+            return [row[0] for row in cursor.fetchall()]
+    # Elsewhere the counter row is enough: SQLite already serialises writers
+    last = allocate([HEX_SEQUENCE], step=count)[HEX_SEQUENCE]
+    return list(range(last - count + 1, last + 1))
+
+
+def next_hex_ids(count=1):
+    """Return ``count`` unused hex_ids, skipping any a legacy order already holds"""
+    hex_ids = []
+    while len(hex_ids) < count:
+        batch = [hex_from_sequence(number) for number in _hex_numbers(count - len(hex_ids))]
+        taken = _legacy_collisions(batch)
+        hex_ids.extend(hex_id for hex_id in batch if hex_id not in taken)
+    return hex_ids
@@ -1,11 +1,12 @@
 # cookie_app/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.core.cache import cache
 from django.contrib.auth.models import User
 from allauth.socialaccount.signals import pre_social_login
-from .models import Order, UserProfile, Customer
+from .models import Category, Cookie, MediaImage, Order, OrderItem, UserProfile, Customer
 from .utils import log_activity
+from . import catalog, events, images, media_index, rollups
+from .journal import get_journal
 
 @receiver(post_save, sender=Order)
 def notify_new_order(sender, instance, created, **kwargs):
@@ -13,11 +14,12 @@ def notify_new_order(sender, instance, created, **kwargs):
     Signal to handle new order creation and send real-time notifications
     """
     if created:
+        if getattr(instance, '_side_effects_queued', False):
+            # create_order() logs and counts the order once its transaction commits
+            return
         try:
-            # Increment new orders count for real-time notifications
-            cache_key = 'new_orders_count'
-            current_count = cache.get(cache_key, 0)
-            cache.set(cache_key, current_count + 1, 300)  # 5 minutes timeout
+            # Increment new orders count for real-time notifications (shared by all workers)
+            get_journal().incr('new_orders')
             
             # Log the activity
             log_activity(
@@ -33,6 +35,82 @@ def notify_new_order(sender, instance, created, **kwargs):
         except Exception as e:
             print(f"Error in order signal: {e}")
 
+@receiver(post_init, sender=Order)
+def remember_order_sales(sender, instance, **kwargs):
+    """Snapshot what a loaded order contributes to the daily sales rollup"""
+    rollups.remember(instance)
+
+@receiver(pre_save, sender=Order)
+def capture_order_contribution(sender, instance, **kwargs):
+    rollups.order_saving(instance)
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, created, **kwargs):
+    """Keep the daily sales and cookie rollups in step as orders complete, get voided or change"""
+    rollups.order_saved(instance, created)
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    events.remember(instance)
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, **kwargs):
+    """Push created/paid/status-changed/voided events to open event streams"""
+    events.order_saved(instance, created)
+
+@receiver(post_delete, sender=Order)
+def journal_order_delete(sender, instance, **kwargs):
+    events.order_deleted(instance)
+
+@receiver(pre_delete, sender=Order)
+def capture_order_sales(sender, instance, **kwargs):
+    rollups.order_deleting(instance)
+
+@receiver(post_delete, sender=Order)
+def remove_from_sales_rollup(sender, instance, **kwargs):
+    rollups.order_deleted(instance)
+
+@receiver(post_init, sender=OrderItem)
+def remember_order_line(sender, instance, **kwargs):
+    rollups.remember_item(instance)
+
+@receiver(pre_save, sender=OrderItem)
+def capture_order_line_edit(sender, instance, **kwargs):
+    rollups.item_saving(instance)
+
+@receiver(post_save, sender=OrderItem)
+def update_cookie_rollup(sender, instance, **kwargs):
+    """Order lines added or edited on an already completed order (e.g. in the admin)"""
+    rollups.item_saved(instance)
+
+@receiver(pre_delete, sender=OrderItem)
+def capture_order_line(sender, instance, **kwargs):
+    rollups.item_deleting(instance)
+
+@receiver(post_delete, sender=OrderItem)
+def remove_from_cookie_rollup(sender, instance, **kwargs):
+    rollups.item_deleted(instance)
+
+@receiver(post_save, sender=Cookie)
+@receiver(post_delete, sender=Cookie)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, instance, **kwargs):
+    """Menus rebuild their catalog snapshot after any cookie or category change"""
+    catalog.invalidate()
+
+@receiver(post_save, sender=Cookie)
+def make_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Resize a newly saved cookie photo into the srcset derivatives"""
+    if not raw and images.needs_derivatives(instance):
+        images.derivatives_on_commit(instance)
+
+@receiver(post_save, sender=MediaImage)
+@receiver(post_delete, sender=MediaImage)
+def invalidate_media_index(sender, instance, **kwargs):
+    """The landing page re-reads featured images after any index change"""
+    media_index.invalidate()
+
 @receiver(pre_social_login)
 def handle_google_login(sender, request, sociallogin, **kwargs):
     """
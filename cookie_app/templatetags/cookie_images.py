@@ -0,0 +1,37 @@
+# cookie_app/templatetags/cookie_images.py
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from cookie_app.images import srcsets
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _picture(sources, src, alt, css_class, sizes, size=None):
+    tags = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset, sizes) for fmt, srcset in sources.items()),
+    )
+    dimensions = format_html(' width="{}" height="{}"', *size) if size else ''
+    # display: contents keeps the <img> sized by the card as before
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" alt="{}" class="{}"{} loading="lazy" decoding="async"></picture>',
+        tags, src, alt, css_class, dimensions,
+    )
+
+
+@register.simple_tag
+def cookie_picture(cookie, sizes='(max-width: 576px) 50vw, 240px', css_class='', alt=None):
+    """<picture> for a cookie photo: AVIF/WebP srcsets with the original as fallback.
+
+    Usage: {% cookie_picture cookie sizes="160px" css_class="cookie-img" %}
+    """
+    return _picture(srcsets(cookie), cookie.image.url, cookie.name if alt is None else alt, css_class, sizes)
+
+
+@register.simple_tag
+def featured_picture(image, sizes='(max-width: 576px) 100vw, 300px', css_class='', alt=''):
+    """<picture> for an entry of media_index.featured_images()"""
+    return _picture(image['srcsets'], image['url'], alt, css_class, sizes, (image['width'], image['height']))
@@ -1,3 +1,1474 @@
-from django.test import TestCase
+import asyncio
+import gc
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import activity, catalog, events, idpools, images, journal, media_index, middleware, receipts, rollups
+from .dates import business_date, day_start
+from .inventory import InsufficientStock, release_stock, reserve_stock
+from .models import (
+    ActivityLog, ActivityLogArchive, CashFloat, Category, Cookie, Customer, IdSequence, MediaImage, Order, OrderItem,
+    PooledId, Staff, UserProfile, VoidLog,
+)
+from .orders import add_loyalty_points, create_order
+from .pagination import InvalidCursor, decode_cursor, keyset_page
+from .reports import build_sales_report
+from .retention import ActivityLogSearch, approximate_count, archive_activity_logs, export_archived_month
+from .sequences import (
+    LEGACY_HEX_CUTOFF, allocate, hex_from_sequence, legacy_hex_cutoff, next_hex_ids, order_sequence_name,
+)
+from .utils import log_activity
+
+
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    QUERY_PROFILING=False,
+    ACTIVITY_LOG_BUFFER=False,
+)
+class StockReservationTests(TestCase):
+    """Orders take stock once, all-or-nothing, and never below zero"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Classics')
+        cls.chip = Cookie.objects.create(category=category, name='Choc Chip', flavor='chocolate', price=50, stock_quantity=5)
+        cls.ube = Cookie.objects.create(category=category, name='Ube Crinkle', flavor='ube', price=60, stock_quantity=2)
+        cls.staff = User.objects.create_user('reserve-staff', 'reserve@example.com', 'pw')
+        Staff.objects.create(user=cls.staff, role='staff', is_active=True)
+
+    def stock(self):
+        return dict(Cookie.objects.values_list('name', 'stock_quantity'))
+
+    def test_oversell_is_refused_for_the_whole_order(self):
+        reserve_stock({self.chip.pk: 3})
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.chip.pk: 3, self.ube.pk: 5})
+        self.assertEqual(
+            [(shortage['name'], shortage['available']) for shortage in raised.exception.shortages],
+            [('Choc Chip', 2), ('Ube Crinkle', 2)],
+        )
+        self.assertEqual(self.stock(), {'Choc Chip': 2, 'Ube Crinkle': 2})
+
+        reservation = reserve_stock({self.chip.pk: 3, self.ube.pk: 2}, allow_partial=True)
+        self.assertEqual(reservation.lines, {self.ube.pk: 2})
+        self.assertEqual(self.stock(), {'Choc Chip': 2, 'Ube Crinkle': 0})
+        release_stock({self.ube.pk: 2})
+        self.assertEqual(self.stock(), {'Choc Chip': 2, 'Ube Crinkle': 2})
+
+    def test_kiosk_order_takes_stock_once(self):
+        client = Client()
+        response = client.post(
+            reverse('kiosk_order'), json.dumps({'items': [{'cookie_id': self.chip.pk, 'quantity': 2}]}),
+            content_type='application/json', secure=True, HTTP_HOST='localhost',
+        )
+        self.assertTrue(response.json()['success'], response.json())
+        self.assertEqual(self.stock()['Choc Chip'], 3)
+
+        response = client.post(
+            reverse('kiosk_order'), json.dumps({'items': [{'cookie_id': self.chip.pk, 'quantity': 4}]}),
+            content_type='application/json', secure=True, HTTP_HOST='localhost',
+        )
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self.stock()['Choc Chip'], 3)
+
+        client.force_login(self.staff)
+        order = Order.objects.get()
+        client.post(
+            reverse('staff_record_sale'),
+            {'order_type': 'kiosk', 'kiosk_order_id': order.pk, 'payment_method': 'gcash'},
+            secure=True, HTTP_HOST='localhost',
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+        self.assertEqual(self.stock()['Choc Chip'], 3)
+
+    def test_cancelled_order_gives_its_stock_back_once(self):
+        user = User.objects.create_user('reserve-customer', 'customer@example.com', 'pw')
+        profile = UserProfile.objects.create(user=user, user_type='customer', customer_id='CUST900003')
+        customer = Customer.objects.create(user_profile=profile, name='Reserve Customer', email=user.email, is_email_verified=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = create_order(
+                reserve_stock({self.chip.pk: 2, self.ube.pk: 1}).items(),
+                customer=customer, customer_name=customer.name, order_type='kiosk', payment_method='cash',
+            )
+        self.assertEqual(self.stock(), {'Choc Chip': 3, 'Ube Crinkle': 1})
+
+        client = Client()
+        client.force_login(user)
+        url = reverse('customer_cancel_order', args=[order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(url, secure=True, HTTP_HOST='localhost')
+            client.post(url, secure=True, HTTP_HOST='localhost')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(self.stock(), {'Choc Chip': 5, 'Ube Crinkle': 2})
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Competing reservations can't sell the same stock twice"""
+
+    def test_racing_buyers_never_oversell(self):
+        cookie = Cookie.objects.create(
+            category=Category.objects.create(name='Classics'), name='Choc Chip', flavor='chocolate', price=50, stock_quantity=10,
+        )
+        outcomes, start = [], threading.Barrier(8)
+
+        def buy():
+            start.wait()
+            try:
+                while True:
+                    try:
+                        reserve_stock({cookie.pk: 3})
+                        outcomes.append('sold')
+                        return
+                    except InsufficientStock:
+                        outcomes.append('refused')
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; try again
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cookie.refresh_from_db()
+        self.assertEqual(sorted(outcomes), ['refused'] * 5 + ['sold'] * 3)
+        self.assertEqual(cookie.stock_quantity, 1)
+
+
+@override_settings(ACTIVITY_LOG_BUFFER=False)
+class CreateOrderTests(TestCase):
+    """An order costs the same queries whatever its size, and loyalty is added in the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Classics')
+        cls.cookies = [
+            Cookie.objects.create(category=category, name=f'Cookie {n}', flavor='chocolate', price=50, stock_quantity=100)
+            for n in range(12)
+        ]
+        user = User.objects.create_user('order-customer', 'order@example.com', 'pw')
+        profile = UserProfile.objects.create(user=user, user_type='customer', customer_id='CUST900004')
+        cls.customer = Customer.objects.create(user_profile=profile, name='Order Customer', email=user.email)
+
+    def place(self, lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_order(
+                [(cookie, 2, cookie.price) for cookie in self.cookies[:lines]], award_loyalty=True,
+                customer=self.customer, customer_name=self.customer.name, order_type='kiosk', payment_method='cash',
+            )
+
+    def test_query_count_does_not_grow_with_the_lines(self):
+        # The first order creates the day's id counters
+        self.place(1)
+        with self.assertNumQueries(11):
+            self.place(1)
+        with self.assertNumQueries(11):
+            order = self.place(len(self.cookies))
+        self.assertEqual(order.items.count(), len(self.cookies))
+
+    def test_loyalty_points_are_added_without_a_read(self):
+        order = self.place(1)
+        stale = Order.objects.select_related('customer').get(pk=order.pk)
+        self.place(1)
+        with self.assertNumQueries(1):
+            self.assertEqual(add_loyalty_points(stale), 100)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.loyalty_points, 300)
+
+
+class OrderIdSequenceTests(TestCase):
+    """hex_ids come from the counter and never repeat one kept from before it"""
+
+    def setUp(self):
+        legacy_hex_cutoff.cache_clear()
+        self.addCleanup(legacy_hex_cutoff.cache_clear)
+
+    def test_new_orders_step_over_legacy_hex_ids(self):
+        legacy = Order.objects.create(order_id='KIO-20240101-001', hex_id=hex_from_sequence(1), total_amount=0)
+        IdSequence.objects.create(name=LEGACY_HEX_CUTOFF, value=legacy.pk)
+        order = Order.objects.create(order_type='kiosk', total_amount=0)
+        self.assertEqual(order.hex_id, hex_from_sequence(2))
+        self.assertEqual(order.order_id, f"KIO-{timezone.now():%Y%m%d}-001")
+        self.assertEqual(next_hex_ids(2), [hex_from_sequence(3), hex_from_sequence(4)])
+        # One indexed lookup per batch, not a copy of every legacy id
+        with self.assertNumQueries(2):
+            self.assertEqual(len(next_hex_ids(50)), 50)
+
+
+@override_settings(ID_POOL_BACKGROUND_REFILL=False)
+class IdPoolTests(TestCase):
+    """Customer and staff IDs are claimed from pre-generated pools"""
+
+    def setUp(self):
+        # A pool small enough to use up: 10 IDs, one of them already taken
+        tiny = idpools.IdPool(
+            'tiny', 'T', 100, 10, 3, step=3, offset=7, batch_size=4, low_water=2,
+            used_ids=lambda values: [value for value in values if value == 'T105'],
+        )
+        patched = mock.patch.dict(idpools.POOLS, {'tiny': tiny})
+        patched.start()
+        self.addCleanup(patched.stop)
+        self.tiny = tiny
+
+    def test_stride_visits_every_id_once(self):
+        for pool in idpools.POOLS.values():
+            values = {pool.format(position) for position in range(pool.size)}
+            self.assertEqual(len(values), pool.size)
+            self.assertEqual(
+                sorted(int(value[len(pool.prefix):]) for value in values), list(range(pool.start, pool.start + pool.size)),
+            )
+
+    def test_empty_pool_is_refilled_inline(self):
+        first = idpools.take_id('tiny')
+        self.assertEqual(PooledId.objects.filter(pool='tiny').count(), 3)
+        self.assertEqual(idpools.pool_stats()['tiny']['empty_pool_hits'], 1)
+        idpools.take_id('tiny')
+        self.assertEqual(PooledId.objects.filter(pool='tiny').count(), 2)
+        self.assertEqual(idpools.pool_stats()['tiny']['empty_pool_hits'], 1)
+        self.assertIn(first, {self.tiny.format(position) for position in range(4)})
+
+    def test_ids_are_unique_until_the_pool_is_exhausted(self):
+        taken = []
+        while True:
+            try:
+                taken.append(idpools.take_id('tiny'))
+            except idpools.IdPoolExhausted:
+                break
+        self.assertEqual(len(taken), 9)
+        self.assertEqual(len(set(taken)), 9)
+        self.assertNotIn('T105', taken)
+        self.assertEqual(idpools.pool_stats()['tiny'], {
+            'capacity': 10, 'available': 0, 'unscanned': 0, 'scanned_percent': 100.0,
+            'empty_pool_hits': 4, 'exhausted': True,
+        })
+
+    def test_new_staff_and_customers_get_pooled_ids(self):
+        staff = Staff.objects.create(user=User.objects.create_user('pooled-staff', password='pw'), role='staff')
+        profile = UserProfile.objects.create(user=User.objects.create_user('pooled-customer', password='pw'), user_type='customer')
+        self.assertRegex(staff.staff_id, r'^STAFF\d{4}$')
+        self.assertRegex(profile.customer_id, r'^CUST\d{6}$')
+        stats = idpools.pool_stats()
+        self.assertEqual(stats['staff']['available'], idpools.POOLS['staff'].batch_size - 1)
+        self.assertEqual(stats['customer']['scanned_percent'], round(100 * 200 / 900000, 2))
+
+
+@override_settings(ACTIVITY_LOG_BUFFER=False)
+class SalesRollupTests(TestCase):
+    """Rollups kept up to date by the order and line signals match a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('rollup-staff', password='x')
+        category = Category.objects.create(name='Classics')
+        cls.chip = Cookie.objects.create(category=category, name='Choc Chip', flavor='chocolate', price=50, stock_quantity=100)
+        cls.ube = Cookie.objects.create(category=category, name='Ube Crinkle', flavor='ube', price=60, stock_quantity=100)
+
+    def order(self, days_ago=None, **fields):
+        if days_ago is not None:
+            fields.update(status='completed', completed_at=timezone.now() - timedelta(days=days_ago))
+        items = [(self.chip, 2, Decimal('50.00')), (self.ube, 1, Decimal('60.00'))]
+        return create_order(items, staff=self.staff, order_type='staff', payment_method='cash', **fields)
+
+    def rollup_state(self):
+        start, end = business_date() - timedelta(days=10), business_date() - timedelta(days=1)
+        rows = sorted(
+            (tuple(row[name] for name in rollups.KEY_FIELDS + rollups.MEASURES)
+             for row in rollups.sales_rows(start, end) if row['order_count']),
+            key=str,
+        )
+        return rows, rollups.top_cookies(start, end)
+
+    def test_incremental_updates_match_rebuild(self):
+        self.order(days_ago=3)
+
+        completed = self.order(status='pending')
+        completed.status, completed.completed_at = 'completed', timezone.now() - timedelta(days=2)
+        completed.save()
+
+        voided = self.order(days_ago=2)
+        voided.status = 'voided'
+        voided.save()
+
+        edited = self.order(days_ago=4)
+        edited.total_amount, edited.payment_method = Decimal('175.00'), 'gcash'
+        edited.completed_at -= timedelta(days=1)
+        edited.save()
+        line = edited.items.get(cookie=self.chip)
+        line.quantity = 3
+        line.save()
+        deferred = OrderItem.objects.only('id', 'quantity').get(order=edited, cookie=self.ube)
+        deferred.quantity = 4
+        deferred.save()
+        OrderItem.objects.create(order=edited, cookie=self.ube, quantity=1, price=Decimal('55.00'))
+
+        deferred_order = Order.objects.only('id', 'status').get(pk=self.order(days_ago=5).pk)
+        deferred_order.status = 'cancelled'
+        deferred_order.save()
+
+        trimmed = self.order(days_ago=3)
+        trimmed.items.get(cookie=self.ube).delete()
+        self.order(days_ago=2).delete()
+
+        incremental = self.rollup_state()
+        self.assertTrue(incremental[0])
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_state())
+
+    def test_completion_rate_counts_orders_placed_in_range(self):
+        order = self.order(days_ago=1)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=5))
+        self.order(status='pending')
+        today = business_date()
+        report = build_sales_report(today - timedelta(days=1), today)
+        self.assertEqual(report.total_sales['total_orders'], 1)
+        self.assertEqual(report.completion_stats, {'total_orders': 1, 'completed_orders': 0, 'completion_rate': 0})
+
+
+class OrderIndexUsageTests(TestCase):
+    """The report/dashboard Order queries should be answered from an index, not a table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff_user = User.objects.create(username='indexcheck')
+        for status in ('pending', 'completed'):
+            for payment_method in ('cash', 'gcash'):
+                Order.objects.create(
+                    customer_name='Index Check',
+                    order_type='staff',
+                    staff=cls.staff_user,
+                    status=status,
+                    payment_method=payment_method,
+                    total_amount=100,
+                )
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # A handful of rows always favours a sequential scan otherwise
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.window = {'created_at__gte': start, 'created_at__lt': start + timedelta(days=1)}
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            used = [name for name in index_names if f'INDEX {name}' in plan]
+        elif connection.vendor == 'postgresql':
+            used = [name for name in index_names if name in plan and 'Index' in plan]
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        self.assertTrue(used, f'Expected an index scan on one of {index_names}, got:\n{plan}')
+
+    def test_completed_orders_in_window(self):
+        # sales_report, admin_dashboard daily totals
+        self.assertUsesIndex(Order.objects.filter(status='completed', **self.window), 'order_status_created_idx')
+
+    def test_recent_completed_orders(self):
+        # admin_dashboard recent completed list, staff history
+        self.assertUsesIndex(
+            Order.objects.filter(status='completed').order_by('-completed_at')[:10],
+            'order_status_completed_idx',
+        )
+
+    def test_latest_orders(self):
+        # order_management
+        self.assertUsesIndex(Order.objects.order_by('-created_at')[:50], 'order_created_idx')
+
+    def test_staff_orders_in_window(self):
+        # order_management staff filter
+        self.assertUsesIndex(
+            Order.objects.filter(staff=self.staff_user, **self.window).order_by('-created_at'),
+            'order_staff_created_idx',
+        )
+
+    def test_cash_reconciliation_orders(self):
+        # cash_reconciliation_report
+        self.assertUsesIndex(
+            Order.objects.filter(payment_method='cash', status='completed', is_paid=True, **self.window),
+            'order_pay_status_created_idx',
+        )
+
+    def test_gcash_verification_queue(self):
+        # admin_gcash_verifications, admin_dashboard pending GCash count. SQLite
+        # cannot match a partial index against bound parameters, so there the
+        # payment_method composite index is the expected plan.
+        self.assertUsesIndex(
+            Order.objects.filter(payment_method='gcash', is_paid=False).order_by('-created_at'),
+            'order_gcash_unpaid_idx',
+            'order_pay_status_created_idx',
+        )
+
+    def test_customer_order_history_page(self):
+        # order_history, admin_customer_orders
+        self.assertUsesIndex(
+            Order.objects.filter(customer_id=1).order_by('-created_at', '-id')[:51],
+            'order_customer_created_idx',
+        )
+
+
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    QUERY_PROFILING=False,
+)
+class KeysetPaginationTests(TestCase):
+    """Order lists page on (created_at, id) with a cursor that survives new orders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('pageadmin', 'pageadmin@example.com', 'x')
+        moment = timezone.now() - timedelta(hours=1)
+        for n in range(25):
+            Order.objects.create(customer_name=f'Page {n}', order_type='staff', total_amount=10)
+        # Pairs share a timestamp, so id has to break the tie
+        for n, order in enumerate(Order.objects.order_by('id')):
+            Order.objects.filter(pk=order.pk).update(created_at=moment + timedelta(minutes=n // 2))
+
+    def walk(self, queryset, size):
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(queryset, cursor, size)
+            seen.extend(order.pk for order in page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_order_once_newest_first(self):
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        for size in (1, 2, 7, 25, 50):
+            with self.subTest(size=size):
+                self.assertEqual(self.walk(Order.objects.all(), size), expected)
+
+    def test_cursor_is_stable_when_new_orders_arrive(self):
+        first = keyset_page(Order.objects.all(), None, 10)
+        Order.objects.create(customer_name='Late', order_type='staff', total_amount=10)
+        second = keyset_page(Order.objects.all(), first.next_cursor, 10)
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[11:21])
+        self.assertEqual([order.pk for order in second], expected)
+
+    def test_bad_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_order_management_json_page(self):
+        client = Client()
+        client.force_login(self.admin)
+        url = reverse('order_management')
+        response = client.get(url, {'format': 'json', 'page_size': 10}, secure=True, HTTP_HOST='localhost')
+        data = response.json()
+        self.assertEqual(data['count'], 10)
+        self.assertTrue(data['has_next'])
+        self.assertEqual(data['html'].count('<tr>'), 10)
+
+        response = client.get(
+            url, {'format': 'json', 'page_size': 10, 'cursor': data['next_cursor']},
+            secure=True, HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.json()['count'], 10)
+
+        response = client.get(url, {'cursor': 'junk'}, secure=True, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 400)
+
+
+class ActivityLogBufferTests(TransactionTestCase):
+    """Buffered activity logging writes in batches and only for committed work"""
+
+    def setUp(self):
+        # The shared buffer may hold rows queued by earlier tests for users that no longer exist
+        activity.buffer.discard()
+        self.addCleanup(activity.buffer.discard)
+
+    def entry(self, description='test', **fields):
+        return ActivityLog(action='order_created', description=description, timestamp=timezone.now(), **fields)
+
+    def buffer(self, batch_size=3):
+        return activity.ActivityLogBuffer(batch_size=batch_size, flush_interval=60)
+
+    def test_writes_once_batch_is_full(self):
+        buffer = self.buffer()
+        buffer.add(self.entry())
+        buffer.add(self.entry())
+        self.assertEqual(ActivityLog.objects.count(), 0)
+        buffer.add(self.entry())
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_flush_keeps_the_time_the_activity_was_logged(self):
+        buffer = self.buffer()
+        logged_at = timezone.now() - timedelta(minutes=5)
+        buffer.add(ActivityLog(action='login', description='earlier', timestamp=logged_at))
+        buffer.flush()
+        self.assertEqual(ActivityLog.objects.get().timestamp, logged_at)
+
+    def test_flush_waits_for_an_open_transaction(self):
+        buffer = self.buffer()
+        buffer.add(self.entry())
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                buffer.flush()
+                raise RuntimeError
+        self.assertEqual(buffer.pending(), 1)
+        with transaction.atomic():
+            buffer.flush()
+            self.assertEqual(ActivityLog.objects.count(), 0)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_rolled_back_work_is_not_logged(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                log_activity(None, 'order_created', 'rolled back')
+                raise RuntimeError
+        self.assertEqual(activity.buffer.pending(), 0)
+        log_activity(None, 'order_created', 'committed')
+        activity.buffer.flush()
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['committed'])
+
+    def test_bad_row_does_not_hold_back_the_batch(self):
+        buffer = self.buffer(batch_size=2)
+        buffer.add(self.entry('bad', user_id=999999))
+        with redirect_stdout(io.StringIO()) as output:
+            buffer.add(self.entry('good'))
+        self.assertIn('Activity log error', output.getvalue())
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['good'])
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_batches_span_requests(self):
+        activity.buffer.add(self.entry())
+        Client().get(reverse('home'), secure=True, HTTP_HOST='localhost')
+        self.assertEqual(activity.buffer.pending(), 1)
+        self.assertEqual(ActivityLog.objects.count(), 0)
+
+    def test_closed_buffer_writes_synchronously(self):
+        buffer = self.buffer()
+        buffer.close()
+        buffer.add(self.entry())
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+
+class ActivityLogRetentionTests(TestCase):
+    """Old activity moves to the archive and stays searchable"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        # One row a day for 30 days, every third one a login
+        ActivityLog.objects.bulk_create([
+            ActivityLog(
+                action='login' if day % 3 == 0 else 'order_created',
+                description=f'day {day}',
+                timestamp=cls.now - timedelta(days=day),
+            )
+            for day in range(30)
+        ])
+
+    def descriptions(self, rows):
+        return [row.description for row in rows]
+
+    def test_archive_moves_only_old_rows_and_keeps_ids(self):
+        old_ids = set(ActivityLog.objects.filter(timestamp__lt=self.now - timedelta(days=10)).values_list('id', flat=True))
+        self.assertEqual(archive_activity_logs(self.now - timedelta(days=10), batch_size=7), len(old_ids))
+        self.assertEqual(set(ActivityLogArchive.objects.values_list('id', flat=True)), old_ids)
+        self.assertEqual(ActivityLog.objects.count(), 30 - len(old_ids))
+        self.assertEqual(archive_activity_logs(self.now - timedelta(days=10)), 0)
+
+    def test_search_reads_through_to_the_archive(self):
+        expected = [f'day {day}' for day in range(30)]
+        archive_activity_logs(self.now - timedelta(days=10))
+        search = ActivityLogSearch()
+        self.assertEqual(search.count(), 30)
+        self.assertEqual(self.descriptions(search[0:30]), expected)
+        self.assertEqual(self.descriptions(search[8:13]), expected[8:13])
+        self.assertEqual(self.descriptions(search[20:25]), expected[20:25])
+        logins = ActivityLogSearch(action='login')
+        self.assertEqual(self.descriptions(logins[0:10]), [f'day {day}' for day in range(0, 30, 3)])
+
+    def test_counts_are_capped(self):
+        self.assertEqual(approximate_count(ActivityLog.objects.all(), 10), (10, False))
+        self.assertEqual(approximate_count(ActivityLog.objects.all(), 30), (30, True))
+        self.assertFalse(ActivityLogSearch(count_limit=10).exact)
+
+    def test_export_and_purge_a_month(self):
+        archive_activity_logs(self.now + timedelta(days=1))
+        month = timezone.localtime(self.now - timedelta(days=29))
+        expected = ActivityLogArchive.objects.filter(
+            timestamp__year=month.year, timestamp__month=month.month,
+        ).count()
+        with tempfile.TemporaryDirectory() as directory:
+            path, rows = export_archived_month(month.year, month.month, directory, purge=True)
+            self.assertEqual(rows, expected)
+            with gzip.open(path, 'rt') as exported:
+                lines = [json.loads(line) for line in exported]
+            self.assertEqual(len(lines), expected)
+            self.assertEqual(export_archived_month(month.year, month.month, directory), (path, None))
+        self.assertFalse(ActivityLogArchive.objects.filter(id__in=[line['id'] for line in lines]).exists())
+
+    def test_command(self):
+        call_command('archive_activity_logs', days=10, stdout=io.StringIO())
+        self.assertFalse(ActivityLog.objects.filter(timestamp__lt=self.now - timedelta(days=10, minutes=1)).exists())
+        self.assertEqual(ActivityLog.objects.count() + ActivityLogArchive.objects.count(), 30)
+
+
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    QUERY_PROFILING=False,
+)
+class CatalogSnapshotTests(TestCase):
+    """Menus read one cached snapshot that changes with the catalog"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bars = Category.objects.create(name='Bars')
+        cls.classics = Category.objects.create(name='Classics')
+        cls.chip = Cookie.objects.create(category=cls.classics, name='Choc Chip', flavor='chocolate', price=50, stock_quantity=100)
+        cls.ube = Cookie.objects.create(category=cls.classics, name='Ube Crinkle', flavor='ube', price=60, stock_quantity=11)
+        cls.blondie = Cookie.objects.create(category=cls.bars, name='Blondie', flavor='butter', price=70, stock_quantity=5)
+        Cookie.objects.create(category=cls.bars, name='Sold Out', flavor='butter', price=70, stock_quantity=0)
+        Cookie.objects.create(category=cls.bars, name='Hidden', flavor='butter', price=70, stock_quantity=5, is_available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_groups_available_cookies(self):
+        menu = catalog.catalog_snapshot()
+        self.assertEqual([cookie.name for cookie in menu.cookies], ['Choc Chip', 'Ube Crinkle', 'Blondie'])
+        self.assertEqual(
+            {name: [cookie.name for cookie in cookies] for name, cookies in menu.by_category.items()},
+            {'Classics': ['Choc Chip', 'Ube Crinkle'], 'Bars': ['Blondie']},
+        )
+        self.assertEqual([category.name for category in menu.categories], ['Bars', 'Classics'])
+        self.assertEqual([cookie.name for cookie in menu.search('BAR')], ['Blondie'])
+
+    def test_warm_snapshot_needs_no_catalog_queries(self):
+        catalog.catalog_snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            menu = catalog.catalog_snapshot()
+            [cookie.category.name for cookie in menu.cookies]
+        self.assertFalse([query for query in queries.captured_queries if 'cookie_app_cookie' in query['sql']])
+
+    def test_cookie_and_category_changes_rebuild(self):
+        version = catalog.catalog_snapshot().version
+        with self.captureOnCommitCallbacks(execute=True):
+            Cookie.objects.filter(pk=self.chip.pk).update(price=55)
+        self.assertEqual(catalog.catalog_snapshot().version, version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chip.price = 55
+            self.chip.save()
+        menu = catalog.catalog_snapshot()
+        self.assertNotEqual(menu.version, version)
+        self.assertEqual(menu.cookies[0].price, 55)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bars.save()
+        self.assertNotEqual(catalog.catalog_snapshot().version, menu.version)
+
+    def test_only_low_stock_changes_rebuild(self):
+        version = catalog.catalog_snapshot().version
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.chip.pk: 1})
+        self.assertEqual(catalog.catalog_snapshot().version, version)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.ube.pk: 2})
+        self.assertNotEqual(catalog.catalog_snapshot().version, version)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.blondie.pk: 5})
+        self.assertNotIn('Blondie', [cookie.name for cookie in catalog.catalog_snapshot().cookies])
+
+    def test_menu_fragments_follow_the_snapshot(self):
+        url = reverse('public_menu')
+        self.assertContains(self.client.get(url, secure=True, HTTP_HOST='localhost'), 'Blondie')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chip.price = 58
+            self.chip.save()
+            reserve_stock({self.blondie.pk: 5})
+        response = self.client.get(url, secure=True, HTTP_HOST='localhost')
+        self.assertContains(response, '₱58')
+        self.assertNotContains(response, 'Blondie')
+        response = self.client.get(url, {'q': 'chip'}, secure=True, HTTP_HOST='localhost')
+        self.assertContains(response, 'Choc Chip')
+        self.assertNotContains(response, 'Ube Crinkle')
+
+    def test_menu_stock_is_live_under_cached_fragments(self):
+        user = User.objects.create_user('menu-customer', 'menu@example.com', 'pw')
+        profile = UserProfile.objects.create(user=user, user_type='customer', customer_id='CUST900002')
+        Customer.objects.create(user_profile=profile, name='Menu Customer', email=user.email, is_email_verified=True)
+        self.client.force_login(user)
+        url = reverse('place_order')
+        self.assertContains(self.client.get(url, secure=True, HTTP_HOST='localhost'), f'"{self.chip.pk}": 100')
+        version = catalog.catalog_snapshot().version
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.chip.pk: 3})
+        self.assertEqual(catalog.catalog_snapshot().version, version)
+        self.assertContains(self.client.get(url, secure=True, HTTP_HOST='localhost'), f'"{self.chip.pk}": 97')
+
+
+
+class CookieImageDerivativeTests(TestCase):
+    """Photos get resized WebP/AVIF copies for srcset and are listed in the media index"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=media.name, COOKIE_IMAGE_WIDTHS=[160, 320, 640],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.category = Category.objects.create(name='Classics')
+
+    def photo(self, name, size=(400, 300)):
+        out = io.BytesIO()
+        Image.new('RGB', size, (150, 90, 40)).save(out, 'PNG')
+        return SimpleUploadedFile(name, out.getvalue(), content_type='image/png')
+
+    def test_saving_a_photo_generates_and_replaces_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cookie = Cookie.objects.create(
+                category=self.category, name='Choc Chip', flavor='chocolate', price=50, image=self.photo('chip.png'),
+            )
+        cookie.refresh_from_db()
+        # Never upscaled past the 400px original
+        self.assertEqual(cookie.image_variants['widths'], [160, 320, 400])
+        storage = cookie.image.storage
+        first = images.derivative_names(cookie.image_variants)
+        self.assertTrue(first and all(storage.exists(name) for name in first))
+        self.assertIn('320w', images.srcsets(cookie)['webp'])
+
+        html = Template('{% load cookie_images %}{% cookie_picture cookie css_class="cookie-img" %}').render(Context({'cookie': cookie}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'src="{cookie.image.url}"', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cookie.image = self.photo('chip-v2.png')
+            cookie.save()
+        cookie.refresh_from_db()
+        self.assertFalse(any(storage.exists(name) for name in first))
+        self.assertTrue(all(storage.exists(name) for name in images.derivative_names(cookie.image_variants)))
+
+    def test_same_stem_in_another_format_gets_its_own_derivatives(self):
+        media = Path(settings.MEDIA_ROOT)
+        (media / 'cookies').mkdir()
+        Image.new('RGB', (400, 300), 'red').save(media / 'cookies' / 'tray.png')
+        Image.new('RGB', (400, 300), 'blue').save(media / 'cookies' / 'tray.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('index_media', stdout=io.StringIO())
+        png, jpg = (
+            set(images.derivative_names(MediaImage.objects.get(name=name).variants))
+            for name in ('cookies/tray.png', 'cookies/tray.jpg')
+        )
+        self.assertTrue(png and jpg)
+        self.assertFalse(png & jpg)
+
+    def test_backfill_command(self):
+        cookie = Cookie.objects.create(category=self.category, name='Ube', flavor='ube', price=60)
+        Cookie.objects.filter(pk=cookie.pk).update(image=Cookie.image.field.generate_filename(cookie, 'ube.png'))
+        cookie.refresh_from_db()
+        cookie.image.storage.save(cookie.image.name, self.photo('ube.png'))
+        self.assertEqual(images.srcsets(cookie), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_image_derivatives', stdout=io.StringIO())
+        cookie.refresh_from_db()
+        self.assertEqual(cookie.image_variants['source'], cookie.image.name)
+        self.assertTrue(images.srcsets(cookie))
+
+
+    def test_media_index_feeds_the_landing_page(self):
+        media = Path(settings.MEDIA_ROOT)
+        (media / 'cookies').mkdir()
+        Image.new('RGB', (800, 600)).save(media / 'cookies' / 'tray.png')
+        Image.new('RGB', (1200, 500)).save(media / 'hero.jpg')
+        (media / 'notes.txt').write_text('not an image')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('index_media', stdout=io.StringIO())
+        featured = {image['name']: image for image in media_index.featured_images()}
+        self.assertEqual(set(featured), {'cookies/tray.png', 'hero.jpg'})
+        self.assertEqual((featured['hero.jpg']['width'], featured['hero.jpg']['height']), (1200, 500))
+        self.assertIn('640w', featured['hero.jpg']['srcsets']['webp'])
+
+        # The page reads the index, not the directory
+        (media / 'hero.jpg').unlink()
+        response = self.client.get(reverse('public_home'), secure=True, HTTP_HOST='localhost')
+        self.assertContains(response, featured['hero.jpg']['url'])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('index_media', stdout=io.StringIO())
+        self.assertEqual([image['name'] for image in media_index.featured_images()], ['cookies/tray.png'])
+
+
+
+class GcashReceiptIngestTests(TestCase):
+    """Receipt uploads are staged during the order request and re-encoded after commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cookie = Cookie.objects.create(
+            category=Category.objects.create(name='Classics'), name='Choc Chip', flavor='chocolate', price=50, stock_quantity=20,
+        )
+        cls.user = User.objects.create_user('receipt-customer', 'receipt@example.com', 'pw')
+        profile = UserProfile.objects.create(user=cls.user, user_type='customer', customer_id='CUST900001')
+        Customer.objects.create(user_profile=profile, name='Receipt Customer', email=cls.user.email, is_email_verified=True)
+
+    def setUp(self):
+        media, staging = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(staging.cleanup)
+        self.staging = staging.name
+        overrides = override_settings(
+            MEDIA_ROOT=media.name, GCASH_RECEIPT_STAGING_DIR=staging.name, GCASH_RECEIPT_BACKGROUND=False,
+            ACTIVITY_LOG_BUFFER=False,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            QUERY_PROFILING=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['cart'] = {str(self.cookie.pk): 2}
+        session.save()
+
+    def place_gcash_order(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('place_order'), {'payment_method': 'gcash', 'gcash_screenshot': upload},
+                secure=True, HTTP_HOST='localhost', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        self.assertTrue(response.json()['success'], response.json())
+        return Order.objects.get(pk=response.json()['order_id'])
+
+    def test_receipt_is_downsized_with_a_preview(self):
+        out = io.BytesIO()
+        Image.new('RGBA', (2400, 3200), (0, 120, 255, 255)).save(out, 'PNG')
+        order = self.place_gcash_order(SimpleUploadedFile('receipt.png', out.getvalue(), content_type='image/png'))
+
+        self.assertEqual(order.gcash_receipt_status, 'ready')
+        with Image.open(order.gcash_screenshot.path) as full, Image.open(order.gcash_receipt_preview.path) as preview:
+            self.assertEqual((full.format, max(full.size)), ('JPEG', 1600))
+            self.assertEqual(max(preview.size), 320)
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_unreadable_receipt_still_places_the_order(self):
+        order = self.place_gcash_order(SimpleUploadedFile('receipt.png', b'not really a png', content_type='image/png'))
+        self.assertEqual(order.gcash_receipt_status, 'failed')
+        self.assertFalse(order.gcash_screenshot)
+        self.assertFalse(order.is_paid)
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_receipts_left_by_a_stopped_worker_are_recovered(self):
+        order = Order.objects.create(customer_name='Walk-in', order_type='kiosk', payment_method='gcash', total_amount=10)
+        staged = Path(self.staging) / f'order-{order.pk}.upload'
+        Image.new('RGB', (500, 400)).save(staged, 'JPEG')
+        self.assertEqual(receipts.staged_receipts(), [(order.pk, str(staged))])
+
+        # Freshly staged receipts are left to the worker
+        call_command('process_gcash_receipts', stdout=io.StringIO())
+        self.assertTrue(staged.exists())
+
+        stale = time.time() - 3600
+        os.utime(staged, (stale, stale))
+        call_command('process_gcash_receipts', stdout=io.StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.gcash_receipt_status, 'ready')
+        self.assertEqual(receipts.staged_receipts(), [])
+
+    def test_a_handled_receipt_is_not_marked_failed(self):
+        order = Order.objects.create(
+            customer_name='Walk-in', order_type='kiosk', payment_method='gcash', total_amount=10, gcash_receipt_status='ready',
+        )
+        self.assertIsNone(receipts.process_receipt(order.pk, str(Path(self.staging) / 'order-gone.upload')))
+        staged = Path(self.staging) / f'order-{order.pk}.upload'
+        staged.write_bytes(b'not an image')
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(receipts.process_receipt(order.pk, str(staged)))
+        order.refresh_from_db()
+        self.assertEqual(order.gcash_receipt_status, 'ready')
+
+    def test_receipts_never_handed_off_are_marked_failed(self):
+        stuck, recent, staged = (
+            Order.objects.create(
+                customer_name='Walk-in', order_type='kiosk', payment_method='gcash', total_amount=10,
+                gcash_receipt_status='processing',
+            )
+            for _ in range(3)
+        )
+        Order.objects.filter(pk__in=[stuck.pk, staged.pk]).update(created_at=timezone.now() - timedelta(hours=1))
+        (Path(self.staging) / f'order-{staged.pk}.upload').write_bytes(b'')
+
+        call_command('process_gcash_receipts', stdout=io.StringIO())
+        statuses = dict(Order.objects.values_list('pk', 'gcash_receipt_status'))
+        self.assertEqual(statuses[stuck.pk], 'failed')
+        self.assertEqual(statuses[recent.pk], 'processing')
+        self.assertEqual(statuses[staged.pk], 'processing')
+
+
+@override_settings(ACTIVITY_LOG_BUFFER=False)
+class RealtimeDataTests(TestCase):
+    """Realtime endpoints answer 304 until an order changes, and send deltas against a cached snapshot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('realtime-staff', password='pw')
+        Staff.objects.create(user=cls.staff, role='staff', is_active=True)
+        cls.chip = Cookie.objects.create(
+            category=Category.objects.create(name='Classics'), name='Choc Chip', flavor='chocolate', price=50, stock_quantity=100,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def get(self, name, **params):
+        headers = {'HTTP_IF_NONE_MATCH': params.pop('etag')} if 'etag' in params else {}
+        return self.client.get(reverse(name), params, secure=True, HTTP_HOST='localhost', **headers)
+
+    def sell(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_order(
+                [(self.chip, 2, self.chip.price)], staff=self.staff, order_type='staff', payment_method='cash', **fields,
+            )
+
+    def test_unchanged_data_answers_not_modified(self):
+        for name in ('staff_dashboard_realtime_data', 'sales_report_realtime_data'):
+            with self.subTest(view=name):
+                etag = self.get(name)['ETag']
+                self.assertEqual(self.get(name, etag=etag).status_code, 304)
+                self.sell()
+                response = self.get(name, etag=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_delta_against_the_cached_snapshot(self):
+        name = 'staff_dashboard_realtime_data'
+        first = self.get(name).json()
+        self.assertFalse(first['delta'])
+        self.sell(status='completed', is_paid=True, completed_at=timezone.now())
+
+        delta = self.get(name, since=first['version']).json()
+        self.assertTrue(delta['delta'])
+        self.assertNotEqual(delta['version'], first['version'])
+        self.assertEqual(delta['data']['orders_count_today'], 1)
+        self.assertNotIn('pending_orders_count', delta['data'])
+        # The previous snapshot plus the delta is what a full fetch returns
+        full = self.get(name).json()
+        self.assertFalse(full['delta'])
+        for data in (first['data'], full['data']):
+            data.pop('timestamp')
+        delta['data'].pop('timestamp', None)
+        self.assertEqual(dict(first['data'], **delta['data']), full['data'])
+
+        # An unknown or expired version gets everything
+        self.assertFalse(self.get(name, since='stale').json()['delta'])
+
+
+class FakeRedis:
+    """The slice of the redis-py client RedisJournal uses, kept in memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.sorted_sets = {}
+
+    def incrby(self, key, amount):
+        self.values[key] = int(self.values.get(key, 0)) + amount
+        return self.values[key]
+
+    def incr(self, key):
+        return self.incrby(key, 1)
+
+    def get(self, key):
+        value = self.values.get(key)
+        return None if value is None else str(value).encode()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyrank(self, key, start, end):
+        members = sorted(self.sorted_sets.get(key, {}).items(), key=lambda item: item[1])
+        end = len(members) + end if end < 0 else end
+        for member, _ in members[start:end + 1]:
+            del self.sorted_sets[key][member]
+
+    def zrangebyscore(self, key, low, high, start=0, num=None):
+        assert low.startswith('(') and high == '+inf'
+        members = sorted(
+            (score, member) for member, score in self.sorted_sets.get(key, {}).items() if score > int(low[1:])
+        )
+        return [member.encode() for _, member in members][start:start + num if num is not None else None]
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class JournalBackendTests(TestCase):
+    """Every journal backend keeps the same counters and event sequence"""
+
+    def backends(self):
+        return {
+            'database': journal.DatabaseJournal(),
+            'local': journal.LocalJournal(),
+            'redis': journal.RedisJournal(client=FakeRedis()),
+        }
+
+    def test_counters_and_events(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                self.assertEqual(backend.get('new_orders'), 0)
+                self.assertEqual(backend.incr('new_orders'), 1)
+                self.assertEqual(backend.incr('new_orders', 4), 5)
+                self.assertEqual(backend.get('new_orders'), 5)
+
+                start = backend.latest()
+                appended = [backend.append(events.ORDER_CREATED, {'id': order_id}) for order_id in (1, 2, 3)]
+                ids = [start] + [event['id'] for event in appended]
+                self.assertTrue(all(before < after for before, after in zip(ids, ids[1:])), ids)
+                self.assertEqual(backend.latest(), appended[-1]['id'])
+                self.assertEqual(backend.since(start), appended)
+                self.assertEqual(backend.since(appended[0]['id']), appended[1:])
+                self.assertEqual(backend.since(start, limit=1), appended[:1])
+                self.assertEqual(backend.since(backend.latest()), [])
+
+    def test_old_events_are_trimmed(self):
+        for name, backend in {
+            'local': journal.LocalJournal(max_events=2), 'redis': journal.RedisJournal(client=FakeRedis(), max_events=2),
+        }.items():
+            with self.subTest(backend=name):
+                for order_id in (1, 2, 3):
+                    backend.append(events.ORDER_PAID, {'id': order_id})
+                self.assertEqual([event['data']['id'] for event in backend.since(0)], [2, 3])
+                self.assertEqual(backend.latest(), 3)
+
+
+@override_settings(ORDER_EVENTS_KEEPALIVE=1, ORDER_EVENTS_MAX_AGE=1, ORDER_EVENTS_POLL_INTERVAL=0.05)
+class OrderEventStreamTests(TestCase):
+    """The SSE broker fans events out to every stream and resumes from Last-Event-ID"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('events-staff', password='pw')
+        Staff.objects.create(user=cls.staff, role='staff', is_active=True)
+
+    def setUp(self):
+        # Streams read the journal off the test's thread, so keep it in memory
+        self.journal = journal.LocalJournal()
+        patched = mock.patch.object(journal, '_journal', self.journal)
+        patched.start()
+        self.addCleanup(patched.stop)
+
+    def test_events_fan_out_to_every_stream(self):
+        broker = events.OrderEventBroker()
+
+        async def listen():
+            streams = [broker.stream(), broker.stream()]
+            first = [asyncio.ensure_future(anext(stream)) for stream in streams]
+            while broker.subscriber_count < 2:
+                await asyncio.sleep(0)
+            broker.publish({'id': 1, 'type': events.ORDER_PAID, 'data': {'id': 7}})
+            received = await asyncio.gather(*first)
+            for stream in streams:
+                await stream.aclose()
+            return received
+
+        received = async_to_sync(listen)()
+        self.assertEqual([event['data'] for event in received], [{'id': 7}, {'id': 7}])
+        self.assertEqual(broker.subscriber_count, 0)
+
+    # AsyncClient always sends Host: testserver
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_stream_resumes_after_last_event_id(self):
+        for order_id in (1, 2, 3):
+            self.journal.append(events.ORDER_CREATED, {'id': order_id})
+        client = AsyncClient()
+        client.force_login(self.staff)
+
+        async def read():
+            response = await client.get(
+                reverse('order_events'), secure=True, headers={'last-event-id': '1'},
+            )
+            return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        response, body = async_to_sync(read)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(body.startswith('retry: 3000\n\n'))
+        self.assertEqual(re.findall(r'^id: (\d+)$', body, re.M), ['2', '3'])
+        self.assertIn('event: order_created\ndata: {"id": 3}', body)
+
+    def test_wsgi_requests_are_told_to_retry(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('order_events'), secure=True, HTTP_HOST='localhost')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response.content, b'retry: 30000\n\n')
+
+
+class LoadDataCommandTests(TestCase):
+    """generate_load_data fills an empty database the same way for the same seed"""
+
+    def generate(self):
+        call_command(
+            'generate_load_data', customers=3, staff=2, orders=40, days=3, seed=7,
+            end=(business_date() - timedelta(days=10)).isoformat(), chunk_size=15, stdout=io.StringIO(),
+        )
+        return list(Order.objects.order_by('pk').values_list('order_id', 'hex_id', 'created_at', 'status', 'total_amount'))
+
+    def test_small_run(self):
+        with transaction.atomic():
+            first = self.generate()
+            transaction.set_rollback(True)
+        self.assertEqual(self.generate(), first)
+
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertEqual(Customer.objects.count(), 3)
+        self.assertEqual(Staff.objects.count(), 2)
+        self.assertEqual(CashFloat.objects.filter(float_type='opening').count(), 3)
+        self.assertEqual(CashFloat.objects.filter(float_type='closing').count(), 2)
+        self.assertEqual(len({hex_id for _, hex_id, *_ in first}), 40)
+        self.assertTrue(40 <= OrderItem.objects.count() <= 160)
+        self.assertEqual(ActivityLog.objects.filter(action='order_created').count(), 40)
+        self.assertEqual(VoidLog.objects.count(), Order.objects.filter(status='voided').count())
+
+
+VIEW_BUDGETS = Path(__file__).with_name('view_budgets.json')
+
+
+class QueryProfilingMiddlewareTests(TestCase):
+    """Profiling is opt-in and records async requests too"""
+
+    def setUp(self):
+        middleware.profiles.clear()
+        self.addCleanup(middleware.profiles.clear)
+
+    def test_off_unless_enabled(self):
+        with self.settings(QUERY_PROFILING=False), self.assertRaises(MiddlewareNotUsed):
+            middleware.QueryProfilingMiddleware(lambda request: HttpResponse())
+
+    @override_settings(QUERY_PROFILING=True)
+    def test_records_async_requests(self):
+        async def view(request):
+            await sync_to_async(Cookie.objects.count)()
+            return HttpResponse('ok')
+
+        profiler = middleware.QueryProfilingMiddleware(view)
+        response = async_to_sync(profiler)(RequestFactory().get('/app/menu/'))
+        self.assertEqual(response.content, b'ok')
+        [record] = middleware.profiles.records()
+        self.assertEqual((record['path'], record['queries']), ('/app/menu/', 1))
+
+
+def seed_store(orders=3000, customers=200, days=90, seed=1):
+    """Bulk-insert a realistic store: every flavor as a cookie, a few staff,
+    ``customers`` customers and ``orders`` orders spread over ``days`` days.
+
+    Returns the objects the budget test needs for URL arguments and logins.
+    """
+    rng = random.Random(seed)
+    today = business_date()
+
+    categories = Category.objects.bulk_create(
+        Category(name=name) for name in ('Classic', 'Premium', 'Seasonal', 'Specialty')
+    )
+    cookies = Cookie.objects.bulk_create(
+        Cookie(
+            category=categories[index % len(categories)],
+            name=f'{label} Cookie',
+            flavor=flavor,
+            price=Decimal(rng.randrange(45, 121)),
+            stock_quantity=500,
+        )
+        for index, (flavor, label) in enumerate(Cookie.FLAVOR_CHOICES)
+    )
+
+    admin = User.objects.create_user('budget-admin', 'admin@example.com', 'pw', is_superuser=True, is_staff=True)
+    Staff.objects.create(user=admin, role='admin', is_active=True)
+    CashFloat.objects.bulk_create(
+        CashFloat(date=today - timedelta(days=age), float_type='opening', amount=Decimal('2000.00'), staff=admin)
+        for age in range(days)
+    )
+    staff_users, staff_members, customer_rows, order_rows = seed_activity(admin, orders, customers, days, rng)
+
+    customer = customer_rows[0]
+    customer_order = Order.objects.create(
+        customer=customer, customer_name=customer.name, order_type='kiosk', payment_method='gcash',
+        total_amount=cookies[0].price,
+    )
+    OrderItem.objects.create(order=customer_order, cookie=cookies[0], quantity=1, price=cookies[0].price)
+    adjustment = CashFloat.objects.create(
+        date=today, float_type='adjustment', adjustment_type='excess', amount=Decimal('50.00'), staff=admin,
+    )
+    return {
+        'admin': admin,
+        'staff': staff_users[0],
+        'customer': customer.user_profile.user,
+        'objects': {
+            'order': next(order.pk for order in order_rows if order.status == 'completed' and order.staff_id),
+            'kiosk_order': next(
+                order.pk for order in order_rows if order.status == 'pending' and order.order_type == 'kiosk'
+            ),
+            'customer_order': customer_order.pk,
+            'cookie': cookies[0].pk,
+            'category': categories[0].pk,
+            'customer': customer.pk,
+            'staff': staff_members[1].pk,
+            'adjustment': adjustment.pk,
+        },
+    }
+
+
+def seed_activity(admin, orders, customers, days, rng, batch=0):
+    """Add four staff, ``customers`` customers and ``orders`` orders with their lines,
+    voids and activity log to a seeded store, then rebuild the rollups.
+
+    Call again with the next ``batch`` to grow the store; returns
+    (staff users, staff members, customers, orders) of this batch.
+    """
+    now = timezone.now()
+    today = business_date()
+    cookies = list(Cookie.objects.order_by('pk'))
+
+    staff_users = [
+        User.objects.create_user(f'budget-staff{n}', f'staff{n}@example.com', 'pw')
+        for n in range(batch * 4, batch * 4 + 4)
+    ]
+    staff_members = [Staff.objects.create(user=user, role='staff', is_active=True) for user in staff_users]
+
+    first = batch * customers
+    users = User.objects.bulk_create(
+        User(username=f'customer{n}', email=f'customer{n}@example.com', password='!')
+        for n in range(first, first + customers)
+    )
+    profiles = UserProfile.objects.bulk_create(
+        UserProfile(user=user, user_type='customer', customer_id=f'CUST{n:06d}') for n, user in enumerate(users, first)
+    )
+    customer_rows = Customer.objects.bulk_create(
+        Customer(user_profile=profile, name=f'Customer {n}', email=profile.user.email, is_email_verified=True)
+        for n, profile in enumerate(profiles, first)
+    )
+
+    # Reserve hex ids and per-day order numbers so orders created later don't collide
+    hex_ids = iter(next_hex_ids(orders))
+    order_rows = []
+    order_days = []
+    numbered = {}
+    for n in range(orders):
+        age = min(int(rng.expovariate(1 / (days / 4))), days - 1)
+        day = today - timedelta(days=age)
+        order_type = rng.choice(['kiosk', 'staff'])
+        prefix = 'KIO' if order_type == 'kiosk' else 'STA'
+        status = rng.choices(
+            ['completed', 'voided', 'cancelled', 'pending', 'preparing', 'ready'],
+            [88, 4, 3, 3, 1, 1] if age else [60, 3, 2, 20, 8, 7],
+        )[0]
+        customer = rng.choice(customer_rows) if order_type == 'kiosk' and rng.random() < 0.6 else None
+        moment = day_start(day) + timedelta(hours=12) if age else max(day_start(day), now - timedelta(minutes=30))
+        paid = status in ('completed', 'voided')
+        order = Order(
+            hex_id=next(hex_ids),
+            customer=customer,
+            customer_name=customer.name if customer else 'Walk-in',
+            staff=rng.choice(staff_users) if order_type == 'staff' or paid else None,
+            order_type=order_type,
+            payment_method=rng.choices(['cash', 'gcash'], [60, 40])[0],
+            status=status,
+            total_amount=Decimal('0.00'),
+            is_paid=paid,
+            paid_at=moment if paid else None,
+            completed_at=moment if status == 'completed' else None,
+        )
+        numbered.setdefault((prefix, day), []).append(order)
+        order_rows.append(order)
+        order_days.append(moment)
+    for (prefix, day), day_orders in numbered.items():
+        name = order_sequence_name(prefix, day)
+        last = allocate([name], step=len(day_orders))[name]
+        for number, order in enumerate(day_orders, last - len(day_orders) + 1):
+            order.order_id = f"{prefix}-{day.strftime('%Y%m%d')}-{number:03d}"
+    order_rows = Order.objects.bulk_create(order_rows, batch_size=500)
+
+    items = []
+    for order in order_rows:
+        total = Decimal('0.00')
+        for cookie in rng.sample(cookies, rng.randint(1, 4)):
+            quantity = rng.randint(1, 6)
+            items.append(OrderItem(order=order, cookie=cookie, quantity=quantity, price=cookie.price))
+            total += cookie.price * quantity
+        order.total_amount = total
+        if order.payment_method == 'cash' and order.is_paid:
+            order.cash_received = (total / 100).quantize(Decimal('1')) * 100 + 100
+            order.change = order.cash_received - total
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    Order.objects.bulk_update(order_rows, ['total_amount', 'cash_received', 'change'], batch_size=500)
+
+    # created_at is auto_now_add, so backdate it after the insert, one day at a time
+    by_moment = {}
+    for order, moment in zip(order_rows, order_days):
+        by_moment.setdefault(moment, []).append(order.pk)
+    for moment, ids in by_moment.items():
+        Order.objects.filter(pk__in=ids).update(created_at=moment)
+
+    VoidLog.objects.bulk_create(
+        VoidLog(
+            order=order, staff_member=rng.choice(staff_members), admin_user=admin, reason='Seeded void',
+            original_total=order.total_amount, original_payment_method=order.payment_method,
+            void_id=f'VOID{order.pk:08d}',
+        )
+        for order in order_rows if order.status == 'voided'
+    )
+    ActivityLog.objects.bulk_create(
+        ActivityLog(
+            user=rng.choice(staff_users), action=rng.choice(['login', 'order_created', 'order_completed']),
+            description='Seeded activity', affected_model='Order', affected_id=rng.choice(order_rows).pk,
+        )
+        for _ in range(orders // 2)
+    )
+    rollups.rebuild()
+    return staff_users, staff_members, customer_rows, order_rows
+
+
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    QUERY_PROFILING=False,
+)
+class ViewQueryBudgetTests(TestCase):
+    """Every route, requested as the role that uses it against a seeded store,
+    must stay within the query count recorded in view_budgets.json, and run
+    the same number of queries when the store doubles in size.
+
+    A new route fails until it gets a budget entry. Entries look like
+    {"role": "staff", "kwargs": {"order_id": "order"}, "status": 200,
+    "max_queries": 12, "max_ms": 400}; kwargs name objects from seed_store(),
+    literal values go in "values", and {"skip": "why"} opts a route out.
+    max_ms is only checked with VIEW_BUDGET_TIMINGS=1 in the environment, on
+    machines quiet enough for wall-clock limits to mean something.
+    Each request runs in a rolled-back transaction with a cold cache, so
+    routes don't affect each other and cached views are measured at their worst.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = seed_store()
+        cls.budgets = json.loads(VIEW_BUDGETS.read_text())['views']
+
+    def setUp(self):
+        self.clients = {}
+
+    def client_for(self, role):
+        # One client per role: a client's first request builds the middleware chain
+        if role not in self.clients:
+            self.clients[role] = Client()
+            if role != 'anonymous':
+                self.clients[role].force_login(self.store[role])
+        return self.clients[role]
+
+    def measure(self, name, budget):
+        kwargs = {key: self.store['objects'][value] for key, value in budget.get('kwargs', {}).items()}
+        kwargs.update(budget.get('values', {}))
+        url = reverse(name, kwargs=kwargs)
+        client = self.client_for(budget['role'])
+        cache.clear()
+        # Don't bill a view for a collection pass that earlier requests' garbage set off
+        gc.collect()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url, secure=True, HTTP_HOST='localhost')
+                elapsed = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        return response, len(queries), elapsed, queries
+
+    def test_every_route_has_a_budget(self):
+        names = {
+            pattern.name for pattern in get_resolver('cookie_app.urls').url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        self.assertEqual(sorted(names - set(self.budgets)), [], 'Routes without an entry in view_budgets.json')
+        self.assertEqual(sorted(set(self.budgets) - names), [], 'Budgets for routes that no longer exist')
+
+    def measured_routes(self):
+        return [(name, budget) for name, budget in sorted(self.budgets.items()) if 'skip' not in budget]
+
+    def test_views_stay_within_budget(self):
+        check_timings = os.environ.get('VIEW_BUDGET_TIMINGS') == '1'
+        for name, budget in self.measured_routes():
+            with self.subTest(view=name):
+                response, count, elapsed, queries = self.measure(name, budget)
+                self.assertEqual(response.status_code, budget.get('status', 200))
+                self.assertLessEqual(
+                    count, budget['max_queries'],
+                    f'{name} ran {count} queries (budget {budget["max_queries"]}):\n'
+                    + '\n'.join(query['sql'][:200] for query in queries.captured_queries),
+                )
+                if check_timings:
+                    self.assertLessEqual(elapsed, budget['max_ms'], f'{name} took {elapsed:.0f}ms')
+
+    def test_query_counts_do_not_grow_with_the_store(self):
+        before = {name: self.measure(name, budget)[1] for name, budget in self.measured_routes()}
+        seed_activity(self.store['admin'], 3000, 200, 90, random.Random(2), batch=1)
+        for name, budget in self.measured_routes():
+            with self.subTest(view=name):
+                response, count, elapsed, queries = self.measure(name, budget)
+                self.assertEqual(
+                    count, before[name],
+                    f'{name} ran {count} queries after the store doubled (was {before[name]}):\n'
+                    + '\n'.join(query['sql'][:200] for query in queries.captured_queries),
+                )
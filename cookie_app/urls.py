@@ -80,6 +80,8 @@ urlpatterns = [
 
     # Admin Store Settings
     path('admin/settings/', views.admin_store_settings, name='admin_store_settings'),
+    path('admin/id-pools/', views.admin_id_pool_stats, name='admin_id_pool_stats'),
+    path('admin/request-profiles/', views.admin_request_profiles, name='admin_request_profiles'),
 
     # Admin Order Detail
     path('admin/orders/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
@@ -158,6 +160,8 @@ urlpatterns = [
     path('staff-dashboard/new-orders-check/', views.staff_new_orders_check, name='staff_new_orders_check'),
     path('sales-report/realtime-data/', views.sales_report_realtime_data, name='sales_report_realtime_data'),
     path('sales-report/new-orders-check/', views.sales_report_new_orders_check, name='sales_report_new_orders_check'),
+    path('orders/events/', views.order_events, name='order_events'),
+    path('orders/changes/', views.order_changes, name='order_changes'),
 
     # Payment processing URLs
     path('pay/redirect/<str:method>/<int:order_id>/', views.payment_redirect, name='payment_redirect'),
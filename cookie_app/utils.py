@@ -1,5 +1,9 @@
 # utils.py
+from django.utils import timezone
+
+from .activity import record
 from .models import ActivityLog
+from .dates import day_window
 
 def get_client_ip(request):
     """Get client IP address from request"""
@@ -11,16 +15,20 @@ def get_client_ip(request):
     return ip
 
 def log_activity(user, action, description, ip_address=None, affected_model=None, affected_id=None):
-    """Log user activity"""
+    """Log user activity once the current transaction commits (see activity.ActivityLogBuffer)"""
+    if not getattr(user, 'is_authenticated', False):
+        user = None
     try:
-        ActivityLog.objects.create(
+        record(ActivityLog(
             user=user,
+            staff=getattr(user, 'staff', None),
             action=action,
             description=description,
+            timestamp=timezone.now(),
             ip_address=ip_address,
             affected_model=affected_model,
             affected_id=affected_id
-        )
+        ))
     except Exception as e:
         # Log to console if database logging fails
         print(f"Activity log error: {e}")
@@ -75,12 +83,13 @@ def generate_receipt_data(order):
 
 def generate_daily_report(staff, date):
     """Generate daily sales report for staff"""
-    from .models import Order, OrderItem
+    from .models import Order
+    from .rollups import top_cookies
     from django.db.models import Sum, Count
     
     orders = Order.objects.filter(
         staff=staff,
-        created_at__date=date,
+        **day_window('created_at', date),
         status='completed'
     )
     
@@ -93,14 +102,7 @@ def generate_daily_report(staff, date):
             count=Count('id'),
             total=Sum('total_amount')
         ),
-        'top_items': OrderItem.objects.filter(
-            order__in=orders
-        ).values(
-            'cookie__name'
-        ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('price')
-        ).order_by('-quantity_sold')[:5]
+        'top_items': top_cookies(date, date, staff_id=staff.user_id, limit=5)
     }
     
     return report_data
@@ -1,21 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import login as auth_login, authenticate, logout, update_session_auth_hash
 from django.contrib.auth.models import Group, User
-from django.db.models import Sum, Count, Avg, Q, F
+from django.db.models import Sum, Count, Avg, Q, F, Prefetch
 from django.db.models.functions import Extract
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from django.conf import settings
 from django.urls import reverse
 from urllib.parse import quote
-from django.db import models
+from django.db import models, transaction
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.csrf import ensure_csrf_cookie
 from .filters import OrderFilter
 from .models import CashFloat 
 
 import json 
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from datetime import timedelta, datetime, time
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
@@ -25,38 +28,32 @@ from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 
 from .models import Order, OrderItem, UserProfile, Category, Cookie, Customer, Staff, ActivityLog, VoidLog, StoreSettings, Branch
 from .forms import WalkInOrderForm, CategoryForm, DailySalesForm, CustomerRegistrationForm, CustomerOrderForm, CustomerForm, CookieForm, SaleForm, StaffRegistrationForm, StaffEditForm, StoreSettingsForm
 from .decorators import staff_required, admin_required
+from .inventory import InsufficientStock, reserve_stock, release_stock
+from .orders import add_loyalty_points, create_order
+from .dates import business_date, date_window, day_window
+from .reports import build_sales_report, dashboard_metrics
+from . import events, realtime, rollups
+from .idpools import pool_stats
+from .journal import get_journal
+from .middleware import profiles as request_profiles
+from .catalog import catalog_snapshot, stock_levels
+from .images import image_json
+from .media_index import featured_images
+from .pagination import InvalidCursor, keyset_page, page_size
+from .receipts import ReceiptRejected, discard, ingest_on_commit, stage_upload
+from .retention import ActivityLogSearch
 from .utils import log_activity, get_client_ip, calculate_order_total, update_cookie_stock, validate_stock_availability
 import logging
 import os
-import glob
 import csv
 logger = logging.getLogger(__name__)
 
 # ==================== PERMISSION FUNCTIONS ====================
-def log_activity(user, action, description, ip_address=None, affected_model=None, affected_id=None):
-    """Log user activity"""
-    try:
-        staff_instance = None
-        if hasattr(user, 'staff'):
-            staff_instance = user.staff
-            
-        ActivityLog.objects.create(
-            user=user,
-            staff=staff_instance,
-            action=action,
-            description=description,
-            ip_address=ip_address,
-            affected_model=affected_model,
-            affected_id=affected_id
-        )
-    except Exception as e:
-        logger.error(f"Failed to log activity: {e}")
-
 def is_approved_staff(user):
     """Simple check if user can access staff areas"""
     if not user.is_authenticated:
@@ -82,23 +79,6 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-def log_activity(user, action, description, ip_address=None):
-    """Log user activity"""
-    try:
-        staff_instance = None
-        if hasattr(user, 'staff'):
-            staff_instance = user.staff
-            
-        ActivityLog.objects.create(
-            user=user,
-            staff=staff_instance,
-            action=action,
-            description=description,
-            ip_address=ip_address
-        )
-    except Exception as e:
-        logger.error(f"Failed to log activity: {e}")
-
 def is_admin_or_staff(user):
     """Check if user is admin (superuser or admin role)"""
     if not user.is_authenticated:
@@ -149,21 +129,7 @@ def customer_required(view_func):
 # ==================== KIOSK ORDER SYSTEM ====================
 def kiosk_order(request):
     """Kiosk order placement - no login required"""
-    available_cookies = Cookie.objects.filter(stock_quantity__gt=0, is_available=True).select_related('category')
-    
-    # Group cookies by category
-    categories = Category.objects.filter(cookies__in=available_cookies).distinct()
-    cookies_by_category = {}
-    
-    for cookie in available_cookies:
-        if cookie.category:
-            category_name = cookie.category.name
-        else:
-            category_name = 'Other'
-        
-        if category_name not in cookies_by_category:
-            cookies_by_category[category_name] = []
-        cookies_by_category[category_name].append(cookie)
+    menu = catalog_snapshot()
     
     if request.method == 'POST':
         try:
@@ -175,63 +141,25 @@ def kiosk_order(request):
             if not items:
                 return JsonResponse({'success': False, 'error': 'No items in order'})
             
-            # Calculate total and validate stock
-            total_amount = Decimal('0.00')
-            order_items = []
+            lines = [(item.get('cookie_id'), item.get('quantity', 0)) for item in items]
             
-            for item in items:
-                cookie_id = item.get('cookie_id')
-                quantity = int(item.get('quantity', 0))
+            # Reserve stock and create the order in one transaction
+            with transaction.atomic():
+                reservation = reserve_stock(lines)
+                if not reservation.lines:
+                    return JsonResponse({'success': False, 'error': 'No items in order'})
                 
-                if quantity > 0:
-                    cookie = get_object_or_404(Cookie, id=cookie_id)
-                    
-                    if cookie.stock_quantity < quantity:
-                        return JsonResponse({
-                            'success': False, 
-                            'error': f'Not enough stock for {cookie.name}. Only {cookie.stock_quantity} available.'
-                        })
-                    
-                    item_total = cookie.price * quantity
-                    total_amount += item_total
-                    
-                    order_items.append({
-                        'cookie': cookie,
-                        'quantity': quantity,
-                        'price': cookie.price
-                    })
-            
-            # Create kiosk order
-            order = Order.objects.create(
-                customer_name=customer_name or 'Kiosk Customer',
-                order_type='kiosk',
-                total_amount=total_amount,
-                payment_method=payment_method,
-                status='pending'
-            )
-            
-            # Create order items
-            for item_data in order_items:
-                OrderItem.objects.create(
-                    order=order,
-                    cookie=item_data['cookie'],
-                    quantity=item_data['quantity'],
-                    price=item_data['price']
+                # Create kiosk order with all of its items
+                order = create_order(
+                    reservation.items(),
+                    ip_address=get_client_ip(request),
+                    describe=lambda o: f'Kiosk order created: {o.order_id} - ₱{o.total_amount:.2f}',
+                    customer_name=customer_name or 'Kiosk Customer',
+                    order_type='kiosk',
+                    payment_method=payment_method,
+                    status='pending'
                 )
-                
-                # Update stock
-                cookie = item_data['cookie']
-                cookie.stock_quantity -= item_data['quantity']
-                cookie.save()
-            
-            log_activity(
-                user=None,
-                action='order_created',
-                description=f'Kiosk order created: {order.order_id} - ₱{total_amount:.2f}',
-                ip_address=get_client_ip(request),
-                affected_model='Order',
-                affected_id=order.id
-            )
+            total_amount = order.total_amount
             
             return JsonResponse({
                 'success': True,
@@ -241,13 +169,16 @@ def kiosk_order(request):
                 'redirect_url': f'/app/kiosk/payment/{order.id}/'
             })
             
+        except InsufficientStock as e:
+            return JsonResponse({'success': False, 'error': e.message, 'shortages': e.shortages})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return render(request, 'kiosk/order.html', {
-        'available_cookies': available_cookies,
-        'cookies_by_category': cookies_by_category,
-        'categories': categories
+        'available_cookies': menu.cookies,
+        'cookies_by_category': menu.by_category,
+        'categories': menu.categories,
+        'catalog_key': menu.key,
     })
 
 
@@ -310,23 +241,9 @@ def kiosk_receipt(request, order_id):
 @staff_required
 def staff_record_sale(request):
     """Staff record sale form - handles both walk-in and kiosk orders"""
-    available_cookies = Cookie.objects.filter(stock_quantity__gt=0, is_available=True).select_related('category')
+    menu = catalog_snapshot()
     customers = Customer.objects.all()
     
-    # Group cookies by category
-    categories = Category.objects.filter(cookies__in=available_cookies).distinct()
-    cookies_by_category = {}
-    
-    for cookie in available_cookies:
-        if cookie.category:
-            category_name = cookie.category.name
-        else:
-            category_name = 'Other'
-        
-        if category_name not in cookies_by_category:
-            cookies_by_category[category_name] = []
-        cookies_by_category[category_name].append(cookie)
-    
     if request.method == 'POST':
         try:
             order_type = request.POST.get('order_type', 'walkin')
@@ -352,7 +269,7 @@ def staff_record_sale(request):
             # Handle walk-in order creation
             elif order_type == 'walkin':
                 print("Processing walk-in order...")
-                return create_walkin_order(request, cookies_by_category)
+                return create_walkin_order(request, menu.by_category)
             
             # If we get here, something went wrong
             print(f"ERROR: Invalid order type: {order_type}")
@@ -367,10 +284,12 @@ def staff_record_sale(request):
             return redirect('staff_record_sale')
     
     return render(request, 'record_sale.html', {
-        'available_cookies': available_cookies,
+        'available_cookies': menu.cookies,
         'customers': customers,
-        'cookies_by_category': cookies_by_category,
-        'categories': categories
+        'cookies_by_category': menu.by_category,
+        'categories': menu.categories,
+        'catalog_key': menu.key,
+        'stock_levels': stock_levels(menu.cookies),
     })
 
 def create_walkin_order(request, cookies_by_category):
@@ -396,8 +315,7 @@ def create_walkin_order(request, cookies_by_category):
             cash_received = None
     
     # Process items - look for cookie quantities
-    total_amount = Decimal('0.00')
-    order_items = []
+    lines = []
     
     # Debug: Check all POST data for cookies
     print("=== COOKIE DATA SEARCH ===")
@@ -407,43 +325,21 @@ def create_walkin_order(request, cookies_by_category):
             cookie_id = key.replace('cookie_', '')
             quantity = int(value)
             
-            if quantity > 0:
+            if quantity > 0 and cookie_id.isdigit():
                 print(f"Found cookie with quantity: ID={cookie_id}, Qty={quantity}")
-                try:
-                    cookie = Cookie.objects.get(id=cookie_id)
-                    
-                    if cookie.stock_quantity < quantity:
-                        messages.error(request, f'Not enough stock for {cookie.name}. Only {cookie.stock_quantity} available.')
-                        return redirect('staff_record_sale')
-                    
-                    item_total = cookie.price * quantity
-                    total_amount += item_total
-                    
-                    order_items.append({
-                        'cookie': cookie,
-                        'quantity': quantity,
-                        'price': cookie.price
-                    })
-                    print(f"Added to order: {cookie.name} x {quantity} = ₱{item_total}")
-                    
-                except Cookie.DoesNotExist:
-                    print(f"Cookie with ID {cookie_id} not found")
-                    continue
+                lines.append((cookie_id, quantity))
     
     # Validate cookies for walk-in orders
-    if not order_items:
+    if not lines:
         messages.error(request, 'Please select at least one item for walk-in order')
         return redirect('staff_record_sale')
     
-    # Payment validation rules
+    # Payment validation rules that do not depend on the order total
     if payment_method == 'cash':
-        # Require amount_paid and ensure it's >= total
+        # Require amount_paid; the amount itself is checked against the total below
         if amount_paid is None or str(amount_paid).strip() == '':
             messages.error(request, 'Please enter Cash Amount Paid.')
             return redirect('staff_record_sale')
-        if cash_received is None or cash_received < total_amount:
-            messages.error(request, f'Insufficient cash received. Total: ₱{total_amount:.2f}, Received: ₱{(cash_received or Decimal("0.00")):.2f}')
-            return redirect('staff_record_sale')
     elif payment_method == 'gcash':
         # Require GCash number and reference at creation time
         gcash_number = (request.POST.get('gcash_number') or '').strip()
@@ -452,10 +348,6 @@ def create_walkin_order(request, cookies_by_category):
             messages.error(request, 'Please enter both GCash Number and Reference Number.')
             return redirect('staff_record_sale')
     
-    print(f"Total items: {len(order_items)}")
-    print(f"Total amount: {total_amount}")
-    print(f"Cash received: {cash_received}")
-    
     # Get customer
     customer = None
     print(f"=== CUSTOMER MATCHING DEBUG ===")
@@ -503,74 +395,64 @@ def create_walkin_order(request, cookies_by_category):
     print(f"Final customer: {customer}")
     print("=== END CUSTOMER MATCHING ===")
     
-    # Create staff order depending on payment method
-    if payment_method == 'cash':
-        order = Order.objects.create(
-            customer=customer,
-            customer_name=customer_name or (customer.name if customer else 'Walk-in Customer'),
-            customer_phone=customer_phone or (customer.phone if customer else ''),
-            staff=request.user,
-            order_type='staff',
-            total_amount=total_amount,
-            payment_method='cash',
-            status='completed',
-            is_paid=True,
-            paid_at=timezone.now(),
-            notes=notes,
-            cash_received=cash_received,
-        )
-    else:  # gcash
-        order = Order.objects.create(
-            customer=customer,
-            customer_name=customer_name or (customer.name if customer else 'Walk-in Customer'),
-            customer_phone=customer_phone or (customer.phone if customer else ''),
-            staff=request.user,
-            order_type='staff',
-            total_amount=total_amount,
-            payment_method='gcash',
-            status='pending',
-            is_paid=False,
-            notes=notes,
-            gcash_reference=gcash_reference,
-        )
-    
-    print(f"Order created: {order.order_id} with status: {order.status}")
-    print(f"Cash received stored: {order.cash_received}")
-    print(f"Change calculated: {order.change}")
-    
-    # Create order items
-    for item_data in order_items:
-        OrderItem.objects.create(
-            order=order,
-            cookie=item_data['cookie'],
-            quantity=item_data['quantity'],
-            price=item_data['price']
-        )
-        
-        # Update stock
-        cookie = item_data['cookie']
-        cookie.stock_quantity -= item_data['quantity']
-        cookie.save()
-        print(f"Updated stock for {cookie.name}: -{item_data['quantity']}")
-    
-    # Add loyalty points for registered customers
-    if customer:
-        points_earned = int(total_amount)
-        customer.loyalty_points += points_earned
-        customer.save()
-        print(f"Added {points_earned} loyalty points to customer {customer.name}")
-    
-    log_activity(
-        user=request.user,
-        action='order_created',
-        description=(
-            f'Staff order created: {order.order_id} - ₱{total_amount:.2f} - '
-            f'Payment: {payment_method.upper()} - Cash: ₱{(cash_received or Decimal("0.00")):.2f}'
-        ),
-        ip_address=get_client_ip(request),
-        affected_model='Order',
-        affected_id=order.id
-    )
+    try:
+        with transaction.atomic():
+            reservation = reserve_stock(lines)
+            total_amount = reservation.total_amount
+            
+            if payment_method == 'cash' and (cash_received is None or cash_received < total_amount):
+                transaction.set_rollback(True)
+                messages.error(request, f'Insufficient cash received. Total: ₱{total_amount:.2f}, Received: ₱{(cash_received or Decimal("0.00")):.2f}')
+                return redirect('staff_record_sale')
+            
+            print(f"Total items: {len(reservation.lines)}")
+            print(f"Total amount: {total_amount}")
+            print(f"Cash received: {cash_received}")
+            
+            # Create staff order depending on payment method
+            order_fields = dict(
+                customer=customer,
+                customer_name=customer_name or (customer.name if customer else 'Walk-in Customer'),
+                customer_phone=customer_phone or (customer.phone if customer else ''),
+                staff=request.user,
+                order_type='staff',
+                notes=notes,
+            )
+            if payment_method == 'cash':
+                order_fields.update(
+                    payment_method='cash',
+                    status='completed',
+                    is_paid=True,
+                    paid_at=timezone.now(),
+                    cash_received=cash_received,
+                )
+            else:  # gcash
+                order_fields.update(
+                    payment_method='gcash',
+                    status='pending',
+                    is_paid=False,
+                    gcash_reference=gcash_reference,
+                )
+            
+            # Loyalty points for registered customers are added after commit
+            order = create_order(
+                reservation.items(),
+                user=request.user,
+                ip_address=get_client_ip(request),
+                describe=lambda o: (
+                    f'Staff order created: {o.order_id} - ₱{o.total_amount:.2f} - '
+                    f'Payment: {payment_method.upper()} - Cash: ₱{(cash_received or Decimal("0.00")):.2f}'
+                ),
+                award_loyalty=True,
+                **order_fields
+            )
+            
+            print(f"Order created: {order.order_id} with status: {order.status}")
+            print(f"Cash received stored: {order.cash_received}")
+            print(f"Change calculated: {order.change}")
+    except InsufficientStock as e:
+        messages.error(request, e.message)
+        return redirect('staff_record_sale')
     
     # Redirect appropriately
     if payment_method == 'cash':
@@ -603,36 +485,26 @@ def complete_kiosk_order(request, kiosk_order_id):
             except (ValueError, TypeError):
                 cash_received = None
         
-        # Update kiosk order status to completed
-        kiosk_order.status = 'completed'
-        kiosk_order.is_paid = True
-        kiosk_order.paid_at = timezone.now()
-        kiosk_order.completed_at = timezone.now()
-        kiosk_order.staff = request.user  # Record which staff completed the order
-        kiosk_order.payment_method = payment_method
-        kiosk_order.cash_received = cash_received  # NEW: Store cash received
-        kiosk_order.save()
-        
-        print(f"Updated status to: {kiosk_order.status}")
-        print(f"Is paid: {kiosk_order.is_paid}")
-        print(f"Cash received stored: {kiosk_order.cash_received}")
-        print(f"Change calculated: {kiosk_order.change}")
-        
-        # Update inventory for kiosk order items
-        for item in kiosk_order.items.all():
-            cookie = item.cookie
-            if cookie.stock_quantity >= item.quantity:
-                cookie.stock_quantity -= item.quantity
-                cookie.save()
-                print(f"Updated stock for {cookie.name}: -{item.quantity}")
-            else:
-                messages.warning(request, f'Insufficient stock for {cookie.name}. Order completed but inventory not updated.')
+        with transaction.atomic():
+            # Update kiosk order status to completed
+            kiosk_order.status = 'completed'
+            kiosk_order.is_paid = True
+            kiosk_order.paid_at = timezone.now()
+            kiosk_order.completed_at = timezone.now()
+            kiosk_order.staff = request.user  # Record which staff completed the order
+            kiosk_order.payment_method = payment_method
+            kiosk_order.cash_received = cash_received  # NEW: Store cash received
+            kiosk_order.save()
+            
+            print(f"Updated status to: {kiosk_order.status}")
+            print(f"Is paid: {kiosk_order.is_paid}")
+            print(f"Cash received stored: {kiosk_order.cash_received}")
+            print(f"Change calculated: {kiosk_order.change}")
+            # Stock was reserved when the kiosk order was placed; completing it just consumes that
         
         # Add loyalty points if customer exists
-        if kiosk_order.customer:
-            points_earned = int(kiosk_order.total_amount)
-            kiosk_order.customer.loyalty_points += points_earned
-            kiosk_order.customer.save()
+        if kiosk_order.customer_id:
+            points_earned = add_loyalty_points(kiosk_order)
             print(f"Added {points_earned} loyalty points to customer")
         
         log_activity(
@@ -816,18 +688,36 @@ def order_management(request):
         if start_date_str:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                qs = qs.filter(created_at__date__gte=start_date)
+                qs = qs.filter(**date_window('created_at', start_date))
             except ValueError:
                 start_date_str = ''
         if end_date_str:
             try:
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                qs = qs.filter(created_at__date__lte=end_date)
+                qs = qs.filter(**date_window('created_at', end_date=end_date))
             except ValueError:
                 end_date_str = ''
 
-    # Apply reasonable limits
-    orders = qs[:500]  # Increased limit to show more orders
+    try:
+        orders = keyset_page(qs, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    filter_values = {
+        'search': search,
+        'status': status,
+        'payment': payment_method,
+        'start_date': start_date_str,
+        'end_date': end_date_str,
+        'staff_id': staff_id,
+        'branch_id': branch_id,
+        'is_admin': is_admin,
+    }
+    if _wants_order_page(request):
+        return _order_page_response(
+            request, orders, {'orders_today': orders, 'filter_values': filter_values},
+            html='orders/_order_rows.html', modals='orders/_order_modals.html',
+        )
 
     # Staff history: include their completed and cancelled orders
     staff_completed_orders = Order.objects.filter(
@@ -838,16 +728,7 @@ def order_management(request):
     context = {
         'orders_today': orders,
         'staff_completed_orders': staff_completed_orders,
-        'filter_values': {
-            'search': search,
-            'status': status,
-            'payment': payment_method,
-            'start_date': start_date_str,
-            'end_date': end_date_str,
-            'staff_id': staff_id,
-            'branch_id': branch_id,
-            'is_admin': is_admin,
-        },
+        'filter_values': filter_values,
         'all_staff': User.objects.filter(
             models.Q(is_staff=True) | models.Q(staff__is_active=True)
         ).distinct() if is_admin else None,
@@ -857,6 +738,20 @@ def order_management(request):
     return render(request, 'orders/order_management.html', context)
 
 
+def _wants_order_page(request):
+    """Load-more and API requests for an order list get JSON instead of the page"""
+    return request.GET.get('format') == 'json' or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _order_page_response(request, page, context, **templates):
+    """JSON for one keyset page of an order list: each named template rendered
+    with ``context`` plus the cursor for the next page (null on the last one)."""
+    data = {'success': True, 'count': len(page), 'has_next': page.has_next, 'next_cursor': page.next_cursor}
+    for key, template in templates.items():
+        data[key] = render_to_string(template, context, request=request)
+    return JsonResponse(data)
+
+
 @login_required
 @admin_required
 def admin_order_detail(request, order_id):
@@ -957,7 +852,11 @@ def update_order_status(request, order_id):
                     if not order.paid_at:
                         order.paid_at = timezone.now()
                 
-                order.save()
+                with transaction.atomic():
+                    order.save()
+                    # An admin cancelling or voiding an open order gives its reserved stock back
+                    if new_status in ('cancelled', 'voided') and old_status not in ('cancelled', 'voided'):
+                        release_stock(order.items.values_list('cookie_id', 'quantity'))
                 
                 log_activity(
                     user=request.user,
@@ -999,7 +898,7 @@ def update_order_status(request, order_id):
 def sales_report(request):
     """Sales report with comprehensive cash payment statistics"""
     # Date filtering
-    today = timezone.now().date()
+    today = business_date()
     start_date = request.GET.get('start_date', today.strftime('%Y-%m-%d'))
     end_date = request.GET.get('end_date', today.strftime('%Y-%m-%d'))
     
@@ -1010,139 +909,9 @@ def sales_report(request):
         start_date = today
         end_date = today
     
-    # Adjust end_date to include the entire day
-    end_date_time = datetime.combine(end_date, time.max)
-    
-    # Get completed orders within date range
-    completed_orders = Order.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).select_related('customer').prefetch_related('items', 'items__cookie')
-    
-    # Total sales statistics
-    total_sales = completed_orders.aggregate(
-        total_amount=Sum('total_amount'),
-        total_orders=Count('id')
-    )
-    
-    # Order type breakdown
-    walkin_orders = completed_orders.filter(order_type='staff')
-    kiosk_orders = completed_orders.filter(order_type='kiosk')
-    
-    order_type_stats = {
-        'walkin': {
-            'count': walkin_orders.count(),
-            'revenue': walkin_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-            'avg_order': walkin_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0
-        },
-        'kiosk': {
-            'count': kiosk_orders.count(),
-            'revenue': kiosk_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-            'avg_order': kiosk_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0
-        }
-    }
-    
-    # Completion statistics
-    all_orders = Order.objects.filter(created_at__date__range=[start_date, end_date])
-    completion_stats = {
-        'total_orders': all_orders.count(),
-        'completed_orders': completed_orders.count(),
-        'completion_rate': (completed_orders.count() / all_orders.count() * 100) if all_orders.count() > 0 else 0
-    }
-    
-    # Cash payment statistics
-    cash_orders = completed_orders.filter(payment_method='cash')
-    total_cash_received = cash_orders.aggregate(total=Sum('cash_received'))['total'] or 0
-    total_change_given = cash_orders.aggregate(total=Sum('change'))['total'] or 0
-    
-    cash_stats = {
-        'count': cash_orders.count(),
-        'amount': cash_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-        'cash_received': total_cash_received,
-        'change_given': total_change_given,
-        'percentage': (cash_orders.count() / completed_orders.count() * 100) if completed_orders.count() > 0 else 0,
-        'avg_cash_received': cash_orders.aggregate(avg=Avg('cash_received'))['avg'] or 0,
-        'avg_change': cash_orders.aggregate(avg=Avg('change'))['avg'] or 0
-    }
-    
-    # Digital payment statistics
-    digital_orders = completed_orders.exclude(payment_method='cash')
-    digital_stats = {
-        'count': digital_orders.count(),
-        'amount': digital_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-        'percentage': (digital_orders.count() / completed_orders.count() * 100) if completed_orders.count() > 0 else 0
-    }
-    
-    # Enhanced payment breakdown with percentages
-    payment_breakdown = []
-    for method in Order.PAYMENT_METHODS:
-        method_orders = completed_orders.filter(payment_method=method[0])
-        count = method_orders.count()
-        amount = method_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        percentage = (count / completed_orders.count() * 100) if completed_orders.count() > 0 else 0
-        
-        # Add cash-specific metrics
-        cash_specific = {}
-        if method[0] == 'cash':
-            cash_specific = {
-                'total_cash_received': total_cash_received,
-                'total_change_given': total_change_given,
-                'avg_cash_received': cash_stats['avg_cash_received'],
-                'avg_change': cash_stats['avg_change']
-            }
-        
-        payment_breakdown.append({
-            'payment_method': method[1],
-            'method_code': method[0],
-            'count': count,
-            'amount': amount,
-            'percentage': percentage,
-            **cash_specific
-        })
-    
-    # Daily sales breakdown
-    daily_sales = completed_orders.values('completed_at__date').annotate(
-        daily_total=Sum('total_amount'),
-        order_count=Count('id'),
-        walkin_count=Count('id', filter=Q(order_type='staff')),
-        kiosk_count=Count('id', filter=Q(order_type='kiosk')),
-        average_sale=Avg('total_amount')
-    ).order_by('-completed_at__date')
-    
-    # Top selling cookies
-    top_cookies = OrderItem.objects.filter(
-        order__in=completed_orders
-    ).values(
-        'cookie__name'
-    ).annotate(
-        total_sold=Sum('quantity'),
-        total_revenue=Sum('price')
-    ).order_by('-total_sold')[:10]
-    
-    # Cash reconciliation summary
-    cash_reconciliation = {
-        'total_cash_sales': cash_stats['amount'],
-        'total_cash_received': total_cash_received,
-        'total_change_given': total_change_given,
-        'net_cash_should_be': cash_stats['amount'],  # Should equal total sales amount
-        'cash_handling_fee': total_change_given,  # Change given represents cash out
-        'expected_cash_drawer': total_cash_received - total_change_given
-    }
-    
-    context = {
-        'start_date': start_date,
-        'end_date': end_date,
-        'total_sales': total_sales,
-        'order_type_stats': order_type_stats,
-        'completion_stats': completion_stats,
-        'cash_stats': cash_stats,
-        'digital_stats': digital_stats,
-        'payment_breakdown': payment_breakdown,
-        'daily_sales': daily_sales,
-        'top_cookies': top_cookies,
-        'cash_reconciliation': cash_reconciliation,
-        'today': today,
-    }
+    report = build_sales_report(start_date, end_date)
+    context = report.context()
+    context['today'] = today
     
     return render(request, 'sales_report.html', context)
 
@@ -1150,12 +919,12 @@ def sales_report(request):
 @staff_required
 def cash_reconciliation_report(request):
     """Enhanced automated cash reconciliation with detailed transaction tracking"""
-    today = timezone.now().date()
+    today = business_date()
     
     # Get all today's cash-related data
     cash_floats = CashFloat.objects.filter(date=today).order_by('created_at')
     cash_orders = Order.objects.filter(
-        created_at__date=today,
+        **day_window('created_at', today),
         payment_method='cash',
         status='completed',
         is_paid=True
@@ -1399,99 +1168,22 @@ def dashboard(request):
 @admin_required
 def admin_dashboard(request):
     """Admin-only dashboard with business overview and enhanced completed orders tracking"""
-    today = timezone.now().date()
+    today = business_date()
     
     try:
-        # Today's orders with completion tracking
-        todays_orders = Order.objects.filter(created_at__date=today)
-        completed_orders_today = todays_orders.filter(status='completed')
-        
-        # Order statistics with completion focus
-        total_orders_today = todays_orders.count()
-        completed_orders_count = completed_orders_today.count()
-        kiosk_orders_today = todays_orders.filter(order_type='kiosk').count()
-        staff_orders_today = todays_orders.filter(order_type='staff').count()
-        pending_orders_today = todays_orders.filter(status='pending').count()
-        
-        # Revenue statistics - ONLY from completed orders
-        total_revenue_today = completed_orders_today.aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0.00')
+        # Headline numbers and chart series (cached briefly as one unit)
+        metrics = dashboard_metrics(today)
+        todays_orders = Order.objects.filter(**day_window('created_at', today))
         
-        kiosk_revenue_today = completed_orders_today.filter(order_type='kiosk').aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0.00')
-        
-        staff_revenue_today = completed_orders_today.filter(order_type='staff').aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0.00')
-
-        # Payment method breakdown for today
-        cash_transactions_today = completed_orders_today.filter(payment_method='cash').count()
-        gcash_transactions_today = completed_orders_today.filter(payment_method='gcash').count()
-        
-        # COMPLETION RATE CALCULATIONS - NEW
-        completion_rate_today = (completed_orders_count / total_orders_today * 100) if total_orders_today > 0 else 0
-        
-        # Daily sales for the last 7 days (for chart)
-        daily_sales_labels = []
-        daily_sales_values = []
-        for offset in range(6, -1, -1):  # 7 days, oldest to newest
-            day = today - timedelta(days=offset)
-            label = day.strftime('%b %d')
-            daily_total = Order.objects.filter(
-                created_at__date=day,
-                status='completed'
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-            daily_sales_labels.append(label)
-            daily_sales_values.append(float(daily_total))
-
-        # Payment breakdown for chart (today, completed orders)
-        payment_breakdown_qs = completed_orders_today.values('payment_method').annotate(
-            total=Sum('total_amount')
-        )
-        payment_labels = []
-        payment_values = []
-        for row in payment_breakdown_qs:
-            method = row['payment_method']
-            label = 'Cash' if method == 'cash' else 'GCash' if method == 'gcash' else method.title()
-            payment_labels.append(label)
-            payment_values.append(float(row['total'] or 0))
-        
-        # COOKIE AND STOCK STATISTICS
-        total_cookies = Cookie.objects.count()
-        total_cookie_types = Cookie.objects.values('name').distinct().count()
-        active_cookies = Cookie.objects.filter(is_available=True).count()
         low_stock_cookies = Cookie.objects.filter(stock_quantity__lt=10, stock_quantity__gt=0)
         out_of_stock_cookies = Cookie.objects.filter(stock_quantity=0)
-        low_stock_count = low_stock_cookies.count()
-        out_of_stock_count = out_of_stock_cookies.count()
-        
-        # Calculate active items percentage
-        active_items_percentage = (active_cookies / total_cookies * 100) if total_cookies > 0 else 0
-        
-        # STAFF STATISTICS
         pending_staff = Staff.objects.filter(role='pending', is_active=False)
-        pending_staff_count = pending_staff.count()
-        total_staff = Staff.objects.filter(is_active=True).count()
-        
-        # Best selling cookie (from completed orders only)
-        thirty_days_ago = today - timedelta(days=30)
-        best_selling = OrderItem.objects.filter(
-            order__status='completed',
-            order__completed_at__date__gte=thirty_days_ago
-        ).values('cookie__name').annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold').first()
-        
-        best_selling_cookie = best_selling['cookie__name'] if best_selling else 'N/A'
-        best_selling_count = best_selling['total_sold'] if best_selling else 0
         
         # Staff performance (based on completed orders)
         staff_performance = Staff.objects.filter(
             is_active=True,
             role__in=['staff', 'admin']
-        ).annotate(
+        ).select_related('user').annotate(
             total_completed_sales=Count('user__recorded_orders', 
                                       filter=Q(user__recorded_orders__status='completed')),
             total_completed_revenue=Sum('user__recorded_orders__total_amount', 
@@ -1506,64 +1198,37 @@ def admin_dashboard(request):
         latest_orders = todays_orders.select_related('customer', 'staff').order_by('-created_at')[:10]
 
         # Pending GCash verifications (for notifications/approvals)
-        pending_gcash_orders = Order.objects.filter(payment_method='gcash', is_paid=False)
-        pending_gcash_count = pending_gcash_orders.count()
+        pending_gcash_orders = Order.objects.filter(
+            payment_method='gcash', is_paid=False
+        ).select_related('staff').order_by('created_at')
 
         # Notifications for admin
         admin_notifications = []
-        if low_stock_count:
+        if metrics.low_stock_count:
             admin_notifications.append({
                 'icon': 'fas fa-boxes',
                 'title': 'Low stock warning',
-                'message': f'{low_stock_count} item(s) are low on stock.'
+                'message': f'{metrics.low_stock_count} item(s) are low on stock.'
             })
-        if pending_gcash_count:
+        if metrics.pending_gcash_count:
             admin_notifications.append({
                 'icon': 'fas fa-mobile-alt',
                 'title': 'Pending GCash verifications',
-                'message': f'{pending_gcash_count} order(s) need manual verification.'
+                'message': f'{metrics.pending_gcash_count} order(s) need manual verification.'
             })
 
         # Recent system activity logs
         recent_activity_logs = ActivityLog.objects.select_related('user', 'staff').order_by('-timestamp')[:8]
         
         context = {
-            'today': today,
-            'total_orders_today': total_orders_today,
-            'completed_orders_count': completed_orders_count,
-            'completion_rate_today': round(completion_rate_today, 1),
-            'kiosk_orders_today': kiosk_orders_today,
-            'staff_orders_today': staff_orders_today,
-            'pending_orders_today': pending_orders_today,
-            'total_revenue_today': total_revenue_today,
-            'kiosk_revenue_today': kiosk_revenue_today,
-            'staff_revenue_today': staff_revenue_today,
-            'cash_transactions_today': cash_transactions_today,
-            'gcash_transactions_today': gcash_transactions_today,
-            'daily_sales_labels': daily_sales_labels,
-            'daily_sales_values': daily_sales_values,
-            'payment_labels': payment_labels,
-            'payment_values': payment_values,
+            **metrics.context(),
             'low_stock_cookies': low_stock_cookies,
             'out_of_stock_cookies': out_of_stock_cookies,
-            
-            # Existing statistics
-            'total_cookies': total_cookies,
-            'total_cookie_types': total_cookie_types,
-            'active_cookies': active_cookies,
-            'active_items_percentage': round(active_items_percentage, 1),
-            'low_stock_count': low_stock_count,
-            'out_of_stock_count': out_of_stock_count,
             'pending_staff': pending_staff,
-            'pending_staff_count': pending_staff_count,
-            'total_staff': total_staff,
-            'best_selling_cookie': best_selling_cookie,
-            'best_selling_count': best_selling_count,
             'staff_performance': staff_performance,
             'recent_completed_orders': recent_completed_orders,
             'latest_orders': latest_orders,
             'pending_gcash_orders': pending_gcash_orders,
-            'pending_gcash_count': pending_gcash_count,
             'admin_notifications': admin_notifications,
             'recent_activity_logs': recent_activity_logs,
         }
@@ -1605,14 +1270,14 @@ def admin_dashboard(request):
 @staff_required
 def staff_dashboard(request):
     """Staff dashboard with personal performance and completed orders tracking"""
-    today = timezone.now().date()
+    today = business_date()
     staff = request.user
     
     try:
         # Staff-specific statistics
         staff_orders_today = Order.objects.filter(
             staff=staff,
-            created_at__date=today
+            **day_window('created_at', today)
         )
         
         # COMPLETED ORDERS TRACKING - NEW
@@ -1635,18 +1300,14 @@ def staff_dashboard(request):
         
         # Monthly performance for completed orders
         month_start = today.replace(day=1)
-        monthly_completed = Order.objects.filter(
-            staff=staff,
-            status='completed',
-            completed_at__date__gte=month_start
-        )
-        monthly_sales = monthly_completed.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-        monthly_orders = monthly_completed.count()
+        monthly_completed = rollups.totals(rollups.sales_rows(month_start, today, staff_id=staff.id))
+        monthly_sales = monthly_completed.total_amount or Decimal('0.00')
+        monthly_orders = monthly_completed.order_count
         
         # Low stock and pending GCash metrics
         low_stock_threshold = 5
         low_stock_count = Cookie.objects.filter(stock_quantity__lte=low_stock_threshold, is_available=True).count()
-        pending_gcash_count = Order.objects.filter(payment_method='gcash', is_paid=False, created_at__date=today).count()
+        pending_gcash_count = Order.objects.filter(payment_method='gcash', is_paid=False, **day_window('created_at', today)).count()
 
         # Notifications (simple aggregation)
         notifications = []
@@ -1677,15 +1338,10 @@ def staff_dashboard(request):
         
         # Top selling cookies today (all staff)
         try:
-            top_cookies = OrderItem.objects.filter(
-                order__status='completed',
-                order__completed_at__date=today
-            ).values(
-                'cookie__name', 'cookie__price'
-            ).annotate(
-                quantity_sold=Sum('quantity'),
-                total_revenue=Sum(F('quantity') * F('cookie__price'))
-            ).order_by('-quantity_sold')[:5]
+            top_cookies = [
+                dict(entry, total_revenue=entry['revenue'])
+                for entry in rollups.top_cookies(today, today, limit=5)
+            ]
         except Exception as e:
             print(f"Error calculating top cookies: {e}")
             top_cookies = []
@@ -1991,57 +1647,25 @@ def home(request):
 
 def public_home(request):
     """Public landing page with marketing content."""
-    cookies_with_images = Cookie.objects.filter(
-        is_available=True,
-        stock_quantity__gt=0,
-        image__isnull=False
-    ).exclude(image='').order_by('-id')[:8]
-
-    # Scan media folder for featured cookie images (e.g., media/cookies/* or media/*)
-    featured_images = []
-    try:
-        media_root = getattr(settings, 'MEDIA_ROOT', None)
-        media_url = getattr(settings, 'MEDIA_URL', '/media/')
-        if media_root and os.path.isdir(media_root):
-            patterns = [
-                os.path.join(media_root, 'cookies', '*.*'),
-                os.path.join(media_root, '*.*'),
-            ]
-            exts = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
-            found = []
-            for pattern in patterns:
-                found.extend(glob.glob(pattern))
-            # Filter by image extensions and unique order
-            imgs = [p for p in found if os.path.splitext(p)[1].lower() in exts]
-            # Make relative URLs
-            for p in imgs:
-                rel = p.replace(media_root, '').lstrip('\\/').replace('\\', '/')
-                featured_images.append((media_url.rstrip('/') + '/' + rel))
-            # De-duplicate and limit
-            seen = set()
-            dedup = []
-            for url in featured_images:
-                if url not in seen:
-                    dedup.append(url)
-                    seen.add(url)
-            featured_images = dedup[:12]
-    except Exception as _:
-        featured_images = []
+    # Newest in-stock cookies with a photo, straight from the catalog snapshot
+    menu = catalog_snapshot()
+    cookies_with_images = [cookie for cookie in reversed(menu.cookies) if cookie.image][:8]
 
+    # Featured photos come from the media index (manage.py index_media), never a directory scan
     return render(request, 'public_home.html', {
         'cookies_with_images': cookies_with_images,
-        'featured_images': featured_images,
+        'featured_images': featured_images(limit=8),
     })
 
 def public_menu(request):
     """Public Menu page listing available cookies with optional search."""
     q = (request.GET.get('q') or '').strip()
-    cookies = Cookie.objects.filter(is_available=True, stock_quantity__gt=0).select_related('category').order_by('name')
-    if q:
-        cookies = cookies.filter(models.Q(name__icontains=q) | models.Q(category__name__icontains=q))
+    menu = catalog_snapshot()
+    cookies = menu.search(q) if q else menu.by_name
     return render(request, 'public_menu.html', {
         'cookies': cookies,
         'q': q,
+        'catalog_key': menu.key,
     })
 
     # Handle POST requests for login/registration (your existing code)
@@ -2457,18 +2081,24 @@ def customer_reauth_complete(request):
 def order_history(request):
     """Customer order history with payment method display"""
     customer = request.user.profile.customer
-    orders = Order.objects.filter(customer=customer).order_by('-created_at')
-    
-    # Calculate total spent
-    total_spent = Order.objects.filter(
-        customer=customer, 
-        status='completed'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    qs = Order.objects.filter(customer=customer).prefetch_related('items__cookie')
+    try:
+        orders = keyset_page(qs, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    if _wants_order_page(request):
+        return _order_page_response(request, orders, {'orders': orders}, html='customer/_order_history_rows.html')
+
+    totals = Order.objects.filter(customer=customer).aggregate(
+        count=Count('id'),
+        spent=Sum('total_amount', filter=Q(status='completed')),
+    )
     
     context = {
         'orders': orders,
+        'order_count': totals['count'],
         'customer': customer,
-        'total_spent': total_spent,
+        'total_spent': totals['spent'] or 0,
     }
     return render(request, 'customer/order_history.html', context)
 
@@ -2485,14 +2115,18 @@ def customer_cancel_order(request, order_id: int):
     customer = request.user.profile.customer
 
     try:
-        order = get_object_or_404(Order, id=order_id, customer=customer)
+        with transaction.atomic():
+            # Locked so a double submit cannot return the stock twice
+            order = get_object_or_404(Order.objects.select_for_update(), id=order_id, customer=customer)
 
-        if order.status != 'pending' or order.is_paid:
-            messages.error(request, 'This order can no longer be cancelled.')
-            return redirect('order_history')
+            if order.status != 'pending' or order.is_paid:
+                messages.error(request, 'This order can no longer be cancelled.')
+                return redirect('order_history')
 
-        order.status = 'cancelled'
-        order.save()
+            order.status = 'cancelled'
+            order.save()
+            # Stock was reserved when the order was placed
+            release_stock(order.items.values_list('cookie_id', 'quantity'))
 
         log_activity(
             user=request.user,
@@ -2602,7 +2236,7 @@ def cart_state(request):
             'price': str(cookie.price),
             'quantity': entry['quantity'],
             'subtotal': str(entry['subtotal']),
-            'image': cookie.image.url if getattr(cookie, 'image', None) else None,
+            **image_json(cookie),
             'stock': cookie.stock_quantity,
         })
 
@@ -2672,7 +2306,7 @@ def update_cart_item(request):
             'price': str(cookie.price),
             'quantity': entry['quantity'],
             'subtotal': str(entry['subtotal']),
-            'image': cookie.image.url if getattr(cookie, 'image', None) else None,
+            **image_json(cookie),
             'stock': cookie.stock_quantity,
         })
 
@@ -2705,38 +2339,29 @@ def convert_cart_to_kiosk_order(request):
     if not cart_items:
         return JsonResponse({'success': False, 'error': 'Cart is empty.'}, status=400)
 
-    order = Order.objects.create(
-        customer_name=customer_name,
-        customer_phone=customer_phone,
-        staff=request.user,
-        order_type='kiosk',
-        total_amount=total_amount,
-        payment_method=payment_method,
-        status='pending',
-        notes=notes,
-    )
-
-    for entry in cart_items:
-        cookie = entry['cookie']
-        OrderItem.objects.create(
-            order=order,
-            cookie=cookie,
-            quantity=entry['quantity'],
-            price=cookie.price
-        )
+    # Kiosk orders hold their stock from the moment they are placed
+    try:
+        with transaction.atomic():
+            reservation = reserve_stock(cart_map)
+            order = create_order(
+                reservation.items(),
+                user=request.user,
+                ip_address=get_client_ip(request),
+                describe=lambda o: f'Kiosk order created from cart: {o.order_id} - ₱{o.total_amount:.2f}',
+                customer_name=customer_name,
+                customer_phone=customer_phone,
+                staff=request.user,
+                order_type='kiosk',
+                payment_method=payment_method,
+                status='pending',
+                notes=notes,
+            )
+    except InsufficientStock as e:
+        return JsonResponse({'success': False, 'error': e.message, 'shortages': e.shortages}, status=400)
 
     request.session['cart'] = {}
     request.session.modified = True
 
-    log_activity(
-        user=request.user,
-        action='order_created',
-        description=f'Kiosk order created from cart: {order.order_id} - ₱{total_amount:.2f}',
-        ip_address=get_client_ip(request),
-        affected_model='Order',
-        affected_id=order.id
-    )
-
     return JsonResponse({
         'success': True,
         'order': {
@@ -2849,13 +2474,13 @@ def admin_customer_list(request):
     if start_date_str:
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            customers = customers.filter(date_joined__date__gte=start_date)
+            customers = customers.filter(**date_window('date_joined', start_date))
         except ValueError:
             start_date = None
     if end_date_str:
         try:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            customers = customers.filter(date_joined__date__lte=end_date)
+            customers = customers.filter(**date_window('date_joined', end_date=end_date))
         except ValueError:
             end_date = None
 
@@ -2892,26 +2517,34 @@ def admin_customer_orders(request, customer_id):
     if start_date_str:
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            orders = orders.filter(created_at__date__gte=start_date)
+            orders = orders.filter(**date_window('created_at', start_date))
         except ValueError:
             pass
     if end_date_str:
         try:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            orders = orders.filter(created_at__date__lte=end_date)
+            orders = orders.filter(**date_window('created_at', end_date=end_date))
         except ValueError:
             pass
 
-    total_spent = orders.filter(status='completed').aggregate(total=Sum('total_amount'))['total'] or 0
+    try:
+        page = keyset_page(orders, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    if _wants_order_page(request):
+        return _order_page_response(request, page, {'orders': page}, html='admin/_customer_order_rows.html')
+
+    totals = orders.aggregate(count=Count('id'), spent=Sum('total_amount', filter=Q(status='completed')))
 
     context = {
         'customer': customer,
-        'orders': orders,
+        'orders': page,
+        'order_count': totals['count'],
         'status_filter': status_filter,
         'payment_filter': payment_filter,
         'start_date': start_date_str,
         'end_date': end_date_str,
-        'total_spent': total_spent,
+        'total_spent': totals['spent'] or 0,
     }
     return render(request, 'admin/customer_orders.html', context)
 
@@ -2940,7 +2573,7 @@ def admin_gcash_verifications(request):
     if date_str:
         try:
             day = datetime.strptime(date_str, '%Y-%m-%d').date()
-            qs = qs.filter(created_at__date=day)
+            qs = qs.filter(**day_window('created_at', day))
         except ValueError:
             pass
 
@@ -2978,6 +2611,35 @@ def admin_store_settings(request):
     })
 
 
+@login_required
+@admin_required
+def admin_id_pool_stats(request):
+    """JSON fill/exhaustion metrics for the customer and staff ID pools"""
+    return JsonResponse({'success': True, 'pools': pool_stats()})
+
+
+@login_required
+@admin_required
+def admin_request_profiles(request):
+    """JSON per-view query/latency summary and recent request profiles from QueryProfilingMiddleware.
+
+    ?view=<url name> narrows the recent list to one view; POST clears the buffer.
+    """
+    if request.method == 'POST':
+        request_profiles.clear()
+        return JsonResponse({'success': True})
+
+    recent = request_profiles.records()
+    view = request.GET.get('view')
+    if view:
+        recent = [record for record in recent if record['view'] == view]
+    return JsonResponse({
+        'success': True,
+        'summary': request_profiles.summary(),
+        'recent': recent[::-1][:100],
+    })
+
+
 @login_required
 @admin_required
 @require_POST
@@ -3047,7 +2709,7 @@ def inventory(request):
             Q(description__icontains=search_query)
         )
     
-    today = timezone.now().date()
+    today = business_date()
     next_week = today + timedelta(days=7)
     
     cookies_by_category = {}
@@ -3177,11 +2839,10 @@ def delete_cookie(request, pk):
 @admin_required
 def category_list(request):
     """List all categories"""
-    categories = Category.objects.all().order_by('name')
-    
-    for category in categories:
-        category.cookie_count = category.get_cookie_count()
-        category.active_cookies = category.cookies.filter(is_available=True).count()
+    categories = Category.objects.annotate(
+        cookie_count=Count('cookies'),
+        active_cookies=Count('cookies', filter=Q(cookies__is_available=True)),
+    ).order_by('name')
     
     context = {
         'categories': categories,
@@ -3540,26 +3201,16 @@ def activity_logs(request):
     action_filter = request.GET.get('action', '')
     user_filter = request.GET.get('user', '')
     
-    # Start with all activity logs
-    activity_logs = ActivityLog.objects.all().select_related('user', 'staff').order_by('-timestamp')
-    
-    # Apply filters
+    filter_date = None
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            activity_logs = activity_logs.filter(timestamp__date=filter_date)
         except ValueError:
             pass
-    
-    if action_filter:
-        activity_logs = activity_logs.filter(action=action_filter)
-    
-    if user_filter:
-        activity_logs = activity_logs.filter(
-            Q(user__username__icontains=user_filter) |
-            Q(staff__user__username__icontains=user_filter)
-        )
-    
+
+    # Live and archived logs (see retention.py), with capped counts
+    activity_logs = ActivityLogSearch(date=filter_date, action=action_filter, user=user_filter)
+
     # Pagination
     from django.core.paginator import Paginator
     paginator = Paginator(activity_logs, 50)  # 50 logs per page
@@ -3567,15 +3218,13 @@ def activity_logs(request):
     page_obj = paginator.get_page(page_number)
     
     # Get summary statistics
-    today = timezone.now().date()
-    today_logs = ActivityLog.objects.filter(timestamp__date=today)
-    
-    summary_stats = {
-        'total_activities_today': today_logs.count(),
-        'total_users_active_today': today_logs.values('user').distinct().count(),
-        'sales_activities_today': today_logs.filter(action__in=['order_created', 'order_updated', 'order_completed', 'order_voided']).count(),
-        'inventory_activities_today': today_logs.filter(action__in=['cookie_added', 'cookie_updated', 'cookie_deleted', 'inventory_updated']).count(),
-    }
+    today = business_date()
+    summary_stats = ActivityLog.objects.filter(**day_window('timestamp', today)).aggregate(
+        total_activities_today=Count('id'),
+        total_users_active_today=Count('user', distinct=True),
+        sales_activities_today=Count('id', filter=Q(action__in=['order_created', 'order_updated', 'order_completed', 'order_voided'])),
+        inventory_activities_today=Count('id', filter=Q(action__in=['cookie_added', 'cookie_updated', 'cookie_deleted', 'inventory_updated'])),
+    )
     
     # Get action types for filter dropdown
     action_choices = ActivityLog.ACTION_CHOICES
@@ -3584,6 +3233,7 @@ def activity_logs(request):
         'page_obj': page_obj,
         'activity_logs': page_obj.object_list,
         'summary_stats': summary_stats,
+        'count_is_exact': activity_logs.exact,
         'action_choices': action_choices,
         'date_filter': date_filter,
         'action_filter': action_filter,
@@ -3610,7 +3260,7 @@ def void_logs(request):
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            void_logs = void_logs.filter(void_date__date=filter_date)
+            void_logs = void_logs.filter(**day_window('void_date', filter_date))
         except ValueError:
             pass
     
@@ -3624,17 +3274,17 @@ def void_logs(request):
     page_obj = paginator.get_page(page_number)
     
     # Summary statistics
-    today = timezone.now().date()
-    today_voids = VoidLog.objects.filter(void_date__date=today)
+    today = business_date()
+    today_voids = VoidLog.objects.filter(**day_window('void_date', today))
     
     summary_stats = {
         'total_voids_today': today_voids.count(),
         'total_voids': void_logs.count(),
-        'total_voided_amount': sum([log.original_total for log in void_logs]),
+        'total_voided_amount': void_logs.aggregate(total=Sum('original_total'))['total'] or 0,
     }
     
     # Get all staff for filter dropdown
-    all_staff = Staff.objects.filter(is_active=True, role__in=['staff', 'admin'])
+    all_staff = Staff.objects.filter(is_active=True, role__in=['staff', 'admin']).select_related('user')
     
     context = {
         'page_obj': page_obj,
@@ -3652,7 +3302,7 @@ def void_logs(request):
 @staff_required
 def daily_sales_report(request):
     """Staff daily sales report submission"""
-    today = timezone.now().date()
+    today = business_date()
     
     try:
         # Get today's completed orders for this staff member
@@ -3660,7 +3310,7 @@ def daily_sales_report(request):
         today_sales = Order.objects.filter(
             staff=request.user,  # Use User instance, not Staff instance
             status='completed',
-            completed_at__date=today
+            **day_window('completed_at', today)
         )
         
         # Check if staff has already submitted today's report
@@ -3765,20 +3415,21 @@ def admin_sales_monitoring(request):
         return redirect('dashboard')
     
     # Default to today's date
-    selected_date = request.GET.get('date', timezone.now().date().isoformat())
+    selected_date = request.GET.get('date', business_date().isoformat())
     staff_filter = request.GET.get('staff', '')
     
     try:
         selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
     except:
-        selected_date = timezone.now().date()
+        selected_date = business_date()
     
     # Get COMPLETED orders for the selected date
     completed_orders = Order.objects.filter(
         status='completed', 
-        completed_at__date=selected_date
+        **day_window('completed_at', selected_date)
     )
     daily_reports = Order.objects.filter(is_daily_report=True, report_date=selected_date)
+    sales_staff_id = None
     
     # Apply staff filter if selected
     if staff_filter:
@@ -3787,18 +3438,24 @@ def admin_sales_monitoring(request):
             staff_obj = Staff.objects.get(id=staff_filter)
             completed_orders = completed_orders.filter(staff=staff_obj.user)
             daily_reports = daily_reports.filter(staff=staff_obj.user)
+            sales_staff_id = staff_obj.user_id
         except Staff.DoesNotExist:
             pass
     
-    # Calculate daily summary from COMPLETED orders
+    # Completed sales totals come from the daily rollup
+    sales = rollups.sales_rows(selected_date, selected_date, staff_id=sales_staff_id)
+    day_totals = rollups.totals(sales)
+    # Daily reports per staff user, counted once instead of once per staff member
+    report_counts = dict(daily_reports.order_by().values('staff').annotate(reports=Count('id')).values_list('staff', 'reports'))
+    orders_placed = Order.objects.filter(**day_window('created_at', selected_date)).count()
     daily_summary = {
-        'total_sales': completed_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-        'total_transactions': completed_orders.count(),
-        'average_sale': completed_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0,
-        'daily_reports_count': daily_reports.count(),
-        'staff_with_reports': daily_reports.values('staff').distinct().count(),
-        'voided_sales': Order.objects.filter(status='voided', created_at__date=selected_date).count(),
-        'completion_rate': (completed_orders.count() / Order.objects.filter(created_at__date=selected_date).count() * 100) if Order.objects.filter(created_at__date=selected_date).count() > 0 else 0,
+        'total_sales': day_totals.total_amount,
+        'total_transactions': day_totals.order_count,
+        'average_sale': day_totals.average_sale,
+        'daily_reports_count': sum(report_counts.values()),
+        'staff_with_reports': len(report_counts),
+        'voided_sales': Order.objects.filter(status='voided', **day_window('created_at', selected_date)).count(),
+        'completion_rate': (completed_orders.count() / orders_placed * 100) if orders_placed > 0 else 0,
     }
     
     # Sales by staff - Only show staff with completed sales - FIXED
@@ -3808,12 +3465,11 @@ def admin_sales_monitoring(request):
     for staff in all_active_staff:
         # Get COMPLETED sales for this staff member on selected date
         # FIX: Use staff.user (User instance) instead of staff (Staff instance)
-        staff_completed_orders = completed_orders.filter(staff=staff.user)
-        staff_daily_reports = daily_reports.filter(staff=staff.user)
+        staff_totals = rollups.totals(sales, staff_id=staff.user_id)
         
-        total_sales = staff_completed_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        transaction_count = staff_completed_orders.count()
-        daily_reports_count = staff_daily_reports.count()
+        total_sales = staff_totals.total_amount
+        transaction_count = staff_totals.order_count
+        daily_reports_count = report_counts.get(staff.user_id, 0)
         
         # Calculate average from completed orders
         avg_sales = total_sales / transaction_count if transaction_count > 0 else 0
@@ -3834,13 +3490,7 @@ def admin_sales_monitoring(request):
     staff_sales_data.sort(key=lambda x: x['staff_sales'], reverse=True)
     
     # Top selling items for the day from COMPLETED orders
-    top_items = OrderItem.objects.filter(
-        order__status='completed',
-        order__completed_at__date=selected_date
-    ).values('cookie__name').annotate(
-        quantity_sold=Sum('quantity'),
-        revenue=Sum('price')
-    ).order_by('-quantity_sold')[:10]
+    top_items = rollups.top_cookies(selected_date, selected_date)
     
     # Calculate average price for top items
     top_items_data = []
@@ -3880,17 +3530,17 @@ def admin_sales_monitoring(request):
 @login_required
 @admin_required
 def admin_sales_monitoring_csv(request):
-    selected_date = request.GET.get('date', timezone.now().date().isoformat())
+    selected_date = request.GET.get('date', business_date().isoformat())
     staff_filter = request.GET.get('staff', '')
 
     try:
         selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
     except Exception:
-        selected_date = timezone.now().date()
+        selected_date = business_date()
 
     completed_orders = Order.objects.filter(
         status='completed',
-        completed_at__date=selected_date
+        **day_window('completed_at', selected_date)
     ).select_related('customer', 'staff')
 
     if staff_filter:
@@ -3937,7 +3587,7 @@ def admin_sales_monitoring_csv(request):
 def staff_sales_history(request):
     """Staff can view their own sales history"""
     # Default to last 7 days
-    end_date = timezone.now().date()
+    end_date = business_date()
     start_date = end_date - timedelta(days=7)
     
     if request.method == 'POST':
@@ -3958,7 +3608,7 @@ def staff_sales_history(request):
     orders = Order.objects.filter(
         staff=request.user,
         status='completed',
-        created_at__date__range=[start_date, end_date]
+        **date_window('created_at', start_date, end_date)
     )
     
     if payment_method:
@@ -4072,13 +3722,7 @@ def complete_order_payment(request, order_id):
         order.save()
         
         # Add loyalty points to customer
-        try:
-            if order.customer:
-                points_earned = int(order.total_amount)
-                order.customer.loyalty_points += points_earned
-                order.customer.save()
-        except Customer.DoesNotExist:
-            pass  # Customer might not exist in database (walk-in)
+        add_loyalty_points(order)
         
         # Log the payment completion
         log_activity(
@@ -4258,7 +3902,9 @@ def debug_kiosk_orders(request):
         print(f"Field: {field_info['name']} | Type: {field_info['type']} | Related: {field_info['related_model']} | Related Name: {field_info['related_name']}")
     
     # Check pending kiosk orders
-    pending_kiosk_orders = Order.objects.filter(order_type='kiosk', status='pending')
+    pending_kiosk_orders = Order.objects.filter(order_type='kiosk', status='pending').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('cookie'))
+    )
     print(f"Pending kiosk orders: {pending_kiosk_orders.count()}")
     
     orders_data = []
@@ -4284,74 +3930,29 @@ def debug_kiosk_orders(request):
         
         print(f"Available OrderItem related names: {[rn['name'] for rn in related_names]}")
         
-        # Try different methods to get order items
+        # Try the related names an order's items might live under; the lines
+        # themselves come from the prefetch, so this costs no queries per order
+        items = list(order.items.all())
         item_methods = {}
+        for method in ('orderitem_set', 'items', 'order_items'):
+            if hasattr(order, method):
+                item_methods[method] = {'count': len(items), 'works': True}
+                print(f"✓ {method}: {len(items)} items")
+            else:
+                error = f"'Order' object has no attribute '{method}'"
+                item_methods[method] = {'count': 0, 'works': False, 'error': error}
+                print(f"✗ {method} error: {error}")
         
-        # Method 1: orderitem_set (default Django)
-        try:
-            items_count = order.orderitem_set.count()
-            item_methods['orderitem_set'] = {
-                'count': items_count,
-                'works': True
-            }
-            print(f"✓ orderitem_set: {items_count} items")
-            
-            # Show actual items if any
-            if items_count > 0:
-                for item in order.orderitem_set.all()[:3]:  # Show first 3 items
-                    print(f"  - {item.quantity}x {item.cookie.name} = ₱{item.total_price}")
-        except Exception as e:
-            item_methods['orderitem_set'] = {
-                'count': 0,
-                'works': False,
-                'error': str(e)
-            }
-            print(f"✗ orderitem_set error: {str(e)}")
-        
-        # Method 2: items (common custom name)
-        try:
-            items_count = order.items.count()
-            item_methods['items'] = {
-                'count': items_count,
-                'works': True
-            }
-            print(f"✓ items: {items_count} items")
-        except Exception as e:
-            item_methods['items'] = {
-                'count': 0,
-                'works': False,
-                'error': str(e)
-            }
-            print(f"✗ items error: {str(e)}")
-        
-        # Method 3: order_items (another common name)
-        try:
-            items_count = order.order_items.count()
-            item_methods['order_items'] = {
-                'count': items_count,
-                'works': True
-            }
-            print(f"✓ order_items: {items_count} items")
-        except Exception as e:
-            item_methods['order_items'] = {
-                'count': 0,
-                'works': False,
-                'error': str(e)
-            }
-            print(f"✗ order_items error: {str(e)}")
-        
-        # Method 4: Direct query (always works)
-        direct_items = OrderItem.objects.filter(order=order)
-        direct_count = direct_items.count()
+        direct_count = len(items)
         item_methods['direct_query'] = {
             'count': direct_count,
             'works': True
         }
         print(f"✓ Direct query: {direct_count} items")
         
-        # Show items from direct query
+        # Show the first few items
         if direct_count > 0:
-            for item in direct_items[:3]:  # Show first 3 items
+            for item in items[:3]:
                 print(f"  - {item.quantity}x {item.cookie.name} = ₱{item.total_price}")
         else:
             print("  - No items found via direct query")
@@ -4386,7 +3987,7 @@ def debug_kiosk_orders(request):
     
     # Sample some OrderItems to see structure
     if kiosk_order_items > 0:
-        sample_items = OrderItem.objects.filter(order__order_type='kiosk')[:5]
+        sample_items = OrderItem.objects.filter(order__order_type='kiosk').select_related('order', 'cookie')[:5]
         print("Sample OrderItems:")
         for item in sample_items:
             print(f"  - Order: {item.order.order_id} | Cookie: {item.cookie.name} | Qty: {item.quantity} | Price: {item.price}")
@@ -4585,10 +4186,7 @@ def void_order(request, order_id):
                 )
                 
                 # Restore inventory
-                for item in order.items.all():
-                    cookie = item.cookie
-                    cookie.stock_quantity += item.quantity
-                    cookie.save()
+                release_stock(order.items.values_list('cookie_id', 'quantity'))
                 
                 # Update order status
                 order.status = 'voided'
@@ -4645,10 +4243,7 @@ def void_order(request, order_id):
                 )
                 
                 # Restore inventory
-                for item in order.items.all():
-                    cookie = item.cookie
-                    cookie.stock_quantity += item.quantity
-                    cookie.save()
+                release_stock(order.items.values_list('cookie_id', 'quantity'))
                 
                 # Update order status
                 order.status = 'voided'
@@ -4748,26 +4343,14 @@ def payment_confirm(request, order_id):
 def place_order(request):
     """Customer order placement - using unified Order model"""
     customer = request.user.profile.customer
-    available_cookies = Cookie.objects.filter(stock_quantity__gt=0, is_available=True).select_related('category')
-    
-    categories = Category.objects.filter(cookies__in=available_cookies).distinct()
-    
-    cookies_by_category = {}
-    for cookie in available_cookies:
-        if cookie.category:
-            category_display = cookie.category.name
-        else:
-            category_display = 'Other'
-        
-        if category_display not in cookies_by_category:
-            cookies_by_category[category_display] = []
-        cookies_by_category[category_display].append(cookie)
+    menu = catalog_snapshot()
     
     # Get cart items from session to pre-populate the order summary
     cart_items, cart_total, cart_map = _get_session_cart_items(request)
     
     if request.method == 'POST':
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            staged_receipt = None
             try:
                 # Use session cart items instead of client-side items
                 order_items = cart_map  # This is the session cart
@@ -4781,71 +4364,50 @@ def place_order(request):
                 
                 if not order_items:
                     return JsonResponse({'success': False, 'error': 'No items in order.'})
-                
-                # Validate stock before creating order
-                for cookie_id, quantity in order_items.items():
-                    if int(quantity) > 0:
-                        try:
-                            cookie = Cookie.objects.get(id=int(cookie_id))
-                            if cookie.stock_quantity < int(quantity):
-                                return JsonResponse({
-                                    'success': False, 
-                                    'error': f'Not enough stock for {cookie.name}. Only {cookie.stock_quantity} available.'
-                                })
-                        except Cookie.DoesNotExist:
-                            return JsonResponse({
-                                'success': False,
-                                'error': f'Cookie with ID {cookie_id} not found.'
-                            })
-                
-                # Create order
-                order = Order.objects.create(
-                    customer=customer,
-                    customer_name=customer.name,
-                    customer_phone=customer.phone or '',
-                    total_amount=total_amount,
-                    notes=notes,
-                    status='pending',  
-                    payment_method=payment_method or 'cash',
-                    order_type='kiosk'
-                )
 
-                # If customer selected GCash, attach optional screenshot and leave as unpaid for manual verification
-                if payment_method == 'gcash':
-                    gcash_file = request.FILES.get('gcash_screenshot')
-                    if gcash_file:
-                        order.gcash_screenshot = gcash_file
-                    order.is_paid = False
-                    order.save()
+                # Stream an attached GCash receipt to a temp file; it is decoded and
+                # downsized in the background once the order is committed
+                gcash_file = request.FILES.get('gcash_screenshot') if payment_method == 'gcash' else None
+                if gcash_file:
+                    try:
+                        staged_receipt = stage_upload(gcash_file)
+                    except ReceiptRejected as e:
+                        return JsonResponse({'success': False, 'error': str(e)})
                 
-                # Create order items and update stock
-                for cookie_id, quantity in order_items.items():
-                    if int(quantity) > 0:
-                        cookie = Cookie.objects.get(id=int(cookie_id))
-                        OrderItem.objects.create(
-                            order=order,
-                            cookie=cookie,
-                            quantity=int(quantity),
-                            price=cookie.price
-                        )
-                        # Update stock
-                        cookie.stock_quantity -= int(quantity)
-                        cookie.save()
+                # Reserve stock and create the order in one transaction
+                with transaction.atomic():
+                    reservation = reserve_stock(order_items)
+                    order_fields = dict(
+                        customer=customer,
+                        customer_name=customer.name,
+                        customer_phone=customer.phone or '',
+                        notes=notes,
+                        status='pending',  
+                        payment_method=payment_method or 'cash',
+                        order_type='kiosk'
+                    )
+
+                    # If customer selected GCash, leave as unpaid for manual verification
+                    if payment_method == 'gcash':
+                        if staged_receipt:
+                            order_fields['gcash_receipt_status'] = 'processing'
+                        order_fields['is_paid'] = False
+                    
+                    # Create order with all of its items
+                    order = create_order(
+                        reservation.items(),
+                        user=request.user,
+                        ip_address=get_client_ip(request),
+                        describe=lambda o: f'Customer order created: {o.order_id} - ₱{o.total_amount:.2f}',
+                        **order_fields
+                    )
+                    if staged_receipt:
+                        ingest_on_commit(order, staged_receipt)
                 
                 # Clear the cart after successful order
                 request.session['cart'] = {}
                 request.session.modified = True
                 
-                # Log activity
-                log_activity(
-                    user=request.user,
-                    action='order_created',
-                    description=f'Customer order created: {order.order_id} - ₱{total_amount:.2f}',
-                    ip_address=get_client_ip(request),
-                    affected_model='Order',
-                    affected_id=order.id
-                )
-                
                 return JsonResponse({
                     'success': True,
                     'order_id': order.id,
@@ -4853,7 +4415,13 @@ def place_order(request):
                     'message': 'Order placed successfully!'
                 })
                 
+            except InsufficientStock as e:
+                if staged_receipt:
+                    discard(staged_receipt)
+                return JsonResponse({'success': False, 'error': e.message, 'shortages': e.shortages})
             except Exception as e:
+                if staged_receipt:
+                    discard(staged_receipt)
                 print(f"Error in place_order: {str(e)}")
                 import traceback
                 print(f"Traceback: {traceback.format_exc()}")  # More detailed error
@@ -4863,9 +4431,11 @@ def place_order(request):
     
     # GET request - render the template with cart items
     context = {
-        'available_cookies': available_cookies,
-        'cookies_by_category': cookies_by_category,
-        'categories': categories,
+        'available_cookies': menu.cookies,
+        'cookies_by_category': menu.by_category,
+        'categories': menu.categories,
+        'catalog_key': menu.key,
+        'stock_levels': stock_levels(menu.cookies),
         'customer': customer,
         'cart_items': cart_items,
         'cart_total': cart_total,
@@ -4936,7 +4506,7 @@ def debug_user_status(request):
 @staff_required
 def staff_dashboard_debug(request):
     """Debug endpoint to check real-time data"""
-    today = timezone.now().date()
+    today = business_date()
     staff = request.user
     
     debug_data = {
@@ -4948,7 +4518,7 @@ def staff_dashboard_debug(request):
     try:
         staff_orders_today = Order.objects.filter(
             staff=staff,
-            created_at__date=today
+            **day_window('created_at', today)
         )
         
         completed_orders_today = staff_orders_today.filter(status='completed')
@@ -4991,10 +4561,7 @@ def process_cash_payment(request, order_id=None):
             order.save()
             
             # Add loyalty points
-            if order.customer:
-                points_earned = int(order.total_amount)
-                order.customer.loyalty_points += points_earned
-                order.customer.save()
+            add_loyalty_points(order)
             
             log_activity(
                 user=request.user,
@@ -5249,18 +4816,29 @@ def kiosk_order_items(request, order_id):
         traceback.print_exc()
         return JsonResponse({'items': [], 'error': str(e)}, status=500)
     
+def _staff_realtime_version(request):
+    return realtime.version_stamp(request)
+
+def _sales_realtime_version(request):
+    return realtime.version_stamp(request, request.GET.get('start_date', ''), request.GET.get('end_date', ''))
+
 @login_required
 @staff_required
+@condition(etag_func=_staff_realtime_version)
 def staff_dashboard_realtime_data(request):
-    """AJAX endpoint for real-time staff dashboard data - FIXED VERSION"""
-    today = timezone.now().date()
+    """AJAX endpoint for real-time staff dashboard data - FIXED VERSION
+
+    Answers 304 while no order has changed (ETag/If-None-Match), and with
+    ?since=<version> sends only the fields that changed since then.
+    """
+    today = business_date()
     staff = request.user
     
     try:
-        # FIX: Use created_at__date for today's orders, not completed_at
+        # FIX: Use created_at for today's orders, not completed_at
         staff_orders_today = Order.objects.filter(
             staff=staff,
-            created_at__date=today  # This gets all orders created today
+            **day_window('created_at', today)  # This gets all orders created today
         )
         
         # FIX: Completed orders should also be from today
@@ -5283,13 +4861,9 @@ def staff_dashboard_realtime_data(request):
         
         # Monthly performance (completed orders this month)
         month_start = today.replace(day=1)
-        monthly_completed = Order.objects.filter(
-            staff=staff,
-            status='completed',
-            completed_at__date__gte=month_start  # Use completed_at for monthly
-        )
-        monthly_sales = monthly_completed.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-        monthly_orders = monthly_completed.count()
+        monthly_completed = rollups.totals(rollups.sales_rows(month_start, today, staff_id=staff.id))
+        monthly_sales = monthly_completed.total_amount or Decimal('0.00')
+        monthly_orders = monthly_completed.order_count
         
         # Format recent orders for JSON
         recent_completed_data = []
@@ -5352,8 +4926,9 @@ def staff_dashboard_realtime_data(request):
                 'timestamp': timezone.now().strftime("%H:%M:%S")
             }
         }
+        return JsonResponse(data)
     
-    return JsonResponse(data)
+    return realtime.delta_response(request, 'staff_dashboard', _staff_realtime_version(request), data)
 
 @login_required
 @staff_required  
@@ -5431,10 +5006,11 @@ def staff_new_orders_check(request):
     return JsonResponse(data)
 @login_required
 @staff_required
+@condition(etag_func=_sales_realtime_version)
 def sales_report_realtime_data(request):
-    """AJAX endpoint for real-time sales report data"""
+    """AJAX endpoint for real-time sales report data (304 / deltas as in staff_dashboard_realtime_data)"""
     try:
-        today = timezone.now().date()
+        today = business_date()
         start_date = request.GET.get('start_date', today)
         end_date = request.GET.get('end_date', today)
         
@@ -5446,7 +5022,7 @@ def sales_report_realtime_data(request):
         
         # Get current data
         all_orders = Order.objects.filter(
-            created_at__date__range=[start_date, end_date]
+            **date_window('created_at', start_date, end_date)
         )
         completed_orders = all_orders.filter(status='completed')
         
@@ -5517,8 +5093,9 @@ def sales_report_realtime_data(request):
                 'timestamp': timezone.now().strftime("%H:%M:%S")
             }
         }
+        return JsonResponse(data)
     
-    return JsonResponse(data)
+    return realtime.delta_response(request, 'sales_report', _sales_realtime_version(request), data)
 
 @login_required
 @staff_required
@@ -5530,7 +5107,7 @@ def sales_report_new_orders_check(request):
     
     try:
         # Convert dates
-        today = timezone.now().date()
+        today = business_date()
         if start_date and isinstance(start_date, str):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         else:
@@ -5543,7 +5120,7 @@ def sales_report_new_orders_check(request):
         
         # Check for new orders
         new_orders_query = Order.objects.filter(
-            created_at__date__range=[start_date, end_date]
+            **date_window('created_at', start_date, end_date)
         )
         
         if last_check:
@@ -5573,6 +5150,58 @@ def sales_report_new_orders_check(request):
     
     return JsonResponse(data)
 
+async def order_events(request):
+    """Server-Sent Events stream of order created/paid/status-changed/voided events.
+
+    Served under ASGI (cookie_project/asgi.py). Every open tab shares the
+    in-process broker, so no queries run per client beyond this auth check.
+    """
+    allowed = await sync_to_async(is_admin_or_staff)(request.user)
+    if not allowed:
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the life of the stream; ask the
+        # browser to come back later instead
+        return HttpResponse('retry: 30000\n\n', content_type='text/event-stream')
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    except (TypeError, ValueError):
+        last_event_id = None
+
+    async def stream():
+        yield 'retry: 3000\n\n'
+        async for event in events.broker.stream(last_event_id):
+            yield events.format_event(event)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+@staff_required
+def order_changes(request):
+    """Order events after ?since=<seq> from the shared journal, for clients without the event stream"""
+    journal = get_journal()
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+
+    if since is None:
+        # New client: nothing to catch up on, just where to start from
+        changes, latest = [], journal.latest()
+    else:
+        changes = journal.since(since)
+        latest = changes[-1]['id'] if changes else since
+    return JsonResponse({
+        'success': True,
+        'events': changes,
+        'latest': latest,
+        'new_orders_total': journal.get('new_orders'),
+    })
+
 # Add this to views.py temporarily
 @login_required
 @staff_required
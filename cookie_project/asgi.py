@@ -3,6 +3,12 @@ ASGI config for cookie_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the production entrypoint (see Procfile): the order event stream
+(cookie_app.views.order_events) holds its connection open as an async view,
+which only works under ASGI. Each worker process follows the shared order
+event journal (cookie_app.journal) once and fans events out to the streams
+connected to it.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +18,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cookie_project.settings')
+# Read by settings.py: persistent database connections are turned off under ASGI
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
@@ -52,6 +52,7 @@ SITE_ID = 1
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise here
+    'cookie_app.middleware.QueryProfilingMiddleware',  # Per-view query/latency profiles (QUERY_PROFILING)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +63,9 @@ MIDDLEWARE = [
     #'allauth.account.middleware.AccountMiddleware',
 ]
 
+# Per-view query/latency profiles (admin_request_profiles); the middleware is skipped unless enabled
+QUERY_PROFILING = os.environ.get('QUERY_PROFILING') == '1'
+
 ROOT_URLCONF = 'cookie_project.urls'
 
 TEMPLATES = [
@@ -86,13 +90,26 @@ WSGI_APPLICATION = 'cookie_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Persistent connections are only kept under WSGI. Under ASGI (asgi.py sets
+# DJANGO_ASGI) sync code runs on executor threads that outlive the request,
+# so Django can't close their connections and advises CONN_MAX_AGE = 0.
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///' + os.path.join(BASE_DIR, 'db.sqlite3'),
-        conn_max_age=600
+        conn_max_age=0 if os.environ.get('DJANGO_ASGI') == '1' else 600
     )
 }
 
+# Shared cache (catalog snapshot, dashboard metrics, realtime deltas). Without
+# REDIS_URL each worker process keeps its own in-memory copy.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,37 @@
+// "Load more" for keyset-paginated order lists.
+// <button data-load-more data-next-cursor="..." data-rows="#tbody" [data-modals="#container"]>
+// fetches the next page of the current URL (same filters) and appends it.
+document.addEventListener('click', function(e) {
+    const button = e.target.closest('[data-load-more]');
+    if (!button || button.disabled) return;
+
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', button.dataset.nextCursor);
+    params.set('format', 'json');
+
+    const label = button.innerHTML;
+    button.disabled = true;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Loading...';
+
+    fetch(`${window.location.pathname}?${params}`, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(r => r.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.error);
+            document.querySelector(button.dataset.rows).insertAdjacentHTML('beforeend', data.html);
+            if (button.dataset.modals && data.modals) {
+                document.querySelector(button.dataset.modals).insertAdjacentHTML('beforeend', data.modals);
+            }
+            if (data.has_next) {
+                button.dataset.nextCursor = data.next_cursor;
+                button.innerHTML = label;
+                button.disabled = false;
+            } else {
+                button.closest('div').remove();
+            }
+        })
+        .catch(() => {
+            button.innerHTML = label;
+            button.disabled = false;
+            alert('Could not load more orders.');
+        });
+});